@@ -0,0 +1,130 @@
+"""
+Stand-in for the Sunshine flatpak in the offline benchmark, started by the
+flatpak stub's `run` (see bench/run.py). Registers itself in the fake /proc
+the controller's FlatpakInstanceTracker scans, then serves the Web UI API
+endpoints the plugin uses over HTTPS: /api/apps, /api/pin,
+/api/clients/list and /api/password. The credentials and paired clients
+are kept in a state file, so they survive restarts like Sunshine's own.
+
+Configured through the environment:
+- BENCH_DIR: The benchmark's working directory (state, certificate, fake /proc)
+- BENCH_PORT: The port to listen on
+- BENCH_STARTUP_DELAY: Seconds before the API accepts connections
+- BENCH_PAIR_DELAY: Seconds before a client paired via /api/pin shows up
+                    in /api/clients/list
+"""
+import base64
+import http.server
+import json
+import os
+import signal
+import shutil
+import ssl
+import sys
+import threading
+import time
+import uuid
+
+BENCH_DIR = os.environ["BENCH_DIR"]
+STATE_PATH = os.path.join(BENCH_DIR, "sunshine-state.json")
+PROC_DIR = os.path.join(BENCH_DIR, "proc", str(os.getpid()))
+APP_ID = "dev.lizardbyte.app.Sunshine"
+
+state_lock = threading.Lock()
+
+def load_state() -> dict:
+    try:
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"username": None, "password": None, "named_certs": []}
+
+def save_state(state: dict) -> None:
+    with open(STATE_PATH + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(STATE_PATH + ".tmp", STATE_PATH)
+
+def register_process() -> None:
+    # What FlatpakInstanceTracker reads: the sandbox metadata through the
+    # process' root, and the stat file (linked to the real one, so liveness
+    # and start time are genuine)
+    os.makedirs(os.path.join(PROC_DIR, "root"))
+    with open(os.path.join(PROC_DIR, "root", ".flatpak-info"), "w") as f:
+        f.write(f"[Application]\nname={APP_ID}\n")
+    os.symlink(f"/proc/{os.getpid()}/stat", os.path.join(PROC_DIR, "stat"))
+
+def unregister_process() -> None:
+    shutil.rmtree(PROC_DIR, ignore_errors=True)
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.handle_request(None)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        self.handle_request(json.loads(self.rfile.read(length) or b"{}"))
+
+    def handle_request(self, data: dict | None) -> None:
+        with state_lock:
+            state = load_state()
+        if state["username"] is not None and not self.is_authorized(state):
+            self.respond(401, {"status": False, "error": "Unauthorized"})
+            return
+        if self.path == "/api/apps":
+            self.respond(200, {"apps": [], "env": {}})
+        elif self.path == "/api/clients/list":
+            self.respond(200, {"status": True, "named_certs": state["named_certs"]})
+        elif self.path == "/api/pin" and data is not None:
+            threading.Timer(float(os.environ.get("BENCH_PAIR_DELAY", "0")), self.add_client, [data.get("name")]).start()
+            self.respond(200, {"status": True})
+        elif self.path == "/api/password" and data is not None:
+            with state_lock:
+                state = load_state()
+                state["username"] = data.get("newUsername")
+                state["password"] = data.get("newPassword")
+                save_state(state)
+            self.respond(200, {"status": True})
+        else:
+            self.respond(404, {"status": False, "error": "Not found"})
+
+    def is_authorized(self, state: dict) -> bool:
+        expected = base64.b64encode(f"{state['username']}:{state['password']}".encode()).decode()
+        return self.headers.get("Authorization") == f"Basic {expected}"
+
+    @staticmethod
+    def add_client(name: str) -> None:
+        with state_lock:
+            state = load_state()
+            state["named_certs"].append({"name": name, "uuid": str(uuid.uuid4()).upper(), "cert": ""})
+            save_state(state)
+
+    def respond(self, status: int, body: dict) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+def main() -> None:
+    # flatpak kill sends SIGTERM; exit through the finally below
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    register_process()
+    try:
+        time.sleep(float(os.environ.get("BENCH_STARTUP_DELAY", "0")))
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(os.path.join(BENCH_DIR, "cert.pem"), os.path.join(BENCH_DIR, "key.pem"))
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", int(os.environ["BENCH_PORT"])), Handler)
+        server.daemon_threads = True
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        server.serve_forever()
+    finally:
+        unregister_process()
+
+if __name__ == "__main__":
+    main()
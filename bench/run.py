@@ -0,0 +1,353 @@
+"""
+Offline benchmark for the plugin backend: drives SunshineController and
+Plugin end to end against stand-ins, so performance regressions show up
+without a Steam Deck.
+
+- bench/stubs holds flatpak, drm_info, xprop and su stand-ins; they are put
+  first on PATH, log every invocation and sleep a configurable delay
+- bench/fake_sunshine.py is what the flatpak stub "runs": a local HTTPS
+  stand-in for Sunshine's Web UI API, registered in a fake /proc the
+  controller scans instead of the real one
+- decky and settings, provided by Decky Loader on the device, are replaced
+  by minimal in-process stand-ins
+
+Reported: boot latency (plugin load until the API accepts connections),
+start and stop latency, the cost of a health check (wall time and stub
+process spawns; real tools such as cp are not counted) and pairing latency.
+
+Runs as root, like the plugin: start_async makes the bwrap copy setuid
+root (here a dummy file in the working directory). Needs openssl for the
+fake API's certificate.
+
+    sudo python3 bench/run.py --iterations 10 --json bench_output.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+BENCH_HOME = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_HOME)
+APP_ID = "dev.lizardbyte.app.Sunshine"
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Decky Sunshine backend")
+    parser.add_argument("--iterations", type=int, default=5, help="Repetitions of each measured operation")
+    parser.add_argument("--health-checks", type=int, default=50, help="Repetitions of each health check")
+    parser.add_argument("--workdir", help="Working directory (default: a new one under /var/tmp, removed afterwards)")
+    parser.add_argument("--port", type=int, default=0, help="Port of the fake Sunshine API (default: a free one)")
+    parser.add_argument("--delay-flatpak", type=float, default=0.05, help="Seconds each flatpak call takes")
+    parser.add_argument("--delay-drm-info", type=float, default=0.02, help="Seconds each drm_info call takes")
+    parser.add_argument("--delay-xprop", type=float, default=0.01, help="Seconds each xprop call takes")
+    parser.add_argument("--delay-su", type=float, default=0.01, help="Seconds each su call takes")
+    parser.add_argument("--startup-delay", type=float, default=0.3, help="Seconds until the fake API accepts connections")
+    parser.add_argument("--pair-delay", type=float, default=0.2, help="Seconds until a paired client is listed")
+    parser.add_argument("--update-version", default="", help="Version the flatpak stub reports as update (default: none)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Print the plugin's log instead of writing it to the working directory")
+    return parser.parse_args()
+
+def prepare_workdir(workdir: str) -> None:
+    os.makedirs(os.path.join(workdir, "proc"), exist_ok=True)
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-keyout", os.path.join(workdir, "key.pem"), "-out", os.path.join(workdir, "cert.pem")],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    # The source of the setuid copy; only copied, never executed
+    with open(os.path.join(workdir, "bwrap-source"), "w") as f:
+        f.write("#!/bin/sh\nexit 1\n")
+    os.chmod(os.path.join(workdir, "bwrap-source"), 0o755)
+    # A "card node" the DRM ioctls fail on, so the display probe falls back
+    # to the drm_info stub instead of depending on the host's GPU
+    open(os.path.join(workdir, "card0"), "w").close()
+    with open(os.path.join(workdir, "sunshine-state.json"), "w") as f:
+        json.dump({"username": USERNAME, "password": PASSWORD, "named_certs": []}, f)
+
+def configure_environment(args: argparse.Namespace, workdir: str, port: int) -> None:
+    """
+    The environment the stubs and the fake Sunshine read. The controller
+    copies os.environ when constructed, so this has to happen first.
+    """
+    os.environ.update({
+        "PATH": os.path.join(BENCH_HOME, "stubs") + os.pathsep + os.environ.get("PATH", os.defpath),
+        "BENCH_HOME": BENCH_HOME,
+        "BENCH_DIR": workdir,
+        "BENCH_PYTHON": sys.executable,
+        "BENCH_PORT": str(port),
+        "BENCH_DELAY_FLATPAK": str(args.delay_flatpak),
+        "BENCH_DELAY_DRM_INFO": str(args.delay_drm_info),
+        "BENCH_DELAY_XPROP": str(args.delay_xprop),
+        "BENCH_DELAY_SU": str(args.delay_su),
+        "BENCH_STARTUP_DELAY": str(args.startup_delay),
+        "BENCH_PAIR_DELAY": str(args.pair_delay),
+        "BENCH_UPDATE_VERSION": args.update_version,
+        "PULSE_SERVER": f"unix:{os.path.join(workdir, 'pulse-native')}",
+        "DECKY_PLUGIN_SETTINGS_DIR": workdir,
+        "DECKY_PLUGIN_LOG_DIR": workdir,
+    })
+
+def install_loader_stand_ins(workdir: str, logger: logging.Logger) -> None:
+    """
+    Stand-ins for the modules Decky Loader provides to plugins.
+    """
+    decky = types.ModuleType("decky")
+    decky.logger = logger
+    decky.DECKY_PLUGIN_VERSION = "bench"
+    decky.DECKY_PLUGIN_LOG_DIR = workdir
+    decky.DECKY_HOME = workdir
+    decky.emitted = []
+
+    async def emit(event, *args):
+        decky.emitted.append(event)
+
+    decky.emit = emit
+    decky.migrate_settings = lambda *args: None
+    sys.modules["decky"] = decky
+
+    class SettingsManager:
+        def __init__(self, name, settings_directory):
+            self.path = os.path.join(settings_directory, f"{name}.json")
+            self.settings = {}
+
+        def read(self):
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    self.settings = json.load(f)
+
+        def getSetting(self, key, default=None):
+            return self.settings.get(key, default)
+
+        def setSetting(self, key, value):
+            self.settings[key] = value
+            with open(self.path, "w") as f:
+                json.dump(self.settings, f)
+            return value
+
+    settings = types.ModuleType("settings")
+    settings.SettingsManager = SettingsManager
+    sys.modules["settings"] = settings
+
+def write_plugin_settings(workdir: str) -> None:
+    auth_header = "Basic " + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+    with open(os.path.join(workdir, "decky-sunshine.json"), "w") as f:
+        json.dump({
+            "lastAuthHeader": auth_header,
+            "lastRunState": "start",
+            # Fresh, so the boot only runs the local version check
+            "versionInfoCache": {"current_version": None, "update_version": None, "checked_at": time.time()},
+        }, f)
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_for_port(port: int, timeout: float = 30) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return True
+        except OSError:
+            await asyncio.sleep(0.005)
+    return False
+
+class SpawnCounter:
+    """
+    Counts stub invocations via the log every stub appends to.
+    """
+
+    def __init__(self, workdir: str) -> None:
+        self.path = os.path.join(workdir, "calls.log")
+
+    def count(self) -> int:
+        try:
+            with open(self.path) as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+def summarize(durations: list[float]) -> dict:
+    ordered = sorted(durations)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 2),
+        "median_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+class Samples:
+    """
+    Timings of repeated runs of one operation, with the number of stub
+    processes each run spawned.
+    """
+
+    def __init__(self, spawns: SpawnCounter) -> None:
+        self._spawns = spawns
+        self.durations = []
+        self.spawned = []
+
+    async def run(self, operation, iterations: int = 1) -> None:
+        for _ in range(iterations):
+            before = self._spawns.count()
+            started = time.monotonic()
+            await operation()
+            self.durations.append(time.monotonic() - started)
+            self.spawned.append(self._spawns.count() - before)
+
+    def summary(self) -> dict:
+        return {**summarize(self.durations), "spawns_per_run": round(statistics.mean(self.spawned), 2)}
+
+async def run_benchmark(args: argparse.Namespace, workdir: str) -> dict:
+    port = args.port or free_port()
+    configure_environment(args, workdir, port)
+    write_plugin_settings(workdir)
+
+    logger = logging.getLogger("decky-sunshine-bench")
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler() if args.verbose else logging.FileHandler(os.path.join(workdir, "plugin.log"))
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(handler)
+    install_loader_stand_ins(workdir, logger)
+
+    sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, "py_modules")]
+    import main
+    import perfprofile
+    import sunshine
+    import sunshineconf
+    import sunshinelog
+    from settings import SettingsManager
+
+    # Something has to listen on the "PulseAudio socket" for the audio check
+    pulse = await asyncio.start_unix_server(lambda reader, writer: writer.close(), os.environ["PULSE_SERVER"][len("unix:"):])
+
+    sunshine.SunshineController.WebUiPort = port
+    controller = sunshine.SunshineController(logger, trace_path=os.path.join(workdir, "traces.jsonl"))
+    controller.SunshineConfigPath = os.path.join(workdir, "config", "sunshine.conf")
+    controller.config = sunshineconf.SunshineConfig(controller.SunshineConfigPath)
+    controller.logTailer = sunshinelog.LogTailer(os.path.join(workdir, "config", "sunshine.log"))
+    controller._performance = perfprofile.PerformanceProfile(logger, os.path.join(workdir, "performance-profile.json"))
+    controller.BwrapSourcePath = os.path.join(workdir, "bwrap-source")
+    controller.DrmCardPattern = os.path.join(workdir, "card[0-9]*")
+    # No X server: the composition override would go through the xprop stub
+    controller.X11Display = 99
+    controller.environment_variables["FLATPAK_BWRAP"] = os.path.join(workdir, "bwrap", "bwrap")
+    controller._instanceTracker = sunshine.FlatpakInstanceTracker(APP_ID, proc_root=os.path.join(workdir, "proc"))
+
+    plugin = main.Plugin()
+    plugin.sunshineController = controller
+    plugin.settingManager = SettingsManager(name="decky-sunshine", settings_directory=workdir)
+    plugin.settingManager.read()
+
+    spawns = SpawnCounter(workdir)
+    results = {}
+    try:
+        # Boot: plugin load until Sunshine accepts connections
+        started = time.monotonic()
+        boot = asyncio.get_event_loop().create_task(plugin._main())
+        if not await wait_for_port(port):
+            raise RuntimeError("The fake Sunshine did not come up during the boot, see plugin.log")
+        results["boot_until_accepting"] = round((time.monotonic() - started) * 1000, 2)
+        await boot
+        results["boot_total"] = round((time.monotonic() - started) * 1000, 2)
+        results["boot_steps"] = (await plugin.get_boot_progress())["steps"]
+        # Stop the background tasks (state monitor, version refresh), so
+        # they do not skew the measurements below
+        await plugin._unload()
+
+        running_state = Samples(spawns)
+        await running_state.run(controller.isSunshineRunning_async, args.health_checks)
+        results["health_check_running_state"] = running_state.summary()
+        full_probe = Samples(spawns)
+        await full_probe.run(plugin._probe_status, args.health_checks)
+        results["health_check_full_probe"] = full_probe.summary()
+
+        pairings = 0
+
+        async def pair():
+            nonlocal pairings
+            pairings += 1
+            if not await plugin.pair("1234", f"bench-client-{pairings}"):
+                raise RuntimeError("Pairing failed, see plugin.log")
+
+        pairing = Samples(spawns)
+        await pairing.run(pair, args.iterations)
+        results["pairing"] = pairing.summary()
+
+        start_until_accepting = []
+
+        async def stop():
+            if not await plugin.stop_sunshine():
+                raise RuntimeError("Stopping failed, see plugin.log")
+
+        async def start():
+            started = time.monotonic()
+            if not await plugin.start_sunshine():
+                raise RuntimeError("Starting failed, see plugin.log")
+            await wait_for_port(port)
+            start_until_accepting.append(time.monotonic() - started)
+
+        stops = Samples(spawns)
+        starts = Samples(spawns)
+        for _ in range(args.iterations):
+            await stops.run(stop)
+            await starts.run(start)
+        results["stop"] = stops.summary()
+        results["start"] = starts.summary()
+        results["start_until_accepting"] = summarize(start_until_accepting)
+        results["traces"] = controller.tracer.recent(4)
+    finally:
+        await controller.stop_async()
+        pulse.close()
+    return results
+
+def print_report(results: dict) -> None:
+    print(f"Boot until the API accepts connections: {results['boot_until_accepting']:.1f} ms (boot total {results['boot_total']:.1f} ms)")
+    for step in results["boot_steps"]:
+        seconds = f"{step['seconds'] * 1000:.1f} ms" if step["seconds"] is not None else "-"
+        print(f"  {step['name']:<14} {step['status']:<8} {seconds}")
+    print()
+    print(f"{'operation':<28}{'n':>5}{'min ms':>10}{'median ms':>11}{'p95 ms':>10}{'max ms':>10}{'spawns':>8}")
+    for key in ("health_check_running_state", "health_check_full_probe", "pairing", "stop", "start", "start_until_accepting"):
+        row = results[key]
+        spawns = f"{row['spawns_per_run']:.1f}" if "spawns_per_run" in row else "-"
+        print(f"{key:<28}{row['n']:>5}{row['min_ms']:>10.1f}{row['median_ms']:>11.1f}{row['p95_ms']:>10.1f}{row['max_ms']:>10.1f}{spawns:>8}")
+
+def main() -> int:
+    args = parse_args()
+    if os.geteuid() != 0:
+        print("The benchmark must run as root, like the plugin (see the module docstring)", file=sys.stderr)
+        return 1
+    if shutil.which("openssl") is None:
+        print("openssl is needed for the fake Sunshine API's certificate", file=sys.stderr)
+        return 1
+    workdir = args.workdir or tempfile.mkdtemp(prefix="decky-sunshine-bench-", dir="/var/tmp")
+    try:
+        prepare_workdir(workdir)
+        results = asyncio.run(run_benchmark(args, workdir))
+        print_report(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,252 @@
 import decky
 
 from pathlib import Path
+import asyncio
 import os
+import time
 
 from settings import SettingsManager
 from sunshine import SunshineController
 
+class StatusSnapshot:
+    """
+    A short-lived cache in front of an expensive async probe. Opening the
+    Quick Access panel fires several read RPCs at once (running state,
+    credential validity, Web UI info), which all need the same probes; they
+    share one result for ttl seconds, and concurrent callers await the probe
+    already in flight instead of starting their own.
+    """
+
+    def __init__(self, probe, ttl: float):
+        self._probe = probe
+        self._ttl = ttl
+        self._value = None
+        self._taken_at = None
+        self._in_flight = None
+
+    async def get(self) -> dict:
+        if self._taken_at is not None and time.monotonic() - self._taken_at < self._ttl:
+            return self._value
+        if self._in_flight is None:
+            self._in_flight = asyncio.get_event_loop().create_task(self._refresh())
+        # Shielded, so a caller being cancelled does not cancel the probe
+        # the other callers are waiting for
+        return await asyncio.shield(self._in_flight)
+
+    def invalidate(self) -> None:
+        """
+        Drop the cached value after a state change; a probe already in
+        flight is not reused either.
+        """
+        self._taken_at = None
+        self._in_flight = None
+
+    async def _refresh(self) -> dict:
+        task = asyncio.current_task()
+        try:
+            value = await self._probe()
+            if self._in_flight is task:
+                self._value = value
+                self._taken_at = time.monotonic()
+            return value
+        finally:
+            if self._in_flight is task:
+                self._in_flight = None
+
+class VersionInfoCache:
+    """
+    Stale-while-revalidate cache for Sunshine's version and update info. A
+    full update check refreshes Flatpak's appstream data over the network
+    and can take many seconds; readers get the last known value right away
+    while refreshes run in the background (see Plugin._refresh_version_info).
+    A refresh in flight is shared by all callers that ask for one, a full
+    check also by callers that only need a local one.
+    """
+
+    def __init__(self, fetch, on_update):
+        """
+        :param fetch: Async callable taking refresh_appstream and returning
+                      the version info dict, or None on failure
+        :param on_update: Called after a refresh produced a new value
+        """
+        self._fetch = fetch
+        self._on_update = on_update
+        self.value = None
+        # Wall-clock time of the last successful full check; persisted, so
+        # it has to survive reboots
+        self.checked_at = None
+        self._in_flight = None
+        self._in_flight_full = False
+
+    def load(self, entry) -> None:
+        """
+        Restore a value persisted from toEntry().
+        """
+        if isinstance(entry, dict) and "current_version" in entry and "update_version" in entry:
+            self.value = {
+                "current_version": entry["current_version"],
+                "update_version": entry["update_version"],
+            }
+            self.checked_at = entry.get("checked_at")
+
+    def toEntry(self) -> dict:
+        return {**(self.value or {}), "checked_at": self.checked_at}
+
+    async def refresh(self, refresh_appstream: bool) -> dict | None:
+        """
+        :return: The refreshed value, or None if the refresh failed (the
+                 cached value is kept then)
+        """
+        # A local refresh in flight does not answer a full check; wait for it
+        # to finish instead of running both at once
+        while self._in_flight is not None and refresh_appstream and not self._in_flight_full:
+            await asyncio.shield(self._in_flight)
+        if self._in_flight is None:
+            self._in_flight_full = refresh_appstream
+            self._in_flight = asyncio.get_event_loop().create_task(self._refresh(refresh_appstream))
+        return await asyncio.shield(self._in_flight)
+
+    async def _refresh(self, refresh_appstream: bool) -> dict | None:
+        try:
+            value = await self._fetch(refresh_appstream)
+            if value is not None:
+                self.value = value
+                if refresh_appstream:
+                    self.checked_at = time.time()
+                self._on_update()
+            return value
+        finally:
+            self._in_flight = None
+
+class BootGraph:
+    """
+    Runs the plugin's boot steps as a dependency graph: every step is a task
+    that starts as soon as the steps it requires succeeded, so independent
+    steps run concurrently. A step fails by returning False or raising; the
+    steps requiring it are skipped. Each step's status (pending, running,
+    done, failed, skipped) and duration is kept for the frontend.
+    """
+
+    def __init__(self, on_change):
+        """
+        :param on_change: Called whenever a step changes its status
+        """
+        self._on_change = on_change
+        self._steps = []
+        self._tasks = {}
+
+    def add(self, name: str, label: str, run, requires: tuple = ()) -> None:
+        """
+        :param label: What the step is doing, for the frontend (e.g.
+                      "Waiting for display")
+        :param run: Async callable without arguments
+        :param requires: Names of steps that must succeed first
+        """
+        step = {"name": name, "label": label, "status": "pending", "seconds": None}
+        self._steps.append(step)
+        self._tasks[name] = asyncio.get_event_loop().create_task(
+            self._run(step, run, [self._tasks[required] for required in requires])
+        )
+
+    async def wait(self) -> None:
+        await asyncio.gather(*self._tasks.values())
+
+    @property
+    def done(self) -> bool:
+        return all(task.done() for task in self._tasks.values())
+
+    def steps(self) -> list[dict]:
+        return [dict(step) for step in self._steps]
+
+    def phase(self) -> str | None:
+        """
+        :return: The label of the step started last among those running, or
+                 None if none is
+        """
+        running = [step["label"] for step in self._steps if step["status"] == "running"]
+        return running[-1] if running else None
+
+    async def _run(self, step: dict, run, requires: list) -> bool:
+        if not all(await asyncio.gather(*requires)):
+            self._setStatus(step, "skipped")
+            return False
+        self._setStatus(step, "running")
+        started = time.monotonic()
+        try:
+            succeeded = await run() is not False
+        except Exception as e:
+            decky.logger.exception(f"Boot step {step['name']} failed", exc_info=e)
+            succeeded = False
+        step["seconds"] = round(time.monotonic() - started, 3)
+        decky.logger.info(f"Boot step {step['name']} {'done' if succeeded else 'failed'} after {step['seconds']:.2f} seconds")
+        self._setStatus(step, "done" if succeeded else "failed")
+        return succeeded
+
+    def _setStatus(self, step: dict, status: str) -> None:
+        step["status"] = status
+        self._on_change()
+
 class Plugin:
+    # How long read RPCs share one status probe, in seconds
+    STATUS_TTL = 2
+    # While a panel is subscribed: interval of the state monitor's
+    # running-state check (only while no instance is supervised, whose exit
+    # is reported right away), and of the full probe (an HTTPS request for
+    # the credential check) for changes made outside the plugin, in seconds
+    STATE_MONITOR_INTERVAL = 2
+    STATE_FULL_PROBE_INTERVAL = 30
+    # Age after which the version info is re-checked (with an appstream
+    # refresh) in the background, and the retry backoff after a failed
+    # check, in seconds
+    VERSION_CHECK_INTERVAL = 6 * 60 * 60
+    VERSION_RETRY_MIN = 60
+    VERSION_RETRY_MAX = 60 * 60
+    # Lower bound of the resource sample interval, in seconds
+    RESOURCE_SAMPLE_INTERVAL_MIN = 0.5
+    # The performance profile applied while streaming, unless the settings
+    # override an option (None leaves it alone; see perfprofile)
+    PERFORMANCE_PROFILE_DEFAULT = {
+        "enabled": False,
+        "gpu_performance_level": "high",
+        "gpu_min_clock_mhz": None,
+        "cpu_governor": None,
+        "cpu_epp": "performance",
+    }
+    # The scheduling settings of Sunshine's process tree, unless the
+    # settings override an option (None leaves it alone; see procsched).
+    # Realtime threads are opt-in: SCHED_RR threads that spin can starve
+    # the game of a core
+    SCHEDULING_DEFAULT = {
+        "enabled": False,
+        "nice": -10,
+        "io_class": "best-effort",
+        "io_level": 0,
+        "realtime_threads": None,
+        "realtime_priority": 10,
+        "cpus": None,
+    }
+
     def __init__(self):
         self.sunshineController = None
         self.settingManager = None
         self._last_is_running = None
         self._last_are_credentials_valid = None
-        self._last_version_info = None
+        self._versions = VersionInfoCache(self._fetch_version_info, self._on_version_info_updated)
+        self._version_refresh_task = None
+        self._last_logged_version_info = None
+        self._status = StatusSnapshot(self._probe_status, self.STATUS_TTL)
+        self._state_monitor_task = None
+        # Set to make the state monitor probe (and push) right away, e.g.
+        # after a start or stop
+        self._state_changed = asyncio.Event()
+        self._last_emitted_state = None
+        # How many panels listen to the sunshine_state event; the monitor
+        # only polls for outside changes while one does
+        self._state_subscribers = 0
+        # Pushes of sunshine_log_events in flight; referenced so they are not
+        # garbage-collected before they finish
+        self._log_event_tasks = set()
+        self._boot = None
 
     async def set_setting(self, key, value):
         return self.settingManager.setSetting(key, value)
@@ -21,24 +255,123 @@ class Plugin:
         return self.settingManager.getSetting(key, default)
 
     async def is_sunshine_running(self):
+        return (await self._status.get())["is_running"]
+
+    async def are_credentials_valid(self):
+        return (await self._status.get())["are_credentials_valid"]
+
+    async def _probe_status(self):
+        """
+        Probe everything the read RPCs report in one pass, see StatusSnapshot.
+        """
         current_is_running = await self.sunshineController.isSunshineRunning_async()
         if self._last_is_running != current_is_running:
             decky.logger.info(f"Sunshine running state changed: {self._last_is_running if self._last_is_running is not None else 'unknown'} → {current_is_running if current_is_running is not None else 'unknown'}")
             self._last_is_running = current_is_running
-        return current_is_running
 
-    async def are_credentials_valid(self):
-        current_are_credentials_valid = await self.sunshineController.areCredentialsValid_async()
+        current_are_credentials_valid = await self.sunshineController.areCredentialsValid_async(current_is_running)
         if self._last_are_credentials_valid != current_are_credentials_valid:
             decky.logger.info(f"Credentials valid state changed: {self._last_are_credentials_valid if self._last_are_credentials_valid is not None else 'unknown'} → {current_are_credentials_valid if current_are_credentials_valid is not None else 'unknown'}")
             self._last_are_credentials_valid = current_are_credentials_valid
-        return current_are_credentials_valid
+
+        ip = self.sunshineController.getLanIp()
+        origin_allowed = False
+        if ip is not None:
+            origin = f"https://{ip}:{self.sunshineController.WebUiPort}"
+            origin_allowed = await self.sunshineController.isCsrfOriginAllowed_async(origin)
+
+        return {
+            "is_running": current_is_running,
+            "are_credentials_valid": current_are_credentials_valid,
+            "ip": ip,
+            "origin_allowed": origin_allowed,
+        }
+
+    async def get_state(self):
+        """
+        The state pushed with the sunshine_state event, for the frontend's
+        initial render before the first event arrives.
+        """
+        return self._build_state(await self._status.get())
+
+    async def subscribe_state(self):
+        """
+        Called by a panel that starts listening to the sunshine_state event,
+        which makes the state monitor also look for changes made outside the
+        plugin until unsubscribe_state.
+        """
+        self._state_subscribers += 1
+        self._state_changed.set()
+
+    async def unsubscribe_state(self):
+        self._state_subscribers = max(self._state_subscribers - 1, 0)
+
+    def _build_state(self, status):
+        return {
+            "is_running": status["is_running"],
+            "are_credentials_valid": status["are_credentials_valid"],
+            "composition_forced": self.sunshineController.isCompositionForced(),
+            "current_version": self._versions.value["current_version"] if self._versions.value else None,
+            "update_version": self._versions.value["update_version"] if self._versions.value else None,
+            "boot_phase": self._boot.phase() if self._boot is not None else None,
+            "stream": self.sunshineController.logTailer.summary(),
+        }
+
+    def _notify_state_changed(self):
+        self._status.invalidate()
+        self._state_changed.set()
+
+    async def _monitor_state(self):
+        """
+        Push state changes (running state, credential validity, composition
+        override, version info) to the frontend via the sunshine_state event,
+        so the panel does not have to poll. Changes by RPCs and exits of the
+        supervised instance are signalled. Only while a panel is subscribed,
+        changes made outside the plugin are looked for as well: the full probe
+        runs every STATE_FULL_PROBE_INTERVAL (e.g. for credentials changed in
+        the Web UI), and a cheap /proc running check every
+        STATE_MONITOR_INTERVAL while no instance is supervised.
+        """
+        loop = asyncio.get_event_loop()
+        last_full_probe = loop.time()
+        last_is_running = None
+        status = None
+        while True:
+            timeout = None
+            if self._state_subscribers > 0:
+                timeout = max(last_full_probe + self.STATE_FULL_PROBE_INTERVAL - loop.time(), 0)
+                if not self.sunshineController.isSupervised():
+                    timeout = min(timeout, self.STATE_MONITOR_INTERVAL)
+            try:
+                await asyncio.wait_for(self._state_changed.wait(), timeout)
+                signalled = True
+            except asyncio.TimeoutError:
+                signalled = False
+            self._state_changed.clear()
+            try:
+                full_probe = status is None or signalled or loop.time() - last_full_probe >= self.STATE_FULL_PROBE_INTERVAL
+                if not full_probe:
+                    full_probe = await self.sunshineController.isSunshineRunning_async() != last_is_running
+                if full_probe:
+                    self._status.invalidate()
+                    last_full_probe = loop.time()
+                    status = await self._status.get()
+                # Otherwise nothing the probe reports changed; the other
+                # fields are read from the controller anyway
+                state = self._build_state(status)
+                last_is_running = state["is_running"]
+                if state != self._last_emitted_state:
+                    self._last_emitted_state = state
+                    await decky.emit("sunshine_state", state)
+            except Exception as e:
+                decky.logger.exception("An error occurred in the state monitor", exc_info=e)
 
     async def start_sunshine(self):
         decky.logger.info("Starting sunshine...")
         starting = not await self.sunshineController.isSunshineRunning_async()
         added_now = await self._ensure_csrf_allowed_origin()
         res = await self.sunshineController.start_async()
+        self._notify_state_changed()
         if starting and res:
             self.settingManager.setSetting("csrfRestartPending", False)
         elif added_now:
@@ -65,15 +398,65 @@ class Plugin:
         self.sunshineController.force_composition = enabled
         if await self.sunshineController.isSunshineRunning_async():
             await self.sunshineController.applyCompositionPreference_async()
+        self._state_changed.set()
         decky.logger.info(f"forceComposition set to {enabled}")
         return enabled
 
     async def get_force_composition(self):
         return self.settingManager.getSetting("forceComposition", False)
 
+    async def set_auto_restart(self, enabled):
+        """
+        Persist whether Sunshine is restarted when it exits on its own (it is
+        supervised while running; a crash loop ends the restarts).
+        """
+        self.settingManager.setSetting("autoRestart", enabled)
+        self.sunshineController.auto_restart = enabled
+        decky.logger.info(f"autoRestart set to {enabled}")
+        return enabled
+
+    async def get_auto_restart(self):
+        return self.settingManager.getSetting("autoRestart", True)
+
+    async def set_performance_profile(self, profile):
+        """
+        Persist the performance profile applied while Sunshine runs (see
+        PERFORMANCE_PROFILE_DEFAULT for its options; options not given keep
+        their value). While Sunshine runs, the previous profile is restored
+        and the new one applied right away.
+        """
+        profile = {**await self.get_performance_profile(), **profile}
+        self.settingManager.setSetting("performanceProfile", profile)
+        self.sunshineController.performance_profile = profile
+        if await self.sunshineController.isSunshineRunning_async():
+            await self.sunshineController.restorePerformanceProfile_async()
+            await self.sunshineController.applyPerformanceProfile_async()
+        decky.logger.info(f"performanceProfile set to {profile}")
+        return profile
+
+    async def get_performance_profile(self):
+        return {**self.PERFORMANCE_PROFILE_DEFAULT, **self.settingManager.getSetting("performanceProfile", {})}
+
+    async def set_scheduling(self, scheduling):
+        """
+        Persist the scheduling settings of Sunshine's process tree (see
+        SCHEDULING_DEFAULT for its options; options not given keep their
+        value). A running Sunshine gets them within a second; disabling them
+        resets its threads right away.
+        """
+        scheduling = {**await self.get_scheduling(), **scheduling}
+        self.settingManager.setSetting("scheduling", scheduling)
+        await self.sunshineController.setScheduling_async(scheduling)
+        decky.logger.info(f"scheduling set to {scheduling}")
+        return scheduling
+
+    async def get_scheduling(self):
+        return {**self.SCHEDULING_DEFAULT, **self.settingManager.getSetting("scheduling", {})}
+
     async def stop_sunshine(self):
         decky.logger.info("Stopping sunshine...")
         res = await self.sunshineController.stop_async()
+        self._notify_state_changed()
         if res:
             decky.logger.info("Sunshine stopped")
             self.settingManager.setSetting("lastRunState", "stop")
@@ -87,9 +470,12 @@ class Plugin:
             decky.logger.info("No pin or client name provided for pairing")
             return False
         decky.logger.info(f"Trying to pair with PIN {pin} for client {client_name}")
-        send = await self.sunshineController.pair_async(pin, client_name)
-        decky.logger.info(f"Pairing returned {send}")
-        return send
+        client = await self.sunshineController.pair_async(pin, client_name)
+        if client is None:
+            decky.logger.info("Pairing failed")
+            return False
+        decky.logger.info(f"Paired client {client.get('name')} ({client.get('uuid') or 'no uuid'})")
+        return True
 
     async def set_credentials(self, username, password):
         if not username or not password:
@@ -98,6 +484,7 @@ class Plugin:
         decky.logger.info("Setting credentials...")
         authHeader = self.sunshineController.setCredentials(username, password)
         self.settingManager.setSetting("lastAuthHeader", authHeader)
+        self._notify_state_changed()
         decky.logger.info("Credentials set")
         return await self.are_credentials_valid()
 
@@ -121,14 +508,13 @@ class Plugin:
         reads its config only at startup). When not ready, the frontend offers
         the one restart that fixes it.
         """
-        ip = self.sunshineController.getLanIp()
-        editing_ready = False
-        if ip is not None:
-            origin = f"https://{ip}:{self.sunshineController.WebUiPort}"
-            editing_ready = (
-                await self.sunshineController.isCsrfOriginAllowed_async(origin)
-                and not self.settingManager.getSetting("csrfRestartPending", False)
-            )
+        status = await self._status.get()
+        ip = status["ip"]
+        editing_ready = (
+            ip is not None
+            and status["origin_allowed"]
+            and not self.settingManager.getSetting("csrfRestartPending", False)
+        )
         return {
             "ip": ip,
             "editing_ready": editing_ready,
@@ -155,19 +541,70 @@ class Plugin:
         return added_now
 
     async def get_sunshine_version_info(self, refresh_appstream = True):
-        versionInfo = await self.sunshineController.getSunshineVersionInfo_async(refresh_appstream)
-        if versionInfo:
-            last_current_version = self._last_version_info["current_version"] or 'unknown' if self._last_version_info else 'unknown'
-            last_update_version = self._last_version_info["update_version"] or 'unknown' if self._last_version_info else 'unknown'
-
-            current_current_version = versionInfo["current_version"] or 'unknown'
-            current_update_version = versionInfo["update_version"] or 'unknown'
-            if last_current_version != current_current_version:
-                decky.logger.info(f"Sunshine version info changed: {last_current_version} → {current_current_version}")
-            if last_update_version != current_update_version:
-                decky.logger.info(f"Sunshine update version info changed: {last_update_version} → {current_update_version}")
-            self._last_version_info = versionInfo
-        return versionInfo
+        """
+        The version info for the panel. Without refresh_appstream (panel
+        open) this answers from the cache right away, before the first check
+        finished even with None; the background refresh pushes its result
+        with the sunshine_state event. With it (manual update check) this
+        waits for a full check, joining one already in flight.
+        """
+        if refresh_appstream:
+            await self._versions.refresh(True)
+        return self._versions.value
+
+    async def _fetch_version_info(self, refresh_appstream):
+        return await self.sunshineController.getSunshineVersionInfo_async(refresh_appstream)
+
+    def _on_version_info_updated(self):
+        versionInfo = self._versions.value
+        last_current_version = self._last_logged_version_info["current_version"] or 'unknown' if self._last_logged_version_info else 'unknown'
+        last_update_version = self._last_logged_version_info["update_version"] or 'unknown' if self._last_logged_version_info else 'unknown'
+
+        current_current_version = versionInfo["current_version"] or 'unknown'
+        current_update_version = versionInfo["update_version"] or 'unknown'
+        if last_current_version != current_current_version:
+            decky.logger.info(f"Sunshine version info changed: {last_current_version} → {current_current_version}")
+        if last_update_version != current_update_version:
+            decky.logger.info(f"Sunshine update version info changed: {last_update_version} → {current_update_version}")
+        self._last_logged_version_info = versionInfo
+        self.settingManager.setSetting("versionInfoCache", self._versions.toEntry())
+        self._state_changed.set()
+
+    async def _refresh_version_info(self):
+        """
+        Keep the version info cache fresh without anyone waiting on it: a
+        local check first (picks up updates installed outside the plugin,
+        no network), then a full check whenever the last successful one is
+        older than VERSION_CHECK_INTERVAL - including right away after a
+        reboot if it is - retrying failed checks (e.g. no network) with
+        exponential backoff.
+        """
+        await self._versions.refresh(False)
+        failures = 0
+        last_attempt = None
+        while True:
+            if failures:
+                due = last_attempt + min(self.VERSION_RETRY_MIN * 2 ** (failures - 1), self.VERSION_RETRY_MAX)
+            elif self._versions.checked_at is None:
+                due = 0
+            else:
+                due = self._versions.checked_at + self.VERSION_CHECK_INTERVAL
+            delay = due - time.time()
+            if delay > 0:
+                # Re-evaluated at least every 15 minutes: the wall clock keeps
+                # running while the device is suspended, asyncio's sleep does not
+                await asyncio.sleep(min(delay, 15 * 60))
+                continue
+            last_attempt = time.time()
+            if await self._versions.refresh(True) is None:
+                failures += 1
+                decky.logger.info(f"Checking for Sunshine updates failed, retrying in {min(self.VERSION_RETRY_MIN * 2 ** (failures - 1), self.VERSION_RETRY_MAX)} s")
+            else:
+                failures = 0
+
+    def _start_version_refresh(self):
+        if self._version_refresh_task is None or self._version_refresh_task.done():
+            self._version_refresh_task = asyncio.get_event_loop().create_task(self._refresh_version_info())
 
     async def update_sunshine(self):
         decky.logger.info("Updating Sunshine...")
@@ -175,9 +612,12 @@ class Plugin:
         # here; on failure the old instance may keep running without it.
         added_now = await self._ensure_csrf_allowed_origin()
         res = await self.sunshineController.updateSunshine_async()
+        self._notify_state_changed()
         if res:
             self.settingManager.setSetting("csrfRestartPending", False)
             decky.logger.info("Sunshine updated successfully")
+            # Keep the pushed version info from announcing the update just installed
+            await self._versions.refresh(False)
         else:
             if added_now:
                 self.settingManager.setSetting("csrfRestartPending", True)
@@ -185,9 +625,29 @@ class Plugin:
         return res
 
     async def _main(self):
+        """
+        Boot the plugin. Everything after reading the settings runs as a
+        dependency graph (see BootGraph), to get from plugin load to Sunshine
+        accepting connections as quickly as possible:
+
+        - environment: diagnostics only, off the critical path
+        - running check / config: whether Sunshine survived a plugin_loader
+          restart, and the CSRF origin in sunshine.conf (both local and
+          fast; before the dependencies, since installing Sunshine starts it)
+        - dependencies: the bwrap copy and Sunshine itself (installed if
+          missing)
+        - readiness: waiting for display and audio, in parallel to all of the
+          above - on a cold boot usually the longest step
+        - start: once all of the above succeeded
+        The steps and their progress are available via get_boot_progress and
+        the boot_phase of the pushed state.
+        """
         decky.logger.info(f"Decky Sunshine version: {decky.DECKY_PLUGIN_VERSION}")
         if self.sunshineController is None:
-            self.sunshineController = SunshineController(decky.logger)
+            self.sunshineController = SunshineController(
+                decky.logger,
+                trace_path=os.path.join(decky.DECKY_PLUGIN_LOG_DIR, "traces.jsonl")
+            )
 
         if self.settingManager is None:
             decky.logger.info("Reading settings...")
@@ -195,13 +655,87 @@ class Plugin:
             self.settingManager.read()
             decky.logger.info(f"Read settings")
             self._log_settings()
+            self._versions.load(self.settingManager.getSetting("versionInfoCache", None))
+            self._last_logged_version_info = self._versions.value
+
+        self._start_state_monitor()
+        self.sunshineController.logTailer.restore(self.settingManager.getSetting("logTailPosition", None))
+        self.sunshineController.startLogWatch(self._on_log_events)
+
+        # Carry the persisted "force composition while streaming" preference into
+        # the controller so the auto-start below (and any later start) applies it.
+        self.sunshineController.force_composition = self.settingManager.getSetting("forceComposition", False)
+        self.sunshineController.auto_restart = self.settingManager.getSetting("autoRestart", True)
+        self.sunshineController.resource_sample_interval = max(
+            self.settingManager.getSetting("resourceSampleInterval", SunshineController.ResourceSampleInterval),
+            self.RESOURCE_SAMPLE_INTERVAL_MIN
+        )
+        self.sunshineController.performance_profile = await self.get_performance_profile()
+        self.sunshineController.scheduling = await self.get_scheduling()
+        # Push an exit of Sunshine (and the outcome of its restart) right away
+        self.sunshineController.onSunshineExited = self._notify_state_changed
+
+        lastRunState = self.settingManager.getSetting("lastRunState", "")
+        auto_start = lastRunState in ("start", "")
+        boot_started = time.monotonic()
+        # Results of the steps the start step needs
+        running_before = None
+        added_now = False
+
+        async def check_running():
+            nonlocal running_before
+            running_before = await self.sunshineController.isSunshineRunning_async()
+            if not running_before:
+                # Left over if the plugin died while Sunshine streamed
+                await self.sunshineController.restorePerformanceProfile_async()
+
+        async def ensure_config():
+            nonlocal added_now
+            added_now = await self._ensure_csrf_allowed_origin()
 
-        await self.sunshineController.logEnvironment_async()
+        async def ensure_dependencies():
+            if not await self.sunshineController.ensureDependencies_async():
+                decky.logger.error("Couldn't ensure dependencies")
+                return False
+            self._adopt_auth_header()
+            self._start_version_refresh()
 
-        if not await self.sunshineController.ensureDependencies_async():
-            decky.logger.error("Couldn't ensure dependencies")
-            return
+        async def wait_for_readiness():
+            display_available, _ = await self.sunshineController.waitForDisplayAndAudio_async()
+            if not display_available:
+                decky.logger.error("No display available, not starting Sunshine")
+            return display_available
 
+        async def start():
+            # Sunshine may have survived a plugin_loader restart; then this is
+            # an ensure-only pass and the running instance keeps enforcing the
+            # allowances from its own start (see _ensure_csrf_allowed_origin).
+            decky.logger.info("Starting Sunshine")
+            started = await self.sunshineController.start_async()
+            self._notify_state_changed()
+            if not running_before and started:
+                self.settingManager.setSetting("csrfRestartPending", False)
+            elif added_now:
+                self.settingManager.setSetting("csrfRestartPending", True)
+            return started
+
+        self._boot = BootGraph(self._state_changed.set)
+        self._boot.add("environment", "Checking the environment", self.sunshineController.logEnvironment_async)
+        self._boot.add("running_check", "Checking whether Sunshine is running", check_running)
+        # The config is only touched when Sunshine is about to be started;
+        # a stopped Sunshine picks the allowance up on its next start
+        if auto_start:
+            self._boot.add("config", "Updating the Sunshine config", ensure_config)
+        self._boot.add("dependencies", "Checking the Sunshine installation", ensure_dependencies,
+                       requires=("running_check", "config") if auto_start else ("running_check",))
+        if auto_start:
+            self._boot.add("readiness", "Waiting for display and audio", wait_for_readiness)
+            self._boot.add("start", "Starting Sunshine", start, requires=("dependencies", "readiness"))
+        await self._boot.wait()
+
+        decky.logger.info(f"Decky Sunshine loaded after {time.monotonic() - boot_started:.2f} seconds")
+
+    def _adopt_auth_header(self):
         # If an authHeader is set in the controller, this means that
         # Sunshine was just installed with default credentials. Thus,
         # we need to store these credentials for future use.
@@ -217,27 +751,92 @@ class Plugin:
                 decky.logger.info("Setting auth header from settings")
                 self.sunshineController.authHeader = lastAuthHeader
 
-        # Carry the persisted "force composition while streaming" preference into
-        # the controller so the auto-start below (and any later start) applies it.
-        self.sunshineController.force_composition = self.settingManager.getSetting("forceComposition", False)
+    async def get_traces(self, limit = 10):
+        """
+        The timings of the last limit start, stop, update and pairing
+        operations, newest first: per operation its duration, result and a
+        span per phase (see tracing.Trace). All traces are also appended to
+        traces.jsonl in the plugin log directory.
+        """
+        return self.sunshineController.tracer.recent(limit)
 
-        lastRunState = self.settingManager.getSetting("lastRunState", "")
-        if lastRunState in ("start", ""):
-            decky.logger.info("Starting Sunshine")
-            # Sunshine may have survived a plugin_loader restart; then this is
-            # an ensure-only pass and the running instance keeps enforcing the
-            # allowances from its own start (see _ensure_csrf_allowed_origin).
-            starting = not await self.sunshineController.isSunshineRunning_async()
-            added_now = await self._ensure_csrf_allowed_origin()
-            started = await self.sunshineController.start_async()
-            if starting and started:
-                self.settingManager.setSetting("csrfRestartPending", False)
-            elif added_now:
-                self.settingManager.setSetting("csrfRestartPending", True)
+    async def get_resource_stats(self, limit = 60):
+        """
+        What Sunshine's process tree costs while it runs: summaries (min,
+        max, median, 95th percentile, last) of its CPU, memory, thread and
+        I/O use, and the last limit samples. See
+        SunshineController.getResourceStats.
+        """
+        return self.sunshineController.getResourceStats(limit)
+
+    async def get_telemetry(self, limit = 60):
+        """
+        The device's GPU load, clocks, power draw, temperature and CPU load
+        while Sunshine runs - whether a stuttering stream is GPU-bound,
+        thermally throttled or limited elsewhere: summaries (min, max,
+        median, 95th percentile, last) and the last limit samples. See
+        SunshineController.getTelemetry.
+        """
+        return self.sunshineController.getTelemetry(limit)
+
+    async def set_resource_sample_interval(self, seconds):
+        """
+        Persist how often Sunshine's resource use is sampled, in seconds
+        (at least RESOURCE_SAMPLE_INTERVAL_MIN); applies from the next sample on.
+        """
+        seconds = max(float(seconds), self.RESOURCE_SAMPLE_INTERVAL_MIN)
+        self.settingManager.setSetting("resourceSampleInterval", seconds)
+        self.sunshineController.resource_sample_interval = seconds
+        decky.logger.info(f"resourceSampleInterval set to {seconds}")
+        return seconds
+
+    async def get_log_events(self, limit = 50):
+        """
+        The last limit events parsed from sunshine.log (client connects and
+        disconnects, capture method, encoder, video mode, errors), newest
+        first. New events are also pushed with the sunshine_log_events event.
+        """
+        return self.sunshineController.logTailer.recent(limit)
+
+    def _on_log_events(self, events):
+        task = asyncio.get_event_loop().create_task(self._emit_log_events(events))
+        self._log_event_tasks.add(task)
+        task.add_done_callback(self._log_event_tasks.discard)
+        # The stream summary in the pushed state may have changed
+        self._state_changed.set()
+
+    async def _emit_log_events(self, events):
+        try:
+            await decky.emit("sunshine_log_events", events)
+        except Exception as e:
+            decky.logger.exception("An error occurred when pushing Sunshine log events", exc_info=e)
+
+    async def get_boot_progress(self):
+        """
+        The boot steps (see _main) with their status and duration, or None
+        before the boot started.
+        """
+        if self._boot is None:
+            return None
+        return {"done": self._boot.done, "steps": self._boot.steps()}
 
-        decky.logger.info("Decky Sunshine loaded")
+    def _start_state_monitor(self):
+        if self._state_monitor_task is None or self._state_monitor_task.done():
+            self._state_monitor_task = asyncio.get_event_loop().create_task(self._monitor_state())
 
     async def _unload(self):
+        if self._state_monitor_task is not None:
+            self._state_monitor_task.cancel()
+            self._state_monitor_task = None
+        if self._version_refresh_task is not None:
+            self._version_refresh_task.cancel()
+            self._version_refresh_task = None
+        if self.sunshineController is not None:
+            self.sunshineController.stopSupervising()
+            self.sunshineController.stopLogWatch()
+            position = self.sunshineController.logTailer.position()
+            if position is not None and self.settingManager is not None:
+                self.settingManager.setSetting("logTailPosition", position)
         decky.logger.info("Decky Sunshine unloaded")
 
     async def _uninstall(self):
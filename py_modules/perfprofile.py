@@ -0,0 +1,158 @@
+import json
+import os
+import re
+
+_OD_SCLK_MIN = re.compile(r"^\s*0:\s*(\d+)\s*Mhz", re.IGNORECASE)
+
+class PerformanceProfile:
+    """
+    Temporarily raises the device's performance while streaming, through
+    sysfs:
+    - gpu_performance_level: the GPU's power_dpm_force_performance_level
+      (e.g. "high"), so it does not clock down between frames
+    - gpu_min_clock_mhz: a minimum shader clock (OD_SCLK level 0 via
+      pp_od_clk_voltage); implies the "manual" performance level
+    - cpu_governor / cpu_epp: the cpufreq governor and energy performance
+      preference of every CPU policy
+    Unset options are left alone. Before the first write, the values about
+    to be changed are snapshotted as an undo list and persisted to
+    snapshot_path, so they are restored exactly - by restore(), or by the
+    uninstall helper (see restoreWrites()) - even if the plugin died in
+    between. Re-applying while a snapshot exists keeps the original
+    snapshot instead of capturing the profile's own values.
+    """
+
+    def __init__(self, logger, snapshot_path: str) -> None:
+        self.logger = logger
+        self.snapshot_path = snapshot_path
+        # Groups of (path, value) writes undoing the profile; restored in
+        # reverse order, the writes of a group in order
+        self._undo = None
+
+    def apply(self, settings: dict, gpu_devices: list[str], cpufreq_policies: list[str]) -> bool:
+        """
+        :param settings: The profile's options (see the class docstring)
+        :param gpu_devices: sysfs device directories of the GPUs
+        :param cpufreq_policies: sysfs directories of the cpufreq policies
+        :return: True if every write succeeded, False otherwise
+        """
+        groups = []
+        min_clock = settings.get("gpu_min_clock_mhz")
+        level = "manual" if min_clock else settings.get("gpu_performance_level")
+        for device in gpu_devices:
+            level_path = f"{device}/power_dpm_force_performance_level"
+            if level and os.path.exists(level_path):
+                groups.append([(level_path, level)])
+                od_path = f"{device}/pp_od_clk_voltage"
+                if min_clock and os.path.exists(od_path):
+                    groups.append([(od_path, f"s 0 {int(min_clock)}"), (od_path, "c")])
+        governor, epp = settings.get("cpu_governor"), settings.get("cpu_epp")
+        for policy in cpufreq_policies:
+            group = []
+            if governor:
+                group.append((f"{policy}/scaling_governor", governor))
+            if epp and os.path.exists(f"{policy}/energy_performance_preference"):
+                group.append((f"{policy}/energy_performance_preference", epp))
+            if group:
+                groups.append(group)
+        if not groups:
+            return True
+
+        if self._loadSnapshot() is None:
+            try:
+                self._saveSnapshot([self._snapshotGroup(group) for group in groups])
+            except OSError as e:
+                self.logger.error(f"Could not snapshot the values the performance profile changes, not applying it: {e}")
+                return False
+        ok = self._write([write for group in groups for write in group])
+        self.logger.info(f"Applied the performance profile {settings}{'' if ok else ' (partially)'}")
+        return ok
+
+    def restore(self) -> bool:
+        """
+        Restore the snapshotted values, if a profile is applied.
+        :return: True if nothing was to restore or every write succeeded
+        """
+        if self._loadSnapshot() is None:
+            return True
+        ok = self._write(self.restoreWrites())
+        try:
+            os.unlink(self.snapshot_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.warning(f"Could not remove the performance profile snapshot {self.snapshot_path}: {e}")
+        self._undo = None
+        self.logger.info(f"Restored the values the performance profile changed{'' if ok else ' (partially)'}")
+        return ok
+
+    def restoreWrites(self) -> list[tuple[str, str]]:
+        """
+        :return: The (path, value) writes restoring the snapshot, in order
+                 (empty if no profile is applied)
+        """
+        undo = self._loadSnapshot() or []
+        return [tuple(write) for group in reversed(undo) for write in group]
+
+    def _snapshotGroup(self, group: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """
+        :return: The writes undoing the given group of writes
+        """
+        path = group[0][0]
+        if path.endswith("/pp_od_clk_voltage"):
+            # The OD table is set by commands; restore the old minimum and
+            # commit it, while the level is still manual (restored later)
+            return [(path, f"s 0 {self._readOdMinClock(path)}"), (path, "c")]
+        return [(path, self._readValue(path)) for path, _ in group]
+
+    @staticmethod
+    def _readValue(path: str) -> str:
+        with open(path) as f:
+            value = f.read().strip()
+        # Some attributes list all options with the current one bracketed
+        # ("low auto [high]"); others, like these, only hold the current one
+        match = re.search(r"\[(\S+)\]", value)
+        return match[1] if match is not None else value
+
+    @staticmethod
+    def _readOdMinClock(path: str) -> int:
+        in_sclk = False
+        with open(path) as f:
+            for line in f:
+                if line.startswith("OD_"):
+                    in_sclk = line.startswith("OD_SCLK")
+                    continue
+                match = _OD_SCLK_MIN.match(line) if in_sclk else None
+                if match is not None:
+                    return int(match[1])
+        raise OSError(f"No OD_SCLK minimum in {path}")
+
+    def _write(self, writes: list[tuple[str, str]]) -> bool:
+        ok = True
+        for path, value in writes:
+            try:
+                with open(path, "w") as f:
+                    f.write(value)
+            except OSError as e:
+                self.logger.warning(f"Could not write {value!r} to {path}: {e}")
+                ok = False
+        return ok
+
+    def _loadSnapshot(self) -> list | None:
+        if self._undo is None:
+            try:
+                with open(self.snapshot_path) as f:
+                    self._undo = json.load(f)["undo"]
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.logger.warning(f"Ignoring the unreadable performance profile snapshot {self.snapshot_path}: {e}")
+        return self._undo
+
+    def _saveSnapshot(self, undo: list) -> None:
+        os.makedirs(os.path.dirname(self.snapshot_path), mode=0o700, exist_ok=True)
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"undo": undo}, f)
+        os.replace(temp_path, self.snapshot_path)
+        self._undo = undo
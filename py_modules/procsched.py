@@ -0,0 +1,199 @@
+import ctypes
+import errno
+import os
+import platform
+import re
+import threading
+
+# ioprio_set(2) has no libc wrapper; its syscall number per architecture
+_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i686": 289}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_IO_CLASSES = {"none": 0, "realtime": 1, "best-effort": 2, "idle": 3}
+
+class ProcessTreeScheduler:
+    """
+    Applies scheduling settings to every thread of a process tree, so the
+    streaming server does not compete equally with the game:
+    - nice: the nice level (-20 to 19)
+    - io_class / io_level: the I/O priority ("realtime", "best-effort" or
+      "idle", and 0 to 7 within the class)
+    - realtime_threads / realtime_priority: a regular expression matched
+      against the thread names (/proc/<pid>/task/<tid>/comm); matching
+      threads, e.g. capture and encoding, run under SCHED_RR at the given
+      priority (1 to 99)
+    - cpus: the CPUs the tree may run on
+    Unset options are left alone. All of these are per thread on Linux and
+    inherited by new threads and processes from their creator, but threads
+    that already exist have to be set one by one, and a process may change
+    its own - so apply() is meant to be called periodically: it only touches
+    threads it has not seen yet (by TID and start time), and logs each change
+    per process. When the settings change, the threads changed before are
+    reset to the defaults (nice 0, no I/O priority, SCHED_OTHER, all CPUs)
+    first.
+    """
+
+    def __init__(self, logger, find_tree, proc_root: str = "/proc") -> None:
+        """
+        :param find_tree: Returns the PIDs of a process tree given its root
+                          (see procstats.ProcessTreeSampler.findTree)
+        """
+        self.logger = logger
+        self.find_tree = find_tree
+        self.proc_root = proc_root
+        # The settings the threads in _applied got
+        self._settings = {}
+        # (tid, start time) of the threads seen -> whether they were changed
+        self._applied = {}
+        # (pid, what) of failures already logged
+        self._failures = set()
+        # The compiled realtime_threads of _settings
+        self._realtime = None
+        self._libc = None
+        # Serializes passes; they run in worker threads, and a pass of a
+        # cancelled task may still be running when the next one starts
+        self._lock = threading.Lock()
+
+    def apply(self, root_pid: int, settings: dict) -> None:
+        """
+        Apply settings to the threads of the tree below root_pid that were
+        not seen yet - or to all of them, if the settings changed.
+        :param settings: The options (see the class docstring); nothing is
+                         applied unless "enabled" is set
+        """
+        with self._lock:
+            self._apply(root_pid, settings)
+
+    def _apply(self, root_pid: int, settings: dict) -> None:
+        settings = settings if settings.get("enabled") else {}
+        if settings != self._settings:
+            self._reset(root_pid)
+            self._settings = dict(settings)
+            self._realtime = None
+            if settings.get("realtime_threads"):
+                try:
+                    self._realtime = re.compile(settings["realtime_threads"])
+                except re.error as e:
+                    self.logger.warning(f"Ignoring the invalid realtime thread pattern {settings['realtime_threads']!r}: {e}")
+        if not settings:
+            return
+        seen = {}
+        for pid in self.find_tree(root_pid):
+            new_threads = []
+            for tid, start_time, name in self._listThreads(pid):
+                key = (tid, start_time)
+                if key in self._applied:
+                    seen[key] = self._applied[key]
+                    continue
+                seen[key] = True
+                new_threads.append((tid, name))
+            if new_threads:
+                self._applyProcess(pid, new_threads, settings)
+        # Forget exited threads, so reused TIDs count as new
+        self._applied = seen
+
+    def _applyProcess(self, pid: int, threads: list[tuple[int, str]], settings: dict) -> None:
+        changes = {}
+        realtime = self._realtime if settings.get("realtime_threads") else None
+        realtime_names = set()
+        for tid, name in threads:
+            if settings.get("nice") is not None:
+                self._change(changes, pid, "nice", lambda: os.setpriority(os.PRIO_PROCESS, tid, int(settings["nice"])))
+            if settings.get("io_class"):
+                self._change(changes, pid, "I/O priority", lambda: self._setIoPriority(tid, settings["io_class"], int(settings.get("io_level") or 0)))
+            if settings.get("cpus"):
+                self._change(changes, pid, "CPU affinity", lambda: os.sched_setaffinity(tid, settings["cpus"]))
+            if realtime is not None and realtime.search(name):
+                priority = int(settings.get("realtime_priority") or 1)
+                if self._change(changes, pid, "SCHED_RR", lambda: os.sched_setscheduler(tid, os.SCHED_RR, os.sched_param(priority))):
+                    realtime_names.add(name)
+        if not changes:
+            return
+        applied = []
+        if "nice" in changes:
+            applied.append(f"nice {settings['nice']}")
+        if "I/O priority" in changes:
+            applied.append(f"I/O priority {settings['io_class']}/{settings.get('io_level') or 0}")
+        if "CPU affinity" in changes:
+            applied.append(f"CPUs {','.join(str(cpu) for cpu in sorted(settings['cpus']))}")
+        if "SCHED_RR" in changes:
+            applied.append(f"SCHED_RR {settings.get('realtime_priority') or 1} for {', '.join(sorted(realtime_names))}")
+        names = sorted({name for _, name in threads})
+        self.logger.info(f"Set the scheduling of {len(threads)} thread(s) of pid {pid} ({', '.join(names)}): {'; '.join(applied)}")
+
+    def _change(self, changes: dict, pid: int, what: str, setter) -> bool:
+        try:
+            setter()
+        except ProcessLookupError:
+            # The thread exited meanwhile
+            return False
+        except (OSError, ValueError) as e:
+            if (pid, what) not in self._failures:
+                self._failures.add((pid, what))
+                self.logger.warning(f"Could not set the {what} of pid {pid}: {e}")
+            return False
+        changes[what] = True
+        return True
+
+    def _reset(self, root_pid: int) -> None:
+        """
+        Reset the threads changed with the previous settings to the defaults.
+        """
+        if not any(self._applied.values()):
+            self._applied = {}
+            return
+        previous = self._settings
+        defaults = {
+            "nice": 0 if previous.get("nice") is not None else None,
+            "io_class": "none" if previous.get("io_class") else None,
+            "cpus": list(range(os.cpu_count() or 1)) if previous.get("cpus") else None,
+        }
+        for pid in self.find_tree(root_pid):
+            threads = [(tid, name) for tid, start_time, name in self._listThreads(pid) if self._applied.get((tid, start_time))]
+            if previous.get("realtime_threads"):
+                for tid, _ in threads:
+                    try:
+                        os.sched_setscheduler(tid, os.SCHED_OTHER, os.sched_param(0))
+                    except OSError:
+                        pass
+            self._applyProcess(pid, threads, defaults)
+        self._applied = {}
+        self._failures = set()
+        self.logger.info(f"Reset the scheduling of the tree of pid {root_pid} to the defaults")
+
+    def _listThreads(self, pid: int) -> list[tuple[int, int, str]]:
+        """
+        :return: (TID, start time, name) of the threads of pid (empty if the
+                 process is gone)
+        """
+        try:
+            tids = os.listdir(f"{self.proc_root}/{pid}/task")
+        except FileNotFoundError:
+            return []
+        threads = []
+        for tid in tids:
+            try:
+                with open(f"{self.proc_root}/{pid}/task/{tid}/stat") as f:
+                    stat_line = f.read()
+            except OSError:
+                continue
+            # The name is parenthesized and may contain spaces or parentheses
+            name = stat_line[stat_line.find("(") + 1:stat_line.rfind(")")]
+            fields = stat_line[stat_line.rfind(")") + 2:].split()
+            if len(fields) < 20:
+                continue
+            threads.append((int(tid), int(fields[19]), name))
+        return threads
+
+    def _setIoPriority(self, tid: int, io_class: str, level: int) -> None:
+        number = _IOPRIO_SET.get(platform.machine())
+        if number is None:
+            raise OSError(errno.ENOSYS, f"ioprio_set is not known on {platform.machine()}")
+        if io_class not in _IO_CLASSES:
+            raise ValueError(f"Unknown I/O class {io_class!r}")
+        if self._libc is None:
+            self._libc = ctypes.CDLL(None, use_errno=True)
+        ioprio = _IO_CLASSES[io_class] << _IOPRIO_CLASS_SHIFT | (level if io_class != "none" else 0)
+        if self._libc.syscall(number, _IOPRIO_WHO_PROCESS, tid, ioprio) == -1:
+            error = ctypes.get_errno()
+            raise (ProcessLookupError if error == errno.ESRCH else OSError)(error, os.strerror(error))
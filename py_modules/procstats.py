@@ -0,0 +1,239 @@
+import array
+import math
+import os
+import time
+
+class RingBuffer:
+    """
+    A fixed number of samples of a fixed set of numeric fields, kept in one
+    preallocated array of doubles per field: appending overwrites the oldest
+    sample once full, and nothing is allocated per sample. NaN marks a value
+    that was not available; it is reported as None and left out of the
+    summaries.
+    """
+
+    def __init__(self, fields: tuple[str, ...], capacity: int) -> None:
+        self.fields = fields
+        self.capacity = capacity
+        self._columns = {field: array.array("d", bytes(8 * capacity)) for field in fields}
+        # Where the next sample goes, and how many samples are stored
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, sample: dict) -> None:
+        for field in self.fields:
+            self._columns[field][self._next] = sample[field]
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def clear(self) -> None:
+        self._next = 0
+        self._count = 0
+
+    def column(self, field: str, limit: int | None = None) -> list[float]:
+        """
+        :return: The last limit (default: all) values of field, oldest first
+        """
+        count = self._count if limit is None else min(limit, self._count)
+        start = (self._next - count) % self.capacity
+        column = self._columns[field]
+        if start + count <= self.capacity:
+            return column[start:start + count].tolist()
+        return column[start:].tolist() + column[:start + count - self.capacity].tolist()
+
+    def series(self, limit: int) -> list[dict]:
+        """
+        :return: The last limit samples, oldest first
+        """
+        columns = [self.column(field, limit) for field in self.fields]
+        return [
+            {field: None if math.isnan(value) else value for field, value in zip(self.fields, values)}
+            for values in zip(*columns)
+        ]
+
+    def summary(self, fields: tuple[str, ...] | None = None) -> dict:
+        """
+        :return: Per field the minimum, maximum, median, 95th percentile and
+                 last value over all stored samples (empty without samples;
+                 None for a field without any available value)
+        """
+        if self._count == 0:
+            return {}
+        result = {}
+        for field in fields or self.fields:
+            values = [value for value in self.column(field) if not math.isnan(value)]
+            if not values:
+                result[field] = None
+                continue
+            ordered = sorted(values)
+            result[field] = {
+                "min": ordered[0],
+                "max": ordered[-1],
+                "p50": self._percentile(ordered, 50),
+                "p95": self._percentile(ordered, 95),
+                "last": values[-1],
+            }
+        return result
+
+    @staticmethod
+    def _percentile(ordered: list[float], percent: float) -> float:
+        # Nearest rank
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+class ProcessTreeSampler:
+    """
+    Samples the resource use of a process and all its descendants from
+    /proc: CPU (utime + stime of /proc/<pid>/stat, as a percentage of one
+    core since the previous sample), resident memory (VmRSS of
+    /proc/<pid>/status), threads and storage I/O (read_bytes and
+    write_bytes of /proc/<pid>/io, as bytes per second). Descendants are
+    found through /proc/<pid>/task/<tid>/children, or by scanning all of
+    /proc for parent PIDs on kernels without it.
+    """
+    Fields = ("time", "cpu_percent", "rss_bytes", "threads", "processes", "read_bytes_per_second", "write_bytes_per_second")
+
+    def __init__(self, proc_root: str = "/proc") -> None:
+        self.proc_root = proc_root
+        self._ticks_per_second = os.sysconf("SC_CLK_TCK")
+        # (pid, start time) -> (cpu ticks, read bytes, written bytes) at the
+        # previous sample, so exited processes and reused PIDs do not make
+        # the totals jump
+        self._previous = {}
+        self._previous_at = None
+        self._children_supported = True
+
+    def reset(self) -> None:
+        """
+        Forget the previous sample, e.g. when a new instance is sampled.
+        """
+        self._previous = {}
+        self._previous_at = None
+
+    def sample(self, root_pid: int) -> dict | None:
+        """
+        :return: The tree's sample (see Fields), or None if the root process
+                 is gone or this is the first sample (rates need two)
+        """
+        now = time.monotonic()
+        current = {}
+        rss = threads = 0
+        for pid in self.findTree(root_pid):
+            stats = self._readProcess(pid)
+            if stats is None:
+                continue
+            start_time, ticks, process_threads, process_rss, read_bytes, write_bytes = stats
+            current[(pid, start_time)] = (ticks, read_bytes, write_bytes)
+            rss += process_rss
+            threads += process_threads
+        if not current:
+            self.reset()
+            return None
+
+        previous, previous_at = self._previous, self._previous_at
+        self._previous, self._previous_at = current, now
+        if previous_at is None or now <= previous_at:
+            return None
+        elapsed = now - previous_at
+        # New processes count from zero: they started after the previous sample
+        deltas = [
+            [max(value - before, 0) for value, before in zip(values, previous.get(key, (0, 0, 0)))]
+            for key, values in current.items()
+        ]
+        ticks, read_bytes, write_bytes = (sum(column) for column in zip(*deltas))
+        return {
+            "time": time.time(),
+            "cpu_percent": ticks / self._ticks_per_second / elapsed * 100,
+            "rss_bytes": rss,
+            "threads": threads,
+            "processes": len(current),
+            "read_bytes_per_second": read_bytes / elapsed,
+            "write_bytes_per_second": write_bytes / elapsed,
+        }
+
+    def findTree(self, root_pid: int) -> list[int]:
+        """
+        :return: The PIDs of the process and all its descendants, parents
+                 before their children (empty if the process is gone)
+        """
+        if not os.path.exists(f"{self.proc_root}/{root_pid}"):
+            return []
+        if self._children_supported and not os.path.exists(f"{self.proc_root}/{root_pid}/task/{root_pid}/children"):
+            # The kernel lacks CONFIG_PROC_CHILDREN
+            self._children_supported = False
+        if self._children_supported:
+            return self._findTreeByChildren(root_pid)
+        return self._findTreeByScan(root_pid)
+
+    def _findTreeByChildren(self, root_pid: int) -> list[int]:
+        tree = [root_pid]
+        for pid in tree:
+            try:
+                tids = os.listdir(f"{self.proc_root}/{pid}/task")
+            except FileNotFoundError:
+                continue
+            for tid in tids:
+                try:
+                    with open(f"{self.proc_root}/{pid}/task/{tid}/children") as f:
+                        tree.extend(int(child) for child in f.read().split())
+                except FileNotFoundError:
+                    # The thread or process exited meanwhile
+                    continue
+        return tree
+
+    def _findTreeByScan(self, root_pid: int) -> list[int]:
+        children = {}
+        for entry in os.listdir(self.proc_root):
+            if not entry.isdigit():
+                continue
+            fields = self._readStatFields(int(entry))
+            if fields is not None:
+                children.setdefault(int(fields[1]), []).append(int(entry))
+        tree = [root_pid]
+        for pid in tree:
+            tree.extend(children.get(pid, []))
+        return tree
+
+    def _readStatFields(self, pid: int) -> list[str] | None:
+        """
+        :return: The fields of /proc/<pid>/stat after the command name
+                 (state first), or None if the process is gone
+        """
+        try:
+            with open(f"{self.proc_root}/{pid}/stat") as f:
+                stat_line = f.read()
+        except OSError:
+            return None
+        # The command name is parenthesized and may contain spaces or
+        # parentheses itself, so split after its closing parenthesis
+        return stat_line[stat_line.rfind(")") + 2:].split()
+
+    def _readProcess(self, pid: int) -> tuple[int, int, int, int, int, int] | None:
+        """
+        :return: (start time, utime + stime in ticks, threads, RSS in bytes,
+                 read bytes, written bytes), or None if the process is gone
+        """
+        fields = self._readStatFields(pid)
+        if fields is None or len(fields) < 20 or fields[0] in ("Z", "X"):
+            return None
+        rss = 0
+        read_bytes = write_bytes = 0
+        try:
+            with open(f"{self.proc_root}/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss = int(line.split()[1]) * 1024
+                        break
+            with open(f"{self.proc_root}/{pid}/io") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key == "read_bytes":
+                        read_bytes = int(value)
+                    elif key == "write_bytes":
+                        write_bytes = int(value)
+        except OSError:
+            # Gone meanwhile; a kernel without task I/O accounting has no io
+            pass
+        return int(fields[19]), int(fields[11]) + int(fields[12]), int(fields[17]), rss, read_bytes, write_bytes
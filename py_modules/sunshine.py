@@ -1,29 +1,41 @@
 import shlex
 import shutil
+import signal
 import stat
 import subprocess
 import os
 import base64
+import collections
+import ctypes
+import fcntl
 import json
 import ssl
 import asyncio
 import secrets
 import glob
+import hashlib
 import socket
 import pwd
 import re
+import time
 
 from typing import Sequence
-from urllib.error import URLError
-from urllib.request import Request, HTTPError, HTTPRedirectHandler, build_opener, HTTPSHandler
+
+import perfprofile
+import procsched
+import procstats
+import sunshineconf
+import sunshinelog
+import sysevents
+import telemetry
+import tracing
+import x11
+
+from tracing import span, traced
 from http.client import OK, UNAUTHORIZED
 from enum import Enum
 from dataclasses import dataclass
 
-class NoRedirect(HTTPRedirectHandler):
-    def redirect_request(self, req, fp, code, msg, headers, newurl):
-        return None
-
 class RequestError(Enum):
     UNAUTHORIZED = "unauthorized"
     UNREACHABLE = "unreachable"
@@ -49,11 +61,553 @@ class RequestResult:
     def is_unreachable(self) -> bool:
         return self.error == RequestError.UNREACHABLE
 
+class DrmModeCardRes(ctypes.Structure):
+    """
+    struct drm_mode_card_res from the kernel's uapi/drm/drm_mode.h
+    """
+    _fields_ = [
+        ("fb_id_ptr", ctypes.c_uint64),
+        ("crtc_id_ptr", ctypes.c_uint64),
+        ("connector_id_ptr", ctypes.c_uint64),
+        ("encoder_id_ptr", ctypes.c_uint64),
+        ("count_fbs", ctypes.c_uint32),
+        ("count_crtcs", ctypes.c_uint32),
+        ("count_connectors", ctypes.c_uint32),
+        ("count_encoders", ctypes.c_uint32),
+        ("min_width", ctypes.c_uint32),
+        ("max_width", ctypes.c_uint32),
+        ("min_height", ctypes.c_uint32),
+        ("max_height", ctypes.c_uint32),
+    ]
+
+class DrmModeCrtc(ctypes.Structure):
+    """
+    struct drm_mode_crtc from the kernel's uapi/drm/drm_mode.h; the embedded
+    struct drm_mode_modeinfo is not needed and kept opaque
+    """
+    _fields_ = [
+        ("set_connectors_ptr", ctypes.c_uint64),
+        ("count_connectors", ctypes.c_uint32),
+        ("crtc_id", ctypes.c_uint32),
+        ("fb_id", ctypes.c_uint32),
+        ("x", ctypes.c_uint32),
+        ("y", ctypes.c_uint32),
+        ("gamma_size", ctypes.c_uint32),
+        ("mode_valid", ctypes.c_uint32),
+        ("mode", ctypes.c_uint8 * 68),
+    ]
+
+def _drmIowr(nr: int, struct_type) -> int:
+    """
+    The _IOWR('d', nr, struct_type) ioctl request number of a DRM ioctl.
+    """
+    return (3 << 30) | (ctypes.sizeof(struct_type) << 16) | (ord("d") << 8) | nr
+
+DRM_IOCTL_MODE_GETRESOURCES = _drmIowr(0xA0, DrmModeCardRes)
+DRM_IOCTL_MODE_GETCRTC = _drmIowr(0xA1, DrmModeCrtc)
+
+class SunshineApiClient:
+    """
+    Asyncio-native HTTP/1.1-over-TLS client for Sunshine's local API,
+    keeping its connections alive. Requests used to run through urllib in
+    the default executor, so each one took a slot of the thread pool the
+    subprocess offloads compete for, opened a new TCP connection and did a
+    full TLS handshake; pairing alone makes three requests back to back.
+    Here requests run on the event loop itself (cancellable, with a
+    timeout) and idle connections are pooled. A pooled connection may have
+    been closed by the server meanwhile (idle timeout, Sunshine restarted).
+    Connections whose close already arrived are dropped before use;
+    otherwise it only shows when using the connection - then an idempotent
+    request is retried once on a fresh connection. Other requests are not:
+    the connection may have failed after Sunshine handled them, e.g. a
+    pairing PIN that must not be submitted twice.
+    Only what Sunshine's API needs is supported: GET and JSON POST requests,
+    responses delimited by Content-Length, chunked encoding or EOF.
+    """
+
+    # Idle connections kept at most; the plugin rarely has more than a
+    # couple of requests in flight
+    MaxIdleConnections = 4
+    # Methods that are safe to send again after a failure on a pooled
+    # connection
+    IdempotentMethods = ("GET", "HEAD")
+
+    def __init__(self, host: str, port: int, ssl_context: ssl.SSLContext, timeout: float = 5) -> None:
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self._idle = []
+        # Writers of connections with a request in flight, so close() can
+        # abort them
+        self._busy = set()
+        # Counters making the saved handshakes measurable, see stats()
+        self._stats = {
+            "requests": 0,
+            "reused_connections": 0,
+            "connections_opened": 0,
+            "handshake_seconds": 0.0,
+            "request_seconds": 0.0,
+        }
+
+    async def request(self, method: str, path: str, body: bytes | None, headers: dict, timeout: float | None = None) -> tuple[int, bytes, str | None]:
+        """
+        Perform a request, reusing an idle connection if there is one.
+        :param timeout: Timeout for the whole request including connecting, in seconds (default: the client's)
+        :return: (status code, response body, charset of the content type or None)
+        :raises OSError, EOFError, ValueError: If the request failed
+        :raises asyncio.TimeoutError: If the request did not finish in time
+        """
+        started = time.monotonic()
+        status, content, charset, reused = await asyncio.wait_for(
+            self._perform(method, path, body, headers),
+            self.timeout if timeout is None else timeout
+        )
+        self._stats["requests"] += 1
+        self._stats["reused_connections"] += 1 if reused else 0
+        self._stats["request_seconds"] += time.monotonic() - started
+        return status, content, charset
+
+    def close(self) -> None:
+        """
+        Close all idle connections and abort the ones with a request in
+        flight (those requests fail), e.g. once Sunshine was stopped.
+        """
+        idle, self._idle = self._idle, []
+        for _, writer in idle:
+            writer.close()
+        for writer in list(self._busy):
+            writer.transport.abort()
+
+    def stats(self) -> dict:
+        """
+        :return: The request and handshake counters and accumulated
+                 durations since the client was created
+        """
+        return dict(self._stats)
+
+    async def _perform(self, method: str, path: str, body: bytes | None, headers: dict) -> tuple[int, bytes, str | None, bool]:
+        while self._idle and self._idle[-1][0].at_eof():
+            # Closed by the server while idle
+            self._idle.pop()[1].close()
+        reused = bool(self._idle)
+        reader, writer = self._idle.pop() if reused else await self._connect()
+        self._busy.add(writer)
+        try:
+            try:
+                response = await self._exchange(reader, writer, method, path, body, headers)
+            except (ConnectionError, EOFError):
+                if not reused or method not in self.IdempotentMethods:
+                    raise
+                # The server closed the pooled connection meanwhile
+                writer.close()
+                self._busy.discard(writer)
+                reused = False
+                reader, writer = await self._connect()
+                self._busy.add(writer)
+                response = await self._exchange(reader, writer, method, path, body, headers)
+        except BaseException:
+            # Also on cancellation: the connection is in an unknown state
+            writer.close()
+            raise
+        finally:
+            self._busy.discard(writer)
+        status, content, charset, will_close = response
+        if will_close or len(self._idle) >= self.MaxIdleConnections:
+            writer.close()
+        else:
+            self._idle.append((reader, writer))
+        return status, content, charset, reused
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        started = time.monotonic()
+        connection = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+        self._stats["connections_opened"] += 1
+        self._stats["handshake_seconds"] += time.monotonic() - started
+        return connection
+
+    async def _exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str, body: bytes | None, headers: dict) -> tuple[int, bytes, str | None, bool]:
+        """
+        Send one request and read its response.
+        :return: (status code, body, charset or None, whether the server closes the connection afterwards)
+        """
+        request_headers = {"Host": f"{self.host}:{self.port}", **headers}
+        if body is not None:
+            request_headers["Content-Length"] = str(len(body))
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{key}: {value}\r\n" for key, value in request_headers.items()) + "\r\n"
+        # One write for head and body, so Nagle's algorithm cannot delay the body
+        writer.write(head.encode("latin-1") + (body or b""))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        version, status, _ = (status_line.decode("latin-1").rstrip("\r\n") + " ").split(" ", 2)
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise EOFError("Connection closed within the response headers")
+            if line in (b"\r\n", b"\n"):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+
+        connection_header = response_headers.get("connection", "").lower()
+        will_close = connection_header == "close" or (version == "HTTP/1.0" and connection_header != "keep-alive")
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    # Skip trailers up to the final empty line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            content = b"".join(chunks)
+        elif "content-length" in response_headers:
+            content = await reader.readexactly(int(response_headers["content-length"]))
+        else:
+            content = await reader.read()
+            will_close = True
+
+        charset_match = re.search(r'charset="?([^";\s]+)', response_headers.get("content-type", ""))
+        return int(status), content, charset_match.group(1) if charset_match else None, will_close
+
+class FlatpakInstanceTracker:
+    """
+    Finds the sandbox of a running flatpak app by scanning /proc instead of
+    spawning `flatpak ps`. Every process inside a flatpak sandbox sees the
+    instance's metadata at /.flatpak-info, which the (root) plugin can read
+    through /proc/<pid>/root. The PID found is kept together with its start
+    time, so later checks cost a single stat read until that process is gone
+    (the start time guards against the PID having been reused meanwhile);
+    only then /proc is scanned again.
+    """
+
+    def __init__(self, app_id: str, proc_root: str = "/proc") -> None:
+        self.app_id = app_id
+        self.proc_root = proc_root
+        # (pid, start time in clock ticks since boot) of the tracked process
+        self._tracked = None
+
+    @property
+    def pid(self) -> int | None:
+        """
+        The tracked PID as of the last find(), without re-checking it.
+        """
+        return self._tracked[0] if self._tracked else None
+
+    def find(self) -> int | None:
+        """
+        :return: The PID of the sandbox's topmost process (the lowest PID
+                 inside the sandbox), or None if the app is not running
+        :raises OSError: If /proc cannot be listed at all
+        """
+        if self.isTrackedAlive():
+            return self._tracked[0]
+        self._tracked = self._scan()
+        return self.pid
+
+    def isTrackedAlive(self) -> bool:
+        """
+        Whether the tracked process is still alive, without rescanning.
+        """
+        return self._tracked is not None and self._isAlive(*self._tracked)
+
+    def forget(self) -> None:
+        """
+        Drop the tracked PID, so the next find() rescans /proc.
+        """
+        self._tracked = None
+
+    def _scan(self) -> tuple[int, int] | None:
+        pids = sorted(int(entry) for entry in os.listdir(self.proc_root) if entry.isdigit())
+        for pid in pids:
+            if not self._belongsToApp(pid):
+                continue
+            start_time = self._readStartTime(pid)
+            if start_time is not None:
+                return pid, start_time
+        return None
+
+    def _belongsToApp(self, pid: int) -> bool:
+        try:
+            with open(f"{self.proc_root}/{pid}/root/.flatpak-info") as f:
+                in_application = False
+                for line in f:
+                    line = line.strip()
+                    if line.startswith("["):
+                        in_application = line == "[Application]"
+                    elif in_application and line.partition("=")[0].strip() == "name":
+                        return line.partition("=")[2].strip() == self.app_id
+        except OSError:
+            # Not sandboxed (no such file), gone meanwhile or a kernel thread
+            pass
+        return False
+
+    def _isAlive(self, pid: int, start_time: int) -> bool:
+        return self._readStartTime(pid) == start_time
+
+    def _readStartTime(self, pid: int) -> int | None:
+        """
+        :return: The start time field of /proc/<pid>/stat, or None if the
+                 process is gone or a zombie
+        """
+        try:
+            with open(f"{self.proc_root}/{pid}/stat") as f:
+                stat_line = f.read()
+        except OSError:
+            return None
+        # The command name (field 2) is parenthesized and may contain spaces
+        # or parentheses itself, so split after its closing parenthesis
+        fields = stat_line[stat_line.rfind(")") + 2:].split()
+        if len(fields) < 20 or fields[0] in ("Z", "X"):
+            return None
+        return int(fields[19])
+
+class ProcessSupervisor:
+    """
+    Watches the running Sunshine instance and reports its exit the moment it
+    happens, through a pidfd registered with the event loop (see
+    sysevents.PidfdWatch); without pidfds, liveness is polled every
+    PollInterval instead. Also keeps the restart policy: an exponential
+    backoff between restarts, reset once an instance stayed up for
+    StableUptime, and a crash loop - CrashLoopLimit exits within
+    CrashLoopWindow - ends the restarts.
+    """
+    PollInterval = 2
+    RestartBackoffMin = 2
+    RestartBackoffMax = 60
+    StableUptime = 60
+    CrashLoopLimit = 5
+    CrashLoopWindow = 5 * 60
+
+    def __init__(self, logger, on_exit) -> None:
+        """
+        :param on_exit: Called with the instance's uptime in seconds when the
+                        watched instance exited
+        """
+        self.logger = logger
+        self._on_exit = on_exit
+        self._pid = None
+        self._process = None
+        self._watch = None
+        self._poll_task = None
+        self._started_at = None
+        self._exited = asyncio.Event()
+        self._exited.set()
+        # When the recent exits happened, for the crash loop detection
+        self._exit_times = collections.deque(maxlen=self.CrashLoopLimit)
+        self._backoff = self.RestartBackoffMin
+        self._pidfd_warned = False
+
+    @property
+    def pid(self) -> int | None:
+        """
+        The PID of the watched instance, or None if none is watched.
+        """
+        return self._pid
+
+    def watch(self, pid: int, is_alive, process: subprocess.Popen | None = None) -> None:
+        """
+        Watch the instance with the given PID (a no-op if it is watched already).
+        :param is_alive: Callable telling whether the instance is still alive;
+                         guards against the PID having been reused before the
+                         pidfd was opened, and used for polling without pidfds
+        :param process: The launched process, if started by this plugin; it
+                        is reaped once the instance exited
+        """
+        if pid == self._pid:
+            if process is not None:
+                self._process = process
+            return
+        self.close()
+        self._pid = pid
+        self._process = process
+        self._started_at = time.monotonic()
+        self._exited.clear()
+        loop = asyncio.get_event_loop()
+        try:
+            self._watch = sysevents.PidfdWatch(pid, self._onExit)
+        except OSError as e:
+            if not self._pidfd_warned:
+                self.logger.warning(f"pidfds are not available, polling whether Sunshine is running instead: {e}")
+                self._pidfd_warned = True
+            self._poll_task = loop.create_task(self._poll(is_alive))
+            return
+        self._watch.attach(loop)
+        if not is_alive():
+            self._onExit()
+
+    async def waitExit(self, timeout: float) -> bool:
+        """
+        :return: True if the watched instance exited (or none is watched)
+                 within timeout seconds, False otherwise
+        """
+        try:
+            await asyncio.wait_for(self._exited.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def nextRestartDelay(self, uptime: float) -> float | None:
+        """
+        Record an exit and get the delay before the next restart.
+        :param uptime: How long the instance ran, in seconds
+        :return: The delay in seconds, or None in a crash loop
+        """
+        now = time.monotonic()
+        self._exit_times.append(now)
+        if uptime >= self.StableUptime:
+            self._backoff = self.RestartBackoffMin
+        if len(self._exit_times) == self.CrashLoopLimit and now - self._exit_times[0] <= self.CrashLoopWindow:
+            return None
+        delay = self._backoff
+        self._backoff = min(self._backoff * 2, self.RestartBackoffMax)
+        return delay
+
+    def resetRestarts(self) -> None:
+        """
+        Forget past exits, e.g. when the user starts Sunshine again after a
+        crash loop.
+        """
+        self._exit_times.clear()
+        self._backoff = self.RestartBackoffMin
+
+    def close(self) -> None:
+        """
+        Stop watching without reporting an exit.
+        """
+        if self._watch is not None:
+            self._watch.close()
+            self._watch = None
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+        self._pid = None
+        self._exited.set()
+
+    async def _poll(self, is_alive) -> None:
+        while is_alive():
+            await asyncio.sleep(self.PollInterval)
+        self._poll_task = None
+        self._onExit()
+
+    def _onExit(self) -> None:
+        uptime = time.monotonic() - self._started_at
+        self.close()
+        # flatpak run execs bwrap, which ends with the sandbox; reap it so
+        # it does not linger as a zombie
+        if self._process is not None and self._process.poll() is None:
+            asyncio.get_event_loop().create_task(self._reap(self._process))
+        self._process = None
+        self._on_exit(uptime)
+
+    async def _reap(self, process: subprocess.Popen) -> None:
+        for _ in range(20):
+            if process.poll() is not None:
+                return
+            await asyncio.sleep(0.25)
+
+class SessionEnvironment:
+    """
+    Memoizes facts about the user session that are costly to look up
+    (directory scans, passwd lookups, socket connects) and only change along
+    with the session's runtime directories: values are kept until inotify
+    reports an entry being created, removed or renamed under /run/user (or a
+    pulse-* entry in /tmp), or until a caller invalidates them, e.g. after a
+    failed connection. Without inotify nothing is memoized, and every get()
+    resolves anew.
+    """
+    WatchMask = (
+        sysevents.IN_CREATE | sysevents.IN_DELETE | sysevents.IN_MOVED_FROM
+        | sysevents.IN_MOVED_TO | sysevents.IN_ONLYDIR
+    )
+
+    def __init__(self, logger) -> None:
+        self.logger = logger
+        self._values = {}
+        # Bumped on every invalidation, so a value resolved (in a worker
+        # thread) across an invalidation is not stored
+        self._generation = 0
+        self._watcher = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Start watching for changes (and memoizing) on the given loop.
+        """
+        if self._watcher is not None:
+            return
+        try:
+            self._watcher = sysevents.Inotify(self._onChange)
+        except OSError as e:
+            self.logger.warning(f"inotify is not available, the session user and audio socket are looked up on every use: {e}")
+            return
+        self._updateWatches()
+        self._watcher.attach(loop)
+
+    def get(self, key: str, resolve, cacheable=None):
+        """
+        :param resolve: Callable looking the value up
+        :param cacheable: Callable telling whether a resolved value may be
+                          memoized (e.g. not a transient failure); all may
+                          be if omitted
+        :return: The memoized value of key, or the one resolve() returns
+        """
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        generation = self._generation
+        value = resolve()
+        if self._watcher is not None and generation == self._generation and (cacheable is None or cacheable(value)):
+            self._values[key] = value
+        return value
+
+    def invalidate(self, key: str | None = None) -> None:
+        """
+        Drop the memoized value of key, or all values.
+        """
+        self._generation += 1
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
+
+    def _onChange(self, path: str, name: str, mask: int) -> None:
+        # /tmp is only watched for legacy /tmp/pulse-* socket directories
+        if path == "/tmp" and not name.startswith("pulse-"):
+            return
+        self.invalidate()
+        # Directories created since the last call get watched from now on
+        self._updateWatches()
+
+    def _updateWatches(self) -> None:
+        paths = ["/run/user", "/tmp"] + glob.glob("/run/user/*") + glob.glob("/run/user/*/pulse") + glob.glob("/tmp/pulse-*")
+        for path in paths:
+            self._watcher.addWatch(path, self.WatchMask)
+
 class SunshineController:
     SunshineFlatpakAppId = "dev.lizardbyte.app.Sunshine"
     # Sunshine runs as root, so its config lives in the root user's home
     SunshineConfigPath = "/root/.var/app/dev.lizardbyte.app.Sunshine/config/sunshine/sunshine.conf"
+    SunshineLogPath = "/root/.var/app/dev.lizardbyte.app.Sunshine/config/sunshine/sunshine.log"
     WebUiPort = 47990
+    # The trusted system bwrap the setuid copy is made from (see __init__)
+    BwrapSourcePath = "/usr/bin/bwrap"
+    # DRM card nodes probed for a display, see _probeDisplayNative()
+    DrmCardPattern = "/dev/dri/card[0-9]*"
+    # Where the DRM cards and their connectors show up in sysfs
+    DrmSysfsRoot = "/sys/class/drm"
+    CpufreqSysfsRoot = "/sys/devices/system/cpu/cpufreq"
+    # Where the values the performance profile changed are kept until they
+    # are restored; on tmpfs, as sysfs forgets the profile on reboot too
+    PerformanceSnapshotPath = "/run/decky-sunshine/performance-profile.json"
+    # gamescope's XWayland display number
+    X11Display = 0
     logger = None
 
     authHeader = ""
@@ -62,12 +616,54 @@ class SunshineController:
     # kept as state so the retry loop in start_async does not repeat it every second
     _socket_fallback_warned = False
 
-    def __init__(self, logger) -> None:
+    # How long start_async waits for a display and the audio subsystem at
+    # most, and the bounds of its safety-net poll interval, in seconds
+    ReadinessTimeout = 60
+    ReadinessPollMin = 0.1
+    ReadinessPollMax = 1
+    # How long pair_async waits for a paired client to show up in the
+    # client list at most by default, and the bounds of its poll interval,
+    # in seconds; a wrong PIN - the usual failure - only ends at the
+    # deadline, so it is kept short
+    PairingConfirmTimeout = 3
+    PairingPollMin = 0.05
+    PairingPollMax = 0.5
+    # Interval of the composition watcher's dock state poll (only without
+    # hotplug uevents), and the delay before a failed atom watch is started
+    # again, in seconds
+    CompositionPollInterval = 5
+    AtomWatchRetryInterval = 30
+    # How long stop_async waits for Sunshine to exit, in seconds
+    StopTimeout = 5
+    # How long the log watch lets writes to sunshine.log accumulate before
+    # reading them, and its poll interval without inotify, in seconds
+    LogReadDelay = 0.25
+    LogPollInterval = 5
+    # Default interval of the resource sampler, in seconds, and how many
+    # samples it keeps (30 minutes' worth at the default interval)
+    ResourceSampleInterval = 2
+    ResourceHistory = 900
+    # How often threads and processes Sunshine started since are given the
+    # scheduling settings, in seconds; new threads inherit them from their
+    # creator, so this only catches ones created before they were applied
+    SchedulingInterval = 1
+    # Interval of the device telemetry sampler while Sunshine runs, in
+    # seconds, and how many samples it keeps (30 minutes' worth)
+    TelemetrySampleInterval = 1
+    TelemetryHistory = 1800
+    # How long to use xprop before trying to connect to the X server
+    # natively again after a failed attempt, in seconds
+    X11RetryInterval = 60
+
+    def __init__(self, logger, trace_path: str | None = None) -> None:
         """
         Initialize the SunshineController instance.
+        :param trace_path: File the timings of start, stop, update and pairing
+                           are appended to (see tracing.Tracer), if any
         """
         assert logger is not None
         self.logger = logger
+        self.tracer = tracing.Tracer(logger, trace_path)
 
         # Whether to force gamescope composition (vs direct scanout) while
         # streaming. Applied at the end of start_async and cleared in stop_async,
@@ -75,7 +671,7 @@ class SunshineController:
         # effect while an external display is connected: the capture glitch it
         # fixes only manifests there, and undocked it would just cost battery
         # (an extra fullscreen composite pass per frame instead of direct
-        # scanout). See setCompositionForce() for the why.
+        # scanout). See setCompositionForce_async() for the why.
         self.force_composition = False
 
         # Watcher task following dock changes and re-asserting the composition
@@ -85,18 +681,80 @@ class SunshineController:
         # None if we have not written it yet (then the actual value is
         # whatever gamescope initialized it to)
         self._composition_applied = None
-        # Remaining atom verification reads after a write, see
-        # _reconcileCompositionForce()
-        self._composition_verify_remaining = 0
+        # Watch on the atom while the override is applied, whether it has
+        # changed since it was last read, and when a failed watch may be
+        # started again; see _updateAtomWatch()
+        self._atom_watch_task = None
+        self._composition_atom_changed = False
+        self._atom_watch_retry_at = 0
         # Whether the display-detection failure has already been logged, so a
         # persistent failure does not spam the log from the watcher loop
         self._display_check_warned = False
+        # Whether the hotplug-uevent fallback has already been logged, so
+        # every watcher start does not repeat it
+        self._hotplug_listener_warned = False
+        # Persistent connection to gamescope's XWayland for the composition
+        # atom, see _getX11Client_async()
+        self._x11 = None
+        self._x11_retry_at = 0
+        self._x11_fallback_warned = False
+        # sunshine.conf, parsed once and re-read only when it changes
+        self.config = sunshineconf.SunshineConfig(self.SunshineConfigPath)
+        # Follows sunshine.log, see startLogWatch()
+        self.logTailer = sunshinelog.LogTailer(self.SunshineLogPath)
+        self._log_watch_task = None
+        # Finds Sunshine's sandbox in /proc, see isSunshineRunning_async()
+        self._instanceTracker = FlatpakInstanceTracker(self.SunshineFlatpakAppId)
+        # Whether to restart Sunshine when it exits on its own, see
+        # _onSunshineExited(); set by the plugin from its settings
+        self.auto_restart = False
+        # Called (without arguments) once an exit of Sunshine that was not
+        # caused by stop_async has been handled
+        self.onSunshineExited = None
+        # Whether Sunshine should be running: set by a successful
+        # start_async, cleared by stop_async
+        self._want_running = False
+        self._restart_task = None
+        self._supervisor = ProcessSupervisor(logger, self._onSunshineExited)
+        # Resource use of the supervised Sunshine tree, see getResourceStats();
+        # the interval is set by the plugin from its settings
+        self.resource_sample_interval = self.ResourceSampleInterval
+        self.resources = procstats.RingBuffer(procstats.ProcessTreeSampler.Fields, self.ResourceHistory)
+        self._resource_sampler = procstats.ProcessTreeSampler()
+        self._resource_task = None
+        self._resource_pid = None
+        # Nice level, I/O priority, realtime threads and CPU affinity of the
+        # supervised Sunshine tree (see procsched.ProcessTreeScheduler for
+        # the options), set by the plugin from its settings (later changes
+        # through setScheduling_async); only applied if "enabled" is set
+        self.scheduling = {}
+        self._scheduler = procsched.ProcessTreeScheduler(logger, self._resource_sampler.findTree, self._resource_sampler.proc_root)
+        self._scheduling_task = None
+        # GPU, clock, power, thermal and CPU load readings while Sunshine
+        # runs, see getTelemetry()
+        self.telemetry = procstats.RingBuffer(telemetry.DeviceTelemetrySampler.Fields, self.TelemetryHistory)
+        self._telemetry_sampler = telemetry.DeviceTelemetrySampler()
+        self._telemetry_task = None
+        # The performance profile applied while Sunshine runs (see
+        # perfprofile.PerformanceProfile for the options), set by the
+        # plugin from its settings; only applied if "enabled" is set
+        self.performance_profile = {}
+        self._performance = perfprofile.PerformanceProfile(logger, self.PerformanceSnapshotPath)
 
         sslContext = ssl.create_default_context()
         sslContext.check_hostname = False
         sslContext.verify_mode = ssl.CERT_NONE
 
-        self.opener = build_opener(NoRedirect(), HTTPSHandler(context=sslContext))
+        self._apiClient = SunshineApiClient("127.0.0.1", self.WebUiPort, sslContext)
+
+        # The session user and audio socket, memoized, see SessionEnvironment.
+        # The plugin creates the controller on its event loop; elsewhere
+        # (e.g. in scripts) nothing is memoized.
+        self._session = SessionEnvironment(logger)
+        try:
+            self._session.attach(asyncio.get_running_loop())
+        except RuntimeError:
+            pass
 
         self.environment_variables = os.environ.copy()
         # A PULSE_SERVER present in the inherited environment can only have been
@@ -159,30 +817,40 @@ class SunshineController:
             self.logger.exception("An error occurred when decoding credentials from AuthHeader", exc_info=e)
             return None
 
-    def isSunshineRunning(self) -> bool:
+    async def isSunshineRunning_async(self) -> bool:
         """
-        Determine if Sunshine is running by inspecting 'flatpak ps'.
+        Determine if Sunshine is running by looking for its sandbox in /proc
+        (see FlatpakInstanceTracker). This is called every few seconds by the
+        frontend and every 250 ms by the start/stop wait loops, where a
+        `flatpak ps` subprocess per call is a noticeable CPU and battery cost
+        next to a running game. While the tracked sandbox process is alive
+        the check is a single stat read and runs inline; only a /proc rescan
+        is moved to a thread. `flatpak ps` is only used if /proc cannot be
+        scanned.
         :return: True if Sunshine is running, False otherwise
         """
-        result = self._run_and_capture_stdout(
+        if self._instanceTracker.isTrackedAlive():
+            return True
+        try:
+            return await self._to_thread(self._instanceTracker.find) is not None
+        except OSError as e:
+            self.logger.warning(f"Could not scan /proc for the Sunshine sandbox, falling back to flatpak ps: {e}")
+        result = await self._run_and_capture_stdout_async(
             ["flatpak", "ps", "--columns=application"],
-            context="checking whether Sunshine is running"
+            context="checking whether Sunshine is running",
+            timeout=10
         )
         return any(line.strip() == self.SunshineFlatpakAppId for line in (result or "").splitlines())
 
-    async def isSunshineRunning_async(self) -> bool:
-        """
-        Async variant of isSunshineRunning that doesn't block the event loop.
-        :return: True if Sunshine is running, False otherwise
-        """
-        return await self._to_thread(self.isSunshineRunning)
-
-    async def areCredentialsValid_async(self) -> bool | None:
+    async def areCredentialsValid_async(self, is_running: bool | None = None) -> bool | None:
         """
         Check whether the current credentials are valid by making a request to the Sunshine server.
+        :param is_running: Sunshine's running state if the caller just determined it, to skip checking it again
         :return: True if credentials are valid, False if invalid, None if Sunshine is not running or another error occurred
         """
-        if not await self.isSunshineRunning_async():
+        if is_running is None:
+            is_running = await self.isSunshineRunning_async()
+        if not is_running:
             return None
         res = await self._request_async("/api/apps")
         if res.ok:
@@ -233,7 +901,7 @@ class SunshineController:
 
             # Tools invoked via subprocess; without the required ones Sunshine
             # cannot be installed or started at all
-            required_tools = ["flatpak", "cp", "chown", "chmod", "drm_info"]
+            required_tools = ["flatpak", "drm_info"]
             composition_tools = ["su", "xprop"]
             path = self.environment_variables.get("PATH", os.defpath)
             missing_required = [tool for tool in required_tools if shutil.which(tool, path=path) is None]
@@ -241,12 +909,12 @@ class SunshineController:
             if missing_required:
                 self.logger.error(f"Missing required tools: {', '.join(missing_required)} - Sunshine cannot be installed/started")
             if missing_composition:
-                self.logger.warning(f"Missing tools needed only for the force-composition toggle: {', '.join(missing_composition)}")
+                self.logger.warning(f"Missing tools needed only for the xprop fallback of the force-composition toggle: {', '.join(missing_composition)}")
             if not missing_required and not missing_composition:
                 self.logger.info(f"Environment: Tools: all present ({', '.join(required_tools + composition_tools)})")
 
-            if not os.path.isfile("/usr/bin/bwrap"):
-                self.logger.error("/usr/bin/bwrap not found - cannot create the setuid bwrap copy Sunshine needs for KMS capture")
+            if not os.path.isfile(self.BwrapSourcePath):
+                self.logger.error(f"{self.BwrapSourcePath} not found - cannot create the setuid bwrap copy Sunshine needs for KMS capture")
 
             bwrap_dir = os.path.dirname(self.environment_variables["FLATPAK_BWRAP"])
             mount = self._findMountEntry(bwrap_dir)
@@ -326,18 +994,18 @@ class SunshineController:
             self.logger.info("Decky Sunshine's copy of bwrap was already obtained.")
         else:
             self.logger.info("Decky Sunshine's copy of bwrap is missing. Obtaining now...")
-            installed = await self._to_thread(self._copyBwrap)
+            installed = await self._copyBwrap_async()
             if not installed:
                 self.logger.error("Decky Sunshine's copy of bwrap could not be obtained.")
                 return False
             self.logger.info("Decky Sunshine's copy of bwrap obtained successfully.")
 
-        if await self._to_thread(self._isSunshineInstalled):
+        if await self._isSunshineInstalled_async():
             self.logger.info("Sunshine already installed.")
             return True
         else:
             self.logger.info("Sunshine not installed. Installing...")
-            installed = await self._to_thread(self._installOrUpdateSunshine)
+            installed = await self._installOrUpdateSunshine_async()
             if not installed:
                 self.logger.error("Sunshine could not be installed.")
                 return False
@@ -383,21 +1051,6 @@ class SunshineController:
                 return True
         return False
 
-    def _readCsrfAllowedOrigins(self) -> tuple[list[str], int | None, list[str]]:
-        """
-        Read sunshine.conf and extract the csrf_allowed_origins option.
-        :return: (all file lines, index of the option's line or None, origins)
-        """
-        lines = []
-        if os.path.exists(self.SunshineConfigPath):
-            with open(self.SunshineConfigPath) as f:
-                lines = f.read().splitlines()
-        for i, line in enumerate(lines):
-            key, separator, value = line.partition("=")
-            if separator and key.strip() == "csrf_allowed_origins":
-                return lines, i, [o.strip() for o in value.split(",") if o.strip()]
-        return lines, None, []
-
     async def isCsrfOriginAllowed_async(self, origin: str) -> bool:
         """
         See isCsrfOriginAllowed.
@@ -412,8 +1065,7 @@ class SunshineController:
         :return: True if allowed, False if not or the config is unreadable
         """
         try:
-            _, _, origins = self._readCsrfAllowedOrigins()
-            return self._originMatchesAny(origin, origins)
+            return self._originMatchesAny(origin, self.config.getList("csrf_allowed_origins"))
         except OSError as e:
             self.logger.exception("Could not read csrf_allowed_origins from sunshine.conf", exc_info=e)
             return False
@@ -447,8 +1099,7 @@ class SunshineController:
         if not origin:
             return previously_managed, False
         try:
-            os.makedirs(os.path.dirname(self.SunshineConfigPath), exist_ok=True)
-            lines, key_index, origins = self._readCsrfAllowedOrigins()
+            origins = self.config.getList("csrf_allowed_origins")
 
             changed = False
             if previously_managed and previously_managed != origin and previously_managed in origins:
@@ -460,120 +1111,417 @@ class SunshineController:
                 changed = True
 
             if changed:
-                new_line = f"csrf_allowed_origins = {','.join(origins)}"
-                if key_index is None:
-                    lines.append(new_line)
-                else:
-                    lines[key_index] = new_line
-                with open(self.SunshineConfigPath, "w") as f:
-                    f.write("\n".join(lines) + "\n")
+                self.config.set("csrf_allowed_origins", origins)
                 self.logger.info(f"Allowed the Web UI origin {origin} for CSRF-protected requests in sunshine.conf")
             return (origin if origin in origins else ""), added_now
         except OSError as e:
             self.logger.exception("Could not update csrf_allowed_origins in sunshine.conf", exc_info=e)
             return previously_managed, False
 
+    @traced("start")
     async def start_async(self) -> bool:
         """
         Start the Sunshine process.
         :return: True if Sunshine was started successfully or is already running, False otherwise
         """
-        if await self.isSunshineRunning_async():
+        # A start from outside the restart loop supersedes a pending restart
+        # and gives Sunshine a fresh restart budget
+        if self._restart_task is not asyncio.current_task():
+            if self._restart_task is not None:
+                self._restart_task.cancel()
+                self._restart_task = None
+            self._supervisor.resetRestarts()
+
+        with span("running_check"):
+            running = await self.isSunshineRunning_async()
+        if running:
             # Already running (e.g. it survived a plugin_loader restart via setsid):
-            # still (re)apply the composition override so the atom matches the setting.
+            # supervise it, and still (re)apply the composition override so
+            # the atom matches the setting.
+            self._superviseInstance()
             if self.force_composition:
-                await self._applyCompositionForce()
+                with span("composition"):
+                    await self._applyCompositionForce()
+            with span("performance_profile"):
+                await self.applyPerformanceProfile_async()
             return True
 
-        retry_count = 60
-        wait_time = 1
-
         # If Sunshine is started too early in the boot process, it won't find a display to connect to
-        # or the audio subsystem may not be ready. Thus, we check whether both are available before
+        # or the audio subsystem may not be ready. Thus, we wait until both are available before
         # starting Sunshine.
-        while retry_count > 0:
-            display_available = await self._to_thread(self._isDisplayAvailable)
-            audio_available = await self._to_thread(self._isAudioAvailable)
-
-            if display_available and audio_available:
-                break
-
-            retry_count -= 1
-            if retry_count == 0:
-                if not display_available:
-                    self.logger.error("Aborting wait for display.")
-                    return False
-                if not audio_available:
-                    self.logger.warning("Audio subsystem not available after waiting. Starting Sunshine anyway...")
-                break
-
-            if not display_available:
-                self.logger.info(f"Display not available yet. Checking again in {wait_time} {'second' if wait_time == 1 else 'seconds'}")
-            if not audio_available:
-                self.logger.info(f"Audio subsystem not available yet. Checking again in {wait_time} {'second' if wait_time == 1 else 'seconds'}")
-
-            await asyncio.sleep(wait_time)
-
-        if display_available and audio_available:
-            self.logger.info("Display and audio subsystem available")
-        elif display_available:
-            self.logger.info("Display available")
+        with span("readiness"):
+            display_available, audio_available = await self.waitForDisplayAndAudio_async()
+        if not display_available:
+            self.logger.error("Aborting wait for display.")
+            return False
+        if not audio_available:
+            self.logger.warning("Audio subsystem not available after waiting. Starting Sunshine anyway...")
 
         bwrap_path = self.environment_variables["FLATPAK_BWRAP"]
 
-        # Re-copy bwrap from the trusted system binary on every start (this also
+        # Sync bwrap with the trusted system binary on every start (this also
         # picks up bwrap updates from the OS) and make it setuid root, which
         # Sunshine needs for KMS/DRM capture. This is safe because the target
         # directory is writable by root only (see __init__).
-        if not await self._to_thread(self._copyBwrap):
-            return False
-
-        if not await self._to_thread(lambda: self._run_and_check(['chown', '0:0', bwrap_path], context="setting owner on bwrap to root")):
-            return False
-
-        if not await self._to_thread(lambda: self._run_and_check(['chmod', 'u+s', bwrap_path], context="setting setuid on bwrap")):
-            return False
+        with span("copy_bwrap"):
+            if not await self._copyBwrap_async():
+                return False
 
         # chmod can succeed without the setuid bit taking effect (a filesystem
         # may not store it, and on a nosuid mount it is stored but ignored at
         # exec). Sunshine would then die without a clear error (no DRM handle,
         # no encoder), so verify explicitly and fail loudly instead.
-        if not await self._to_thread(lambda: self._verifySetuidBit(bwrap_path)):
-            return False
+        with span("verify_setuid"):
+            if not await self._to_thread(lambda: self._verifySetuidBit(bwrap_path)):
+                return False
 
         # Run Sunshine
-        try:
-            subprocess.Popen(["flatpak", "run", "--system", "--socket=wayland", self.SunshineFlatpakAppId],
-                             env=self.environment_variables,
-                             start_new_session=True)
-        except Exception as e:
-            self.logger.exception("An error occurred when starting Sunshine", exc_info=e)
-            return False
+        with span("spawn"):
+            try:
+                process = subprocess.Popen(["flatpak", "run", "--system", "--socket=wayland", self.SunshineFlatpakAppId],
+                                           env=self.environment_variables,
+                                           start_new_session=True)
+            except Exception as e:
+                self.logger.exception("An error occurred when starting Sunshine", exc_info=e)
+                return False
 
         # Wait for Sunshine to start
-        retry_count = 20
-        wait_time = 0.25
-        while not await self.isSunshineRunning_async() and retry_count > 0:
-            retry_count -= 1
-            if retry_count == 0:
-                self.logger.error("Aborting wait for Sunshine process to start.")
-                return False
-            self.logger.info(f"Sunshine process not found yet. Checking again in {wait_time} {'second' if wait_time == 1 else 'seconds'}")
-            await asyncio.sleep(wait_time)
+        with span("process_wait"):
+            retry_count = 20
+            wait_time = 0.25
+            while not await self.isSunshineRunning_async() and retry_count > 0:
+                retry_count -= 1
+                if retry_count == 0:
+                    self.logger.error("Aborting wait for Sunshine process to start.")
+                    return False
+                self.logger.info(f"Sunshine process not found yet. Checking again in {wait_time} {'second' if wait_time == 1 else 'seconds'}")
+                await asyncio.sleep(wait_time)
+        self._superviseInstance(process)
 
         if self.force_composition:
-            await self._applyCompositionForce()
+            with span("composition"):
+                await self._applyCompositionForce()
+        with span("performance_profile"):
+            await self.applyPerformanceProfile_async()
 
         return True
 
+    def _superviseInstance(self, process: subprocess.Popen | None = None) -> None:
+        """
+        Supervise the running instance found by the last running check (see
+        ProcessSupervisor), so its exit is handled right away.
+        :param process: The `flatpak run` process, if this plugin launched it
+        """
+        self._want_running = True
+        self._startTelemetry()
+        pid = self._instanceTracker.pid
+        if pid is None:
+            # Only found via flatpak ps; the running checks still notice the exit
+            return
+        self._supervisor.watch(pid, self._instanceTracker.isTrackedAlive, process)
+        if self._resource_task is None or self._resource_task.done() or self._resource_pid != pid:
+            if self._resource_task is not None:
+                self._resource_task.cancel()
+            self._resource_pid = pid
+            self._resource_task = asyncio.get_event_loop().create_task(self._sampleResources(pid))
+            self._startScheduling(pid)
+
+    def isSupervised(self) -> bool:
+        """
+        :return: Whether a running instance is supervised, so its exit is
+                 reported through onSunshineExited without polling
+        """
+        return self._supervisor.pid is not None
+
+    def stopSupervising(self) -> None:
+        """
+        Stop supervising Sunshine without stopping it, e.g. when the plugin
+        unloads: it keeps running, and a pending restart is dropped.
+        """
+        if self._restart_task is not None:
+            self._restart_task.cancel()
+            self._restart_task = None
+        self._supervisor.close()
+        if self._resource_task is not None:
+            self._resource_task.cancel()
+            self._resource_task = None
+        if self._scheduling_task is not None:
+            self._scheduling_task.cancel()
+            self._scheduling_task = None
+        self._stopTelemetry()
+
+    def getResourceStats(self, limit: int) -> dict:
+        """
+        The resource use of Sunshine's process tree (the sandbox the
+        supervisor watches, with all its descendants): per field (CPU % of
+        one core, RSS, threads, processes, I/O rates) the min, max, median,
+        95th percentile and last value over the kept samples, and the last
+        limit samples, oldest first.
+        """
+        return {
+            "interval": self.resource_sample_interval,
+            "sampling": self._resource_task is not None and not self._resource_task.done(),
+            "summary": self.resources.summary(tuple(field for field in self.resources.fields if field != "time")),
+            "series": self.resources.series(limit),
+        }
+
+    async def applyPerformanceProfile_async(self) -> bool:
+        """
+        Apply performance_profile to the GPUs and cpufreq policies, if it is
+        enabled. start_async calls this; stop_async, an unexpected exit of
+        Sunshine and the uninstall helper restore the previous values.
+        :return: True if the profile is disabled or was applied fully
+        """
+        if not self.performance_profile.get("enabled"):
+            return True
+        gpu_devices = [
+            f"{card_path}/device" for card_path, _ in await self._to_thread(self._listDrmCards)
+            if os.path.isdir(f"{card_path}/device")
+        ]
+        policies = sorted(glob.glob(f"{self.CpufreqSysfsRoot}/policy[0-9]*"))
+        return await self._to_thread(lambda: self._performance.apply(self.performance_profile, gpu_devices, policies))
+
+    async def restorePerformanceProfile_async(self) -> bool:
+        """
+        Restore the values the performance profile changed, if it is applied
+        - also when it was applied by a previous plugin run that ended
+        without restoring them.
+        :return: True if nothing was to restore or everything was restored
+        """
+        return await self._to_thread(self._performance.restore)
+
+    def getTelemetry(self, limit: int) -> dict:
+        """
+        The device's GPU load, clocks, power, temperature and CPU load while
+        Sunshine runs (see telemetry.DeviceTelemetrySampler): per field the
+        min, max, median, 95th percentile and last value over the kept
+        samples, and the last limit samples, oldest first.
+        """
+        return {
+            "interval": self.TelemetrySampleInterval,
+            "sampling": self._telemetry_task is not None and not self._telemetry_task.done(),
+            "summary": self.telemetry.summary(tuple(field for field in self.telemetry.fields if field != "time")),
+            "series": self.telemetry.series(limit),
+        }
+
+    def _startTelemetry(self) -> None:
+        if self._telemetry_task is None or self._telemetry_task.done():
+            self._telemetry_task = asyncio.get_event_loop().create_task(self._sampleTelemetry())
+
+    def _stopTelemetry(self) -> None:
+        if self._telemetry_task is not None:
+            self._telemetry_task.cancel()
+            self._telemetry_task = None
+
+    async def _sampleTelemetry(self) -> None:
+        self._telemetry_sampler.reset()
+        cards = [card_path for card_path, _ in await self._to_thread(self._listDrmCards)]
+        while True:
+            self.telemetry.append(await self._to_thread(lambda: self._telemetry_sampler.sample(cards)))
+            await asyncio.sleep(self.TelemetrySampleInterval)
+
+    async def _sampleResources(self, pid: int) -> None:
+        """
+        Sample the tree below pid (see procstats.ProcessTreeSampler) every
+        resource_sample_interval seconds until the process is gone.
+        """
+        self._resource_sampler.reset()
+        while True:
+            sample = await self._to_thread(lambda: self._resource_sampler.sample(pid))
+            if sample is not None:
+                self.resources.append(sample)
+            elif not os.path.exists(f"{self._resource_sampler.proc_root}/{pid}"):
+                return
+            await asyncio.sleep(self.resource_sample_interval)
+
+    async def setScheduling_async(self, scheduling: dict) -> None:
+        """
+        Change the scheduling settings. Enabling them starts applying them
+        to a supervised instance; disabling them stops that and resets the
+        threads changed before right away. Other changes apply on the next
+        pass of the running task.
+        """
+        self.scheduling = scheduling
+        pid = self._supervisor.pid
+        if scheduling.get("enabled"):
+            if pid is not None and (self._scheduling_task is None or self._scheduling_task.done()):
+                self._startScheduling(pid)
+            return
+        if self._scheduling_task is not None:
+            self._scheduling_task.cancel()
+            self._scheduling_task = None
+        if pid is not None:
+            await self._to_thread(lambda: self._scheduler.apply(pid, scheduling))
+
+    def _startScheduling(self, pid: int) -> None:
+        """
+        (Re)start applying the scheduling settings to the tree below pid, if
+        they are enabled; otherwise nothing needs to run.
+        """
+        if self._scheduling_task is not None:
+            self._scheduling_task.cancel()
+            self._scheduling_task = None
+        if self.scheduling.get("enabled"):
+            self._scheduling_task = asyncio.get_event_loop().create_task(self._applyScheduling(pid))
+
+    async def _applyScheduling(self, pid: int) -> None:
+        """
+        Give the tree below pid the scheduling settings every
+        SchedulingInterval seconds until the process is gone; changed
+        settings apply on the next pass.
+        """
+        while os.path.exists(f"{self._resource_sampler.proc_root}/{pid}"):
+            await self._to_thread(lambda: self._scheduler.apply(pid, self.scheduling))
+            await asyncio.sleep(self.SchedulingInterval)
+
+    def _onSunshineExited(self, uptime: float) -> None:
+        """
+        Called by the supervisor when Sunshine exited. An exit stop_async
+        caused is handled there; otherwise Sunshine died on its own (crash,
+        or killed from outside): release the composition override, which no
+        stop_async will, and restart it if auto_restart is enabled.
+        """
+        if not self._want_running:
+            return
+        self.logger.warning(f"Sunshine exited unexpectedly after running for {uptime:.0f} seconds")
+        self._restart_task = asyncio.get_event_loop().create_task(self._handleUnexpectedExit(uptime))
+
+    async def _handleUnexpectedExit(self, uptime: float) -> None:
+        self._stopTelemetry()
+        try:
+            await self._cancelCompositionWatch()
+            if self._composition_applied:
+                self.logger.info("Sunshine is gone - releasing the composition override")
+                if await self.setCompositionForce_async(False):
+                    self._composition_applied = False
+            await self.restorePerformanceProfile_async()
+            # Connections to the old instance are dead from here on
+            self._apiClient.close()
+            if self.onSunshineExited is not None:
+                self.onSunshineExited()
+
+            delay = self._supervisor.nextRestartDelay(uptime)
+            while self.auto_restart and self._want_running:
+                if delay is None:
+                    self.logger.error(
+                        f"Sunshine exited {ProcessSupervisor.CrashLoopLimit} times within "
+                        f"{ProcessSupervisor.CrashLoopWindow} seconds - not restarting it anymore"
+                    )
+                    self._want_running = False
+                    return
+                self.logger.info(f"Restarting Sunshine in {delay:.0f} seconds")
+                await asyncio.sleep(delay)
+                if not (self.auto_restart and self._want_running):
+                    # Restarts were turned off during the backoff
+                    self.logger.info("Not restarting Sunshine - automatic restarts were turned off")
+                    self._want_running = False
+                    return
+                if await self.start_async():
+                    self.logger.info("Sunshine restarted")
+                    return
+                delay = self._supervisor.nextRestartDelay(0)
+        finally:
+            if self._restart_task is asyncio.current_task():
+                self._restart_task = None
+            if self.onSunshineExited is not None:
+                self.onSunshineExited()
+
+    async def waitForDisplayAndAudio_async(self) -> tuple[bool, bool]:
+        """
+        Wait until both a display and the audio subsystem are available, or
+        the time budget (ReadinessTimeout) is used up. Both are probed
+        concurrently. Between probes, the wait wakes up early on inotify
+        events that typically mark progress at boot (a DRM card node
+        appearing, a runtime dir or pulse/native socket being created under
+        /run/user), so Sunshine starts right after both are ready instead of
+        up to a poll interval later. A short backoff poll (ReadinessPollMin
+        doubling to ReadinessPollMax) remains as a safety net, since a
+        framebuffer being attached to a CRTC raises no event. start_async
+        waits itself; the plugin's boot also calls this ahead of time, in
+        parallel to the dependency checks, after which the wait in
+        start_async returns after a single probe.
+        :return: (display available, audio available)
+        """
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        deadline = started + self.ReadinessTimeout
+        changed = asyncio.Event()
+        watcher = self._startReadinessWatch(changed)
+        poll_interval = self.ReadinessPollMin
+        display_logged = audio_logged = False
+        try:
+            while True:
+                changed.clear()
+                display_available, audio_available = await asyncio.gather(
+                    self._isDisplayAvailable_async(),
+                    self._to_thread(self._isAudioAvailable)
+                )
+                if display_available and audio_available:
+                    break
+                # Log each missing part once, not on every probe
+                if not display_available and not display_logged:
+                    self.logger.info("Display not available yet. Waiting for it...")
+                    display_logged = True
+                if not audio_available and not audio_logged:
+                    self.logger.info("Audio subsystem not available yet. Waiting for it...")
+                    audio_logged = True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return display_available, audio_available
+                try:
+                    await asyncio.wait_for(changed.wait(), min(poll_interval, remaining))
+                    if watcher is not None:
+                        self._updateReadinessWatches(watcher)
+                except asyncio.TimeoutError:
+                    poll_interval = min(poll_interval * 2, self.ReadinessPollMax)
+        finally:
+            if watcher is not None:
+                watcher.close()
+        self.logger.info(f"Display and audio subsystem available after {loop.time() - started:.2f} seconds")
+        return display_available, audio_available
+
+    def _startReadinessWatch(self, changed: asyncio.Event) -> sysevents.Inotify | None:
+        """
+        Set up the inotify watches for waitForDisplayAndAudio_async.
+        :return: The watcher, or None if inotify is unavailable (then the
+                 wait only polls)
+        """
+        try:
+            watcher = sysevents.Inotify(lambda path, name, mask: changed.set())
+        except OSError as e:
+            self.logger.warning(f"inotify is not available, polling for display and audio readiness only: {e}")
+            return None
+        self._updateReadinessWatches(watcher)
+        watcher.attach(asyncio.get_event_loop())
+        return watcher
+
+    @staticmethod
+    def _updateReadinessWatches(watcher: sysevents.Inotify) -> None:
+        """
+        (Re)add the readiness watches; directories created since the last
+        call get watched from now on (re-adding an existing watch is a no-op).
+        """
+        mask = sysevents.IN_CREATE | sysevents.IN_MOVED_TO | sysevents.IN_ONLYDIR
+        for path in ["/dev", "/dev/dri", "/run/user"] + glob.glob("/run/user/*") + glob.glob("/run/user/*/pulse"):
+            watcher.addWatch(path, mask)
+
+    @traced("stop")
     async def stop_async(self) -> bool:
         """
         Stop the Sunshine process.
         :return: True if Sunshine was stopped successfully or wasn't running, False otherwise
         """
+        # From here on an exit is expected: no restart, no exit handling
+        self._want_running = False
+        if self._restart_task is not None:
+            self._restart_task.cancel()
+            self._restart_task = None
+        self._stopTelemetry()
+
         # Stop the watcher before releasing the override, so it cannot
         # re-assert the old value concurrently to the release below.
-        await self._cancelCompositionWatch()
+        with span("composition_watch"):
+            await self._cancelCompositionWatch()
 
         # Release the gamescope composition override when stopping, so the
         # direct-scanout power optimization is restored once we're not streaming.
@@ -583,28 +1531,42 @@ class SunshineController:
         # Disabling the toggle while Sunshine is running is already handled
         # live via applyCompositionPreference_async.
         if self.force_composition and self._composition_applied is not False:
-            if await self.setCompositionForce_async(False):
-                self._composition_applied = False
+            with span("composition"):
+                if await self.setCompositionForce_async(False):
+                    self._composition_applied = False
 
-        if not await self.isSunshineRunning_async():
+        # Like the composition override, the profile is only for streaming
+        with span("performance_profile"):
+            await self.restorePerformanceProfile_async()
+
+        with span("running_check"):
+            running = await self.isSunshineRunning_async()
+        if not running:
             return True
 
-        await self._to_thread(lambda: self._run_and_check(["flatpak", "kill", self.SunshineFlatpakAppId], context="killing Sunshine via flatpak"))
+        with span("kill"):
+            await self._run_and_check_async(["flatpak", "kill", self.SunshineFlatpakAppId], context="killing Sunshine via flatpak", timeout=10)
+        # Connections to the old instance are dead from here on
+        self.logger.info(f"Sunshine API client stats: {self.getApiClientStats()}")
+        self._apiClient.close()
 
-        retry_count = 20
-        wait_time = 0.25
-        while await self.isSunshineRunning_async() and retry_count > 0:
-            retry_count -= 1
-            if retry_count == 0:
-                self.logger.error("Aborting wait for Sunshine process to end.")
-                return False
-            self.logger.info(f"Sunshine process not ended yet. Checking again in {wait_time} {'second' if wait_time == 1 else 'seconds'}")
-
-            await asyncio.sleep(wait_time)
+        with span("exit_wait"):
+            if self._supervisor.pid is not None:
+                exited = await self._supervisor.waitExit(self.StopTimeout)
+            else:
+                # Not supervised (Sunshine was not started through start_async
+                # or is only visible to flatpak ps): poll instead
+                deadline = time.monotonic() + self.StopTimeout
+                while (running := await self.isSunshineRunning_async()) and time.monotonic() < deadline:
+                    await asyncio.sleep(0.25)
+                exited = not running
+        if not exited:
+            self.logger.error(f"Sunshine process did not end within {self.StopTimeout} seconds")
+            return False
 
         return True
 
-    def setCompositionForce(self, enabled: bool) -> bool:
+    async def setCompositionForce_async(self, enabled: bool) -> bool:
         """
         Force gamescope to always composite instead of using its direct-scanout
         (single-plane) optimization, by setting the GAMESCOPE_COMPOSITE_FORCE
@@ -621,10 +1583,20 @@ class SunshineController:
         It is applied on stream start and cleared on stop, so gamescope's
         power-saving direct scanout is only disabled while actually streaming.
 
-        Sunshine runs as root, so the atom must be set as the session user
-        on DISPLAY :0.
+        The atom is written over a persistent X11 connection (see
+        _getX11Client_async); if that is not possible, xprop is run as the
+        session user on DISPLAY :0 instead.
         """
         value = "1" if enabled else "0"
+        client = await self._getX11Client_async()
+        if client is not None:
+            try:
+                await client.setCardinal("GAMESCOPE_COMPOSITE_FORCE", int(enabled))
+                return True
+            except (OSError, EOFError, asyncio.TimeoutError, x11.X11Error) as e:
+                self.logger.warning(f"Setting GAMESCOPE_COMPOSITE_FORCE={value} via X11 failed, falling back to xprop: {e!r}")
+                client.close()
+
         username = self._getSessionUsername()
         if not username:
             self.logger.warning(f"No session user found for setting GAMESCOPE_COMPOSITE_FORCE={value}")
@@ -634,8 +1606,8 @@ class SunshineController:
             "DISPLAY=:0 xprop -root -f GAMESCOPE_COMPOSITE_FORCE 32c "
             "-set GAMESCOPE_COMPOSITE_FORCE " + value,
         ]
-        return self._run_and_check(
-            cmd, context=f"setting GAMESCOPE_COMPOSITE_FORCE={value}"
+        return await self._run_and_check_async(
+            cmd, context=f"setting GAMESCOPE_COMPOSITE_FORCE={value}", timeout=10
         )
 
     def _getSessionUsername(self) -> str | None:
@@ -643,9 +1615,13 @@ class SunshineController:
         Determine the user owning the gamescope session. On the Steam Deck this
         is 'deck', but as in the audio socket discovery it must not be
         hardcoded: other systems may use a different user, so fall back to the
-        owner of the first regular user's runtime directory.
+        owner of the first regular user's runtime directory. Memoized until
+        /run/user changes, see SessionEnvironment.
         :return: The username, or None if no regular user was found
         """
+        return self._session.get("session_user", self._resolveSessionUsername)
+
+    def _resolveSessionUsername(self) -> str | None:
         try:
             return pwd.getpwnam("deck").pw_name
         except KeyError:
@@ -664,11 +1640,12 @@ class SunshineController:
                 continue
         return None
 
-    async def setCompositionForce_async(self, enabled: bool) -> bool:
+    def isCompositionForced(self) -> bool:
         """
-        Async variant of setCompositionForce that doesn't block the event loop.
+        Whether the composition override is currently applied (as last
+        written by the plugin).
         """
-        return await self._to_thread(lambda: self.setCompositionForce(enabled))
+        return self._composition_applied is True
 
     async def applyCompositionPreference_async(self) -> None:
         """
@@ -697,37 +1674,225 @@ class SunshineController:
     async def _watchCompositionForce(self) -> None:
         """
         Follow dock changes and keep the override asserted while it is wanted.
-        The dock state is a cheap sysfs read every tick; the atom itself (an
-        xprop subprocess) is only re-read for a bounded window after each
-        write, because on a cold boot gamescope's own session initialization
-        can (re)create the atom with value 0 shortly after our write - a
-        single write is not trustworthy there. Sunshine's liveness is polled
-        on a coarser grid (a flatpak subprocess); if it died externally the
-        override is released here, since no stop_async will run.
-        """
-        tick = 0
-        while True:
-            await asyncio.sleep(5)
-            tick += 1
-            if not self.force_composition:
+        Dock changes arrive as DRM hotplug uevents (see _startHotplugListener),
+        so they are handled right away and nothing wakes up while nothing
+        happens; the override is only reconciled when the connector state
+        actually changed. Without the uevent socket, the dock state falls
+        back to a cheap sysfs read every CompositionPollInterval. While the
+        override is applied, changes of the atom itself are watched too (see
+        _updateAtomWatch): gamescope's own session initialization can
+        (re)create the atom with value 0 shortly after our write on a cold
+        boot, and a gamescope restart drops it - a single write is not
+        trustworthy, so the override is re-asserted the moment it is reset.
+        A watch that ended right away (e.g. X11 not reachable yet after a
+        gamescope restart) is retried after AtomWatchRetryInterval.
+        If Sunshine dies externally, the supervisor cancels this watcher and
+        releases the override (see _onSunshineExited).
+        """
+        wake = asyncio.Event()
+        listener = self._startHotplugListener(wake)
+        last_docked = self._composition_applied
+        try:
+            while True:
+                await self._updateAtomWatch(wake)
+                timeout = self.CompositionPollInterval if listener is None else None
+                if self._isAtomWatchRetryPending():
+                    # Wake up for the retry even if nothing else happens
+                    retry_in = max(self._atom_watch_retry_at - asyncio.get_event_loop().time(), 0)
+                    timeout = retry_in if timeout is None else min(timeout, retry_in)
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                if not self.force_composition:
+                    return
+                docked = await self._to_thread(self._isExternalDisplayConnected)
+                if docked != last_docked:
+                    await self._reconcileCompositionForce(docked)
+                    last_docked = docked
+                elif self._composition_atom_changed:
+                    self._composition_atom_changed = False
+                    if self._composition_applied:
+                        value = await self._getCompositionForce_async()
+                        if value is not None and value != 1:
+                            self.logger.info("GAMESCOPE_COMPOSITE_FORCE was reset (e.g. by gamescope session initialization) - re-asserting")
+                            await self.setCompositionForce_async(True)
+        finally:
+            if listener is not None:
+                listener.close()
+            self._stopAtomWatch()
+
+    async def _updateAtomWatch(self, wake: asyncio.Event) -> None:
+        """
+        Watch the GAMESCOPE_COMPOSITE_FORCE atom while the override is
+        applied, and stop watching once it is released. A change (or the
+        watch ending, e.g. because gamescope restarted) sets
+        _composition_atom_changed and wakes the watcher, which then re-reads
+        the atom. Right after starting, the atom is re-read once as well,
+        since a reset before the subscription would go unnoticed otherwise.
+        """
+        wanted = self._composition_applied is True
+        active = self._atom_watch_task is not None and not self._atom_watch_task.done()
+        if not wanted:
+            self._stopAtomWatch()
+            return
+        if active or asyncio.get_event_loop().time() < self._atom_watch_retry_at:
+            return
+
+        def changed() -> None:
+            self._composition_atom_changed = True
+            wake.set()
+
+        self._atom_watch_task = asyncio.get_event_loop().create_task(self._watchAtom(changed))
+        changed()
+
+    def _isAtomWatchRetryPending(self) -> bool:
+        """
+        :return: Whether the atom should be watched but the watch ended too
+                 quickly and waits for AtomWatchRetryInterval to restart
+        """
+        active = self._atom_watch_task is not None and not self._atom_watch_task.done()
+        return self._composition_applied is True and not active and asyncio.get_event_loop().time() < self._atom_watch_retry_at
+
+    def _stopAtomWatch(self) -> None:
+        if self._atom_watch_task is not None:
+            self._atom_watch_task.cancel()
+            self._atom_watch_task = None
+
+    async def _watchAtom(self, changed) -> None:
+        """
+        Call changed() on every change of the GAMESCOPE_COMPOSITE_FORCE atom
+        and once more when the watch ends. Uses PropertyNotify events on the
+        X11 connection; if that is not possible, a long-lived
+        `xprop -spy` as the session user, which prints a line per change.
+        """
+        started = asyncio.get_event_loop().time()
+        try:
+            client = await self._getX11Client_async()
+            if client is not None:
+                try:
+                    atom = await client.internAtom("GAMESCOPE_COMPOSITE_FORCE")
+                    await client.watchRootProperties(lambda changed_atom, deleted: changed() if changed_atom == atom else None)
+                    try:
+                        await client.waitClosed()
+                    finally:
+                        # Also when the watch is cancelled: the connection
+                        # outlives it and must not call a stale changed()
+                        client.unwatchRootProperties()
+                    return
+                except (OSError, EOFError, asyncio.TimeoutError, x11.X11Error) as e:
+                    self.logger.warning(f"Watching GAMESCOPE_COMPOSITE_FORCE via X11 failed, falling back to xprop -spy: {e!r}")
+                    client.close()
+
+            username = self._getSessionUsername()
+            if not username:
                 return
-            if tick % 6 == 0 and not await self.isSunshineRunning_async():
-                if self._composition_applied:
-                    self.logger.info("Sunshine is gone - releasing the composition override")
-                    if await self.setCompositionForce_async(False):
-                        self._composition_applied = False
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    "su", username, "-c", "DISPLAY=:0 xprop -spy -root GAMESCOPE_COMPOSITE_FORCE",
+                    env=self.environment_variables,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    # su forks xprop and waits for it; killing su alone would
+                    # leave xprop running, so the whole session is killed
+                    start_new_session=True,
+                )
+            except Exception as e:
+                self.logger.exception("An exception occurred when starting xprop -spy for GAMESCOPE_COMPOSITE_FORCE", exc_info=e)
                 return
-            await self._reconcileCompositionForce()
+            try:
+                async for _ in proc.stdout:
+                    changed()
+                await proc.wait()
+            finally:
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+        finally:
+            # A watch that ends right away (e.g. xprop missing) is not
+            # restarted on every wake-up
+            if asyncio.get_event_loop().time() - started < self.CompositionPollInterval:
+                self._atom_watch_retry_at = asyncio.get_event_loop().time() + self.AtomWatchRetryInterval
+            changed()
+
+    def _startHotplugListener(self, hotplug: asyncio.Event) -> sysevents.UeventListener | None:
+        """
+        Listen for DRM uevents (connector hotplug), setting hotplug on each.
+        :return: The listener, or None if the uevent socket is unavailable
+                 (then the watcher polls the connector state)
+        """
+        try:
+            listener = sysevents.UeventListener(lambda event: hotplug.set(), subsystem="drm")
+        except OSError as e:
+            if not self._hotplug_listener_warned:
+                self.logger.warning(f"Cannot listen for DRM hotplug uevents, polling the dock state instead: {e}")
+                self._hotplug_listener_warned = True
+            return None
+        listener.attach(asyncio.get_event_loop())
+        return listener
 
-    async def _reconcileCompositionForce(self) -> None:
+    def startLogWatch(self, on_events) -> None:
+        """
+        Follow sunshine.log (see sunshinelog.LogTailer) and pass the events
+        parsed from new lines to on_events, as a list, oldest first. The log
+        is read shortly after inotify reports writes to it; without inotify
+        it is polled every LogPollInterval.
+        """
+        if self._log_watch_task is None or self._log_watch_task.done():
+            self._log_watch_task = asyncio.get_event_loop().create_task(self._watchLog(on_events))
+
+    def stopLogWatch(self) -> None:
+        if self._log_watch_task is not None:
+            self._log_watch_task.cancel()
+            self._log_watch_task = None
+
+    async def _watchLog(self, on_events) -> None:
+        directory, name = os.path.split(self.logTailer.path)
+        written = asyncio.Event()
+        try:
+            watcher = sysevents.Inotify(lambda path, entry, mask: written.set() if entry == name else None)
+            watcher.attach(asyncio.get_event_loop())
+        except OSError as e:
+            self.logger.warning(f"inotify is not available, polling sunshine.log instead: {e}")
+            watcher = None
+        mask = sysevents.IN_MODIFY | sysevents.IN_CREATE | sysevents.IN_MOVED_TO
+        try:
+            while True:
+                # The directory only exists once Sunshine ran; poll until then
+                watched = watcher is not None and watcher.addWatch(directory, mask)
+                written.clear()
+                try:
+                    events = await self._to_thread(self.logTailer.read)
+                except OSError as e:
+                    self.logger.warning(f"Could not read sunshine.log: {e}")
+                    events = []
+                if events:
+                    on_events(events)
+                try:
+                    await asyncio.wait_for(written.wait(), None if watched else self.LogPollInterval)
+                except asyncio.TimeoutError:
+                    pass
+                # Let a burst of writes settle into one read
+                await asyncio.sleep(self.LogReadDelay)
+        finally:
+            if watcher is not None:
+                watcher.close()
+
+    async def _reconcileCompositionForce(self, docked: bool | None = None) -> None:
         """
         Write the composition override the current dock state calls for, if it
         differs from what we last wrote (an unknown last value counts as
-        differing, so the first reconcile after a start always writes). After
-        a write, re-verify the atom for a bounded window against gamescope's
-        boot-time reset, see _watchCompositionForce.
+        differing, so the first reconcile after a start always writes).
+        Resets of the atom after the write are handled by the watcher, see
+        _watchCompositionForce.
+        :param docked: The dock state if the caller just read it
         """
-        docked = await self._to_thread(self._isExternalDisplayConnected)
+        if docked is None:
+            docked = await self._to_thread(self._isExternalDisplayConnected)
         if docked != self._composition_applied:
             self.logger.info(
                 f"{'Applying' if docked else 'Releasing'} the composition override "
@@ -735,19 +1900,9 @@ class SunshineController:
             )
             if await self.setCompositionForce_async(docked):
                 self._composition_applied = docked
-            # 24 checks every 5 seconds: covers the window between the plugin
-            # applying the override early in the boot process and the
-            # gamescope session finishing its initialization.
-            self._composition_verify_remaining = 24 if docked else 0
-        elif docked and self._composition_verify_remaining > 0:
-            self._composition_verify_remaining -= 1
-            value = await self._to_thread(self._getCompositionForce)
-            if value is not None and value != 1:
-                self.logger.info("GAMESCOPE_COMPOSITE_FORCE was reset (likely by gamescope session initialization) - re-asserting")
-                if await self.setCompositionForce_async(True):
-                    self._composition_verify_remaining = 24
 
     async def _cancelCompositionWatch(self) -> None:
+        self._stopAtomWatch()
         if self._composition_watch_task is not None:
             self._composition_watch_task.cancel()
             try:
@@ -769,15 +1924,14 @@ class SunshineController:
         :return: True if an external display is connected, False otherwise
         """
         try:
-            for status_path in glob.glob("/sys/class/drm/card*-*/status"):
-                # Connector directories are named e.g. card0-eDP-1, card1-DP-2
-                connector = os.path.basename(os.path.dirname(status_path)).split("-", 1)[1]
-                if connector.startswith(("eDP", "LVDS", "DSI", "Writeback")):
-                    continue
-                with open(status_path) as f:
-                    if f.read().strip() == "connected":
-                        self._display_check_warned = False
-                        return True
+            for card_path, connectors in self._listDrmCards():
+                for connector in connectors:
+                    if connector.startswith(("eDP", "LVDS", "DSI", "Writeback")):
+                        continue
+                    with open(f"{card_path}-{connector}/status") as f:
+                        if f.read().strip() == "connected":
+                            self._display_check_warned = False
+                            return True
             self._display_check_warned = False
             return False
         except Exception as e:
@@ -786,17 +1940,44 @@ class SunshineController:
                 self._display_check_warned = True
             return True
 
-    def _getCompositionForce(self) -> int | None:
+    def _listDrmCards(self) -> list[tuple[str, list[str]]]:
+        """
+        Enumerate the DRM cards in sysfs with their connectors.
+        :return: (sysfs directory of the card, e.g. /sys/class/drm/card0,
+                 names of its connectors, e.g. ["eDP-1", "DP-1"]) per card
+        """
+        cards = {}
+        for path in sorted(glob.glob(f"{self.DrmSysfsRoot}/card[0-9]*")):
+            # Connector directories are named e.g. card0-eDP-1, card1-DP-2
+            card, separator, connector = os.path.basename(path).partition("-")
+            connectors = cards.setdefault(f"{self.DrmSysfsRoot}/{card}", [])
+            if separator:
+                connectors.append(connector)
+        return list(cards.items())
+
+    async def _getCompositionForce_async(self) -> int | None:
         """
-        Read the current value of the GAMESCOPE_COMPOSITE_FORCE atom.
+        Read the current value of the GAMESCOPE_COMPOSITE_FORCE atom, via X11
+        or (as a fallback) xprop.
         :return: The value, 0 if the atom does not exist, or None if it could not be read
         """
+        client = await self._getX11Client_async()
+        if client is not None:
+            try:
+                value = await client.getCardinal("GAMESCOPE_COMPOSITE_FORCE")
+                # A missing atom means gamescope (re)started without the override
+                return value if value is not None else 0
+            except (OSError, EOFError, asyncio.TimeoutError, x11.X11Error) as e:
+                self.logger.warning(f"Reading GAMESCOPE_COMPOSITE_FORCE via X11 failed, falling back to xprop: {e!r}")
+                client.close()
+
         username = self._getSessionUsername()
         if not username:
             return None
-        result = self._run_and_capture_stdout(
+        result = await self._run_and_capture_stdout_async(
             ["su", username, "-c", "DISPLAY=:0 xprop -root GAMESCOPE_COMPOSITE_FORCE"],
-            context="reading GAMESCOPE_COMPOSITE_FORCE"
+            context="reading GAMESCOPE_COMPOSITE_FORCE",
+            timeout=10
         )
         if result is None:
             return None
@@ -804,60 +1985,111 @@ class SunshineController:
         # A missing atom means gamescope (re)started without the override
         return int(value_match.group(1)) if value_match else 0
 
-    async def pair_async(self, pin, client_name) -> bool:
+    async def _getX11Client_async(self) -> x11.X11Client | None:
+        """
+        The persistent X11 connection to gamescope's XWayland (DISPLAY :0)
+        used for the composition atom, (re)connected on demand. Each xprop
+        call costs two process spawns plus a shell (su, sh, xprop); over the
+        connection a read or write is a socket round trip, and changes of
+        the atom can be watched without polling. The session user's
+        Xauthority cookie is used if there is one. After a failed connection
+        attempt, callers fall back to xprop for X11RetryInterval.
+        :return: The connected client, or None if xprop must be used
         """
-        Send a PIN and client name to the Sunshine server.
+        if self._x11 is not None and self._x11.connected:
+            return self._x11
+        loop = asyncio.get_event_loop()
+        if loop.time() < self._x11_retry_at:
+            return None
+        xauthority_paths = []
+        username = self._getSessionUsername()
+        if username:
+            try:
+                xauthority_paths.append(os.path.join(pwd.getpwnam(username).pw_dir, ".Xauthority"))
+            except KeyError:
+                pass
+        client = x11.X11Client(self.X11Display, xauthority_paths)
+        try:
+            await client.connect()
+        except (OSError, EOFError, asyncio.TimeoutError, x11.X11Error) as e:
+            self._x11_retry_at = loop.time() + self.X11RetryInterval
+            message = f"Could not connect to the X server on DISPLAY :{self.X11Display}, using xprop for the composition override: {e!r}"
+            if self._x11_fallback_warned:
+                self.logger.debug(message)
+            else:
+                self.logger.warning(message)
+                self._x11_fallback_warned = True
+            return None
+        self._x11 = client
+        self._x11_fallback_warned = False
+        return client
+
+    @traced("pair")
+    async def pair_async(self, pin, client_name, timeout: float | None = None) -> dict | None:
+        """
+        Send a PIN and client name to the Sunshine server and wait for the
+        client to show up in Sunshine's client list.
         :param pin: The PIN to send
         :param client_name: The client_name to send
-        :return: True if the Sunshine reported a successful pairing, False otherwise
+        :param timeout: How long to wait for the client, in seconds (default: PairingConfirmTimeout)
+        :return: The client list entry of the newly paired client, or None if
+                 the pairing failed or could not be confirmed in time
         """
         if not pin or not client_name:
             self.logger.info("No pin or client name provided for pairing")
-            return False
+            return None
 
         # /api/pin always returns true when there is a pairing request
         # (https://github.com/LizardByte/Sunshine/issues/3944)
-        # Thus, as a workaround, we check whether the client_name
-        # is now in the list of clients. As these names
-        # do not have to be unique, i.e. a client with the given
-        # client_name could already have been in that list, we check
-        # whether there now is one more client with that name.
-        count_before = await self._getCountOfClientName_async(client_name)
-        if count_before is None:
-            self.logger.error("Could not get client count before pairing")
-            return False
+        # Thus, as a workaround, we check whether a client with the given
+        # client_name was added to the list of clients. As these names do
+        # not have to be unique, clients are told apart by their certificate
+        # identity rather than by name.
+        with span("clients_before"):
+            clients_before = await self._getNamedCerts_async()
+        if clients_before is None:
+            self.logger.error("Could not get client list before pairing")
+            return None
+        known = {self._getClientIdentity(client) for client in clients_before}
 
-        res = await self._request_async("/api/pin", { "pin": pin, "name": client_name })
+        with span("send_pin"):
+            res = await self._request_async("/api/pin", { "pin": pin, "name": client_name })
         if not res.ok or not res.data.get("status"):
             self.logger.error("Failed to send PIN and client name to Sunshine")
-            return False
-
-        # It seems Sunshine needs a moment to update the client list,
-        # so we need to wait shortly before checking the client list again
-        await asyncio.sleep(1)
-        count_after = await self._getCountOfClientName_async(client_name)
-        if count_after is None:
-            self.logger.error("Could not get client count after pairing")
-            return False
+            return None
 
-        return count_after == count_before + 1
+        # Sunshine adds the client to its list shortly after accepting the
+        # PIN; poll with a growing interval so a quick pairing is confirmed
+        # quickly without hammering the API during a slow one
+        with span("confirm"):
+            timeout = self.PairingConfirmTimeout if timeout is None else timeout
+            deadline = time.monotonic() + timeout
+            interval = self.PairingPollMin
+            while True:
+                await asyncio.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+                clients = await self._getNamedCerts_async()
+                for client in clients or []:
+                    if client.get("name") == client_name and self._getClientIdentity(client) not in known:
+                        return client
+                if time.monotonic() >= deadline:
+                    break
+                interval = min(interval * 2, self.PairingPollMax)
+
+        self.logger.error(f"Client {client_name} did not show up in the client list within {timeout} seconds")
+        return None
 
     async def getSunshineVersionInfo_async(self, refresh_appstream: bool = True) -> dict | None:
-        """
-        Async variant of getSunshineVersionInfo that doesn't block the event loop.
-        """
-        return await self._to_thread(lambda: self.getSunshineVersionInfo(refresh_appstream))
-
-    def getSunshineVersionInfo(self, refresh_appstream: bool = True) -> dict | None:
         """
         Get the current and available update version of Sunshine.
         :param refresh_appstream: Whether to refresh the Flatpak appstream data (requires network access
-                                  and can take a while) before checking for an update
+                                  and can take a while) before checking for an update; without it, the
+                                  check only uses Flatpak's locally cached remote metadata
         :return: A dict with keys 'current_version' and 'update_version', or None if an error occurred
         """
-        info_result = self._run_and_capture_stdout(
+        info_result = await self._run_and_capture_stdout_async(
             ["flatpak", "info", self.SunshineFlatpakAppId],
-            context="getting Sunshine version info"
+            context="getting Sunshine version info",
+            timeout=30
         )
 
         current_version = None
@@ -866,12 +2098,17 @@ class SunshineController:
                 current_version = version.strip()
 
         if refresh_appstream:
-            self._run_and_check(['flatpak', 'update', '--appstream'], context="refreshing Flatpak appstream data")
-
-        result = self._run_and_capture_stdout(
-            ["flatpak", "remote-ls", "--app", "--updates", "--system", "--columns=application,version"],
-            context="checking for Sunshine updates"
+            if not await self._run_and_check_async(['flatpak', 'update', '--appstream'], context="refreshing Flatpak appstream data", timeout=300):
+                return None
+
+        result = await self._run_and_capture_stdout_async(
+            ["flatpak", "remote-ls", "--app", "--updates", "--system", "--columns=application,version"]
+            + ([] if refresh_appstream else ["--cached"]),
+            context="checking for Sunshine updates",
+            timeout=300
         )
+        if result is None:
+            return None
 
         update_version = None
         if result:
@@ -884,60 +2121,118 @@ class SunshineController:
             "update_version": update_version
         }
 
+    @traced("update")
     async def updateSunshine_async(self) -> bool:
         """
         Update Sunshine to the latest version.
         :return: True if the update was successful, False otherwise
         """
-        stopped = await self.stop_async()
+        with span("stop"):
+            stopped = await self.stop_async()
         if not stopped:
             self.logger.error("Couldn't stop Sunshine for update")
             return False
         self.logger.info("Sunshine stopped for update. Installing update now...")
-        installed = await self._to_thread(self._installOrUpdateSunshine)
+        with span("install"):
+            installed = await self._installOrUpdateSunshine_async()
         if not installed:
             self.logger.error("Couldn't update Sunshine")
             return False
         self.logger.info("Sunshine updated successfully. Starting Sunshine now...")
-        started = await self.start_async()
+        with span("start"):
+            started = await self.start_async()
         if not started:
             self.logger.error("Couldn't start Sunshine after update")
             return False
         self.logger.info("Sunshine started after update")
         return True
 
-    def _run(self, args: Sequence[str], context: str | None = None) -> subprocess.CompletedProcess | None:
+    async def _run_async(self, args: Sequence[str], context: str | None = None, timeout: float | None = None, stream_output: bool = False) -> subprocess.CompletedProcess | None:
         """
-        Fire-and-forget wrapper returning CompletedProcess on success (return code == 0), else None.
-        Captures stdout/stderr for callers that parse output.
+        Run a command on the event loop and return its CompletedProcess on
+        success (return code == 0), else None. Captures stdout/stderr for
+        callers that parse output. The process is killed when the timeout
+        expires or the caller is cancelled, so a stop or uninstall never
+        waits for a hanging subprocess.
         :param args: The command and its arguments to run
         :param context: A description of the context in which the command is run (for logging purposes)
+        :param timeout: Seconds after which the command is killed and considered failed (default: no timeout)
+        :param stream_output: Whether to log the command's stdout line by line while it runs,
+                              for long-running commands like flatpak install
         :return: The CompletedProcess if the command was successful, None otherwise
         """
         context = context or f"executing {shlex.quote(args[0])}"
         try:
-            proc = subprocess.run(
-                list(args),
+            proc = await asyncio.create_subprocess_exec(
+                *args,
                 env=self.environment_variables,
-                capture_output=True,
-                text=True,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
             )
         except Exception as e:
             self.logger.exception(f"An exception occurred when {context}", exc_info=e)
             return None
 
+        try:
+            stdout, stderr = await asyncio.wait_for(self._collectOutput(proc, context if stream_output else None), timeout)
+        except asyncio.TimeoutError:
+            self._killProcess(proc)
+            self.logger.error(f"The command {context} timed out after {timeout} seconds and was killed")
+            return None
+        except BaseException:
+            # Also on cancellation: do not leave the process running unobserved
+            self._killProcess(proc)
+            raise
+
         if proc.returncode != 0:
             self.logger.error(
-                f"The command {context} failed with return code {proc.returncode} and stderr={proc.stderr.strip()}"
+                f"The command {context} failed with return code {proc.returncode} and stderr={stderr.strip()}"
             )
             return None
-        return proc
+        return subprocess.CompletedProcess(list(args), proc.returncode, stdout, stderr)
+
+    async def _collectOutput(self, proc: asyncio.subprocess.Process, log_context: str | None) -> tuple[str, str]:
+        """
+        Read stdout and stderr of proc until it exits.
+        :param log_context: If set, each stdout line is logged under this context as it arrives
+        :return: (stdout, stderr)
+        """
+        async def pump(stream: asyncio.StreamReader, log: bool) -> str:
+            chunks = []
+            pending = ""
+            while True:
+                chunk = await stream.read(4096)
+                if not chunk:
+                    break
+                text = chunk.decode(errors="replace")
+                chunks.append(text)
+                if log:
+                    # Progress output may update a line with \r instead of \n
+                    *lines, pending = re.split(r"[\r\n]", pending + text)
+                    for line in lines:
+                        if line.strip():
+                            self.logger.info(f"[{log_context}] {line.strip()}")
+            if log and pending.strip():
+                self.logger.info(f"[{log_context}] {pending.strip()}")
+            return "".join(chunks)
+
+        stdout, stderr = await asyncio.gather(pump(proc.stdout, log_context is not None), pump(proc.stderr, False))
+        await proc.wait()
+        return stdout, stderr
 
-    def _run_and_check(self, args: Sequence[str], context: str | None = None) -> bool:
-        return self._run(args, context) is not None
+    @staticmethod
+    def _killProcess(proc: asyncio.subprocess.Process) -> None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+    async def _run_and_check_async(self, args: Sequence[str], context: str | None = None, timeout: float | None = None, stream_output: bool = False) -> bool:
+        return await self._run_async(args, context, timeout, stream_output) is not None
 
-    def _run_and_capture_stdout (self, args: Sequence[str], context: str | None = None) -> str | None:
-        proc = self._run(args, context)
+    async def _run_and_capture_stdout_async(self, args: Sequence[str], context: str | None = None, timeout: float | None = None) -> str | None:
+        proc = await self._run_async(args, context, timeout)
         return proc.stdout if proc else None
 
     async def _to_thread(self, func):
@@ -950,16 +2245,6 @@ class SunshineController:
         return await loop.run_in_executor(None, func)
 
     async def _request_async(self, path, data=None) -> RequestResult:
-        """
-        Make an async HTTP request to the Sunshine server.
-        :param path: The path of the request
-        :param data: The request data (optional)
-        :return: A RequestResult
-        """
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._request, path, data)
-
-    def _request(self, path, data=None) -> RequestResult:
         """
         Make an HTTP request to the Sunshine server.
         :param path: The path of the request
@@ -967,58 +2252,56 @@ class SunshineController:
         :return: A RequestResult
         """
         try:
-            request = self._createRequest(path, data)
-            # The timeout must be passed here: OpenerDirector.open() unconditionally
-            # overwrites a timeout attribute set on the Request object.
-            with self.opener.open(request, timeout=5) as response:
-                if response.getcode() != OK:
-                    self.logger.error(f"Request to path '{path}' with data '{data}' failed with code: {response.getcode()}")
-                    return RequestResult.failure(RequestError.OTHER)
-                encoding = response.headers.get_content_charset() or "utf-8"
-                content = response.read().decode(encoding)
-                return RequestResult.success(json.loads(content))
-
-        except HTTPError as e:
-            if e.code == UNAUTHORIZED:
+            method, body, headers = self._createRequest(path, data)
+            status, content, charset = await self._apiClient.request(method, path, body, headers)
+            if status == UNAUTHORIZED:
                 return RequestResult.failure(RequestError.UNAUTHORIZED)
-            else:
-                self.logger.error(f"HTTP error in request to path '{path}' with data '{data}', code: {e.code}, reason: {e.reason}")
+            if status != OK:
+                self.logger.error(f"Request to path '{path}' with data '{data}' failed with code: {status}")
                 return RequestResult.failure(RequestError.OTHER)
+            return RequestResult.success(json.loads(content.decode(charset or "utf-8")))
 
-        except URLError as e:
-            # Check if the reason is a connection refusal,
-            # which means Sunshine's web server is not running (yet)
-            if isinstance(e.reason, ConnectionRefusedError) or (
-                isinstance(e.reason, OSError) and getattr(e.reason, "errno", None) == 111
-            ):
-                self.logger.error(f"Server not reachable when requesting path '{path}' with data '{data}': Connection refused")
-                return RequestResult.failure(RequestError.UNREACHABLE)
-            else:
-                self.logger.error(f"URL error in request to path '{path}' with data '{data}', reason: {e.reason}")
-                return RequestResult.failure(RequestError.OTHER)
+        except ConnectionRefusedError:
+            # Sunshine's web server is not running (yet)
+            self.logger.error(f"Server not reachable when requesting path '{path}' with data '{data}': Connection refused")
+            return RequestResult.failure(RequestError.UNREACHABLE)
+
+        except asyncio.TimeoutError:
+            self.logger.error(f"Request to path '{path}' with data '{data}' timed out")
+            return RequestResult.failure(RequestError.OTHER)
+
+        except (OSError, EOFError) as e:
+            self.logger.error(f"Connection error in request to path '{path}' with data '{data}', reason: {e!r}")
+            return RequestResult.failure(RequestError.OTHER)
 
         except Exception as e:
             self.logger.exception(f"An error occurred when performing a request to path '{path}' with data '{data}'", exc_info=e)
             return RequestResult.failure(RequestError.OTHER)
 
-    def _createRequest(self, path, data=None) -> Request:
+    def _createRequest(self, path, data=None) -> tuple[str, bytes | None, dict]:
         """
-        Create a Request with necessary headers and set the data accordingly.
+        Build the method, body and headers of a request; a request with data
+        is a JSON POST.
         :param path: The path of the request
         :param data: The data to send to the server (optional)
-        :return: A configured Request object
-        """
-        sunshineBaseUrl = "https://127.0.0.1:47990"
-        url = sunshineBaseUrl + path
-        request = Request(url)
-        request.add_header("User-Agent", "decky-sunshine")
-        request.add_header("Connection", "keep-alive")
-        request.add_header("Accept", "application/json, */*; q=0.01")
-        request.add_header("Authorization", self.authHeader)
+        :return: A tuple (method, body, headers)
+        """
+        headers = {
+            "User-Agent": "decky-sunshine",
+            "Connection": "keep-alive",
+            "Accept": "application/json, */*; q=0.01",
+            "Authorization": self.authHeader,
+        }
         if data:
-            request.add_header("Content-Type", "application/json")
-            request.data = json.dumps(data).encode('utf-8')
-        return request
+            headers["Content-Type"] = "application/json"
+            return "POST", json.dumps(data).encode('utf-8'), headers
+        return "GET", None, headers
+
+    def getApiClientStats(self) -> dict:
+        """
+        See SunshineApiClient.stats.
+        """
+        return self._apiClient.stats()
 
     def _findPulseAudioSocketPath(self) -> str:
         """
@@ -1029,8 +2312,46 @@ class SunshineController:
         must point to a socket speaking the PulseAudio protocol, while pipewire-0
         speaks the PipeWire native protocol -- it would accept a connection but be
         unusable for Sunshine's libpulse client.
+        The search result is memoized until the runtime directories change,
+        see SessionEnvironment; a search that found sockets which did not
+        accept connections yet is repeated on the next call.
         :return: The socket path in the format "/path/to/socket", or a default path if not found
         """
+        socket_path, existing_not_connectable = self._session.get(
+            "pulse_socket",
+            self._scanPulseAudioSockets,
+            cacheable=lambda result: result[0] is not None or not result[1]
+        )
+        if socket_path is not None:
+            # Re-arm the fallback warning so a later regression is reported again
+            self._socket_fallback_warned = False
+            return socket_path
+
+        # If no usable socket was found, return a default path
+        # Try to use deck user's UID if found, otherwise use 1000
+        try:
+            default_uid = pwd.getpwnam('deck').pw_uid
+        except KeyError:
+            default_uid = 1000
+        default_socket = f"/run/user/{default_uid}/pulse/native"
+        if existing_not_connectable:
+            message = (f"PulseAudio socket(s) found but not accepting connections (yet): "
+                       f"{', '.join(existing_not_connectable)} - using default: {default_socket}")
+        else:
+            message = f"No PulseAudio socket found, using default: {default_socket}"
+        if self._socket_fallback_warned:
+            self.logger.debug(message)
+        else:
+            self.logger.warning(message)
+            self._socket_fallback_warned = True
+        return default_socket
+
+    def _scanPulseAudioSockets(self) -> tuple[str | None, list[str]]:
+        """
+        Search the PulseAudio socket, see _findPulseAudioSocketPath.
+        :return: (the first connectable socket or None, the sockets found
+                 that did not accept a connection)
+        """
         # Try to get XDG_RUNTIME_DIR first, which is the standard location
         xdg_runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
 
@@ -1045,11 +2366,9 @@ class SunshineController:
         # Note that we determine the UID of the specific user 'deck' here to prioritize it,
         # as on systems other than the Steam Deck another user might be used,
         # and thus the default UID 1000 must not be hardcoded.
-        deck_uid = None
         try:
             deck_user = pwd.getpwnam('deck')
-            deck_uid = deck_user.pw_uid
-            socket_patterns.append(f"/run/user/{deck_uid}/pulse/native")
+            socket_patterns.append(f"/run/user/{deck_user.pw_uid}/pulse/native")
         except KeyError:
             # User 'deck' does not exist, which is expected on non-Steam Deck systems
             pass
@@ -1064,7 +2383,7 @@ class SunshineController:
         # Build a duplicate-free candidate list before probing: the same path can
         # arrive via several patterns (e.g. XDG_RUNTIME_DIR, the deck user entry
         # and the /run/user/* glob), and each socket should only get one connect
-        # attempt and appear only once in the fallback log below.
+        # attempt and appear only once in the fallback warning.
         candidate_paths = []
         for pattern in socket_patterns:
             matches = self._expandSocketPattern(pattern) if '*' in pattern else [pattern]
@@ -1080,26 +2399,9 @@ class SunshineController:
             if not os.path.exists(socket_path):
                 continue
             if self._canConnectToAudioSocket(socket_path):
-                # Re-arm the fallback warning so a later regression is reported again
-                self._socket_fallback_warned = False
-                return socket_path
+                return socket_path, existing_not_connectable
             existing_not_connectable.append(socket_path)
-
-        # If no usable socket was found, return a default path
-        # Try to use deck user's UID if found, otherwise use 1000
-        default_uid = deck_uid if deck_uid else 1000
-        default_socket = f"/run/user/{default_uid}/pulse/native"
-        if existing_not_connectable:
-            message = (f"PulseAudio socket(s) found but not accepting connections (yet): "
-                       f"{', '.join(existing_not_connectable)} - using default: {default_socket}")
-        else:
-            message = f"No PulseAudio socket found, using default: {default_socket}"
-        if self._socket_fallback_warned:
-            self.logger.debug(message)
-        else:
-            self.logger.warning(message)
-            self._socket_fallback_warned = True
-        return default_socket
+        return None, existing_not_connectable
 
     @staticmethod
     def _expandSocketPattern(pattern: str) -> list:
@@ -1137,12 +2439,17 @@ class SunshineController:
             self.logger.exception("Unexpected error checking audio availability", exc_info=e)
             return False
 
-    def _isDisplayAvailable(self) -> bool:
+    async def _isDisplayAvailable_async(self) -> bool:
         """
-        Check whether a display is available.
+        Check whether a display is available. Asks the kernel directly (see
+        _probeDisplayNative) and only falls back to drm_info if that fails.
         :return: True, if a display is available, otherwise False.
         """
-        result = self._run_and_capture_stdout(["drm_info", "-j"], context="checking for available display")
+        available = self._probeDisplayNative()
+        if available is not None:
+            return available
+
+        result = await self._run_and_capture_stdout_async(["drm_info", "-j"], context="checking for available display", timeout=10)
 
         try:
             data = json.loads(result or "{}")
@@ -1167,6 +2474,43 @@ class SunshineController:
                     return True
         return False
 
+    def _probeDisplayNative(self) -> bool | None:
+        """
+        Look for a CRTC with a framebuffer attached (fb_id != 0) - the same
+        criterion as the drm_info check in _isDisplayAvailable_async - by
+        issuing the DRM mode ioctls on /dev/dri/card* directly. At cold boot
+        this runs once per second until the display is up; drm_info would
+        fork, dump every card, connector, plane and CRTC as JSON and have it
+        parsed, only to find one CRTC. Stops at the first CRTC found.
+        :return: Whether a display is available, or None if the probe failed
+                 (the caller then falls back to drm_info)
+        """
+        try:
+            for card_path in sorted(glob.glob(self.DrmCardPattern)):
+                fd = os.open(card_path, os.O_RDONLY | os.O_CLOEXEC)
+                try:
+                    # First call: only the counts are filled in
+                    resources = DrmModeCardRes()
+                    fcntl.ioctl(fd, DRM_IOCTL_MODE_GETRESOURCES, resources)
+                    if resources.count_crtcs == 0:
+                        continue
+                    # Second call: fill in the CRTC ids; the other counts
+                    # are zeroed, so the kernel does not write those arrays
+                    crtc_ids = (ctypes.c_uint32 * resources.count_crtcs)()
+                    resources = DrmModeCardRes(crtc_id_ptr=ctypes.addressof(crtc_ids), count_crtcs=len(crtc_ids))
+                    fcntl.ioctl(fd, DRM_IOCTL_MODE_GETRESOURCES, resources)
+                    for crtc_id in crtc_ids[:min(resources.count_crtcs, len(crtc_ids))]:
+                        crtc = DrmModeCrtc(crtc_id=crtc_id)
+                        fcntl.ioctl(fd, DRM_IOCTL_MODE_GETCRTC, crtc)
+                        if crtc.fb_id != 0:
+                            return True
+                finally:
+                    os.close(fd)
+            return False
+        except Exception as e:
+            self.logger.debug(f"Native DRM probe failed, falling back to drm_info: {e!r}")
+            return None
+
     def _isAudioAvailable(self) -> bool:
         """
         Check whether the audio subsystem (PulseAudio/PipeWire) is available.
@@ -1185,7 +2529,8 @@ class SunshineController:
             # Non-unix values (e.g. tcp:host:port) are trusted without a check
             return True
 
-        # Re-evaluate the best socket each time, as the correct socket may not have existed on startup (cold boot)
+        # Re-evaluate the best socket each time, as the correct socket may not
+        # have existed on startup (cold boot); memoized while nothing changes
         pulse_socket_path = self._findPulseAudioSocketPath()
 
         # Checking whether the socket path exists should only fail in case we had to use a default path
@@ -1193,8 +2538,11 @@ class SunshineController:
             self.logger.debug(f"Audio socket does not exist: {pulse_socket_path}")
             return False
 
-        # Try to connect to the socket to verify it's actually working
+        # Try to connect to the socket to verify it's actually working. A
+        # memoized socket may have gone stale without its directory changing
+        # (e.g. the sound server restarted in place); search again next time.
         if not self._canConnectToAudioSocket(pulse_socket_path):
+            self._session.invalidate("pulse_socket")
             return False
 
         # Update the environment variable if a different working socket was found so Sunshine will use it
@@ -1204,17 +2552,26 @@ class SunshineController:
             self.logger.info(f"Updated PULSE_SERVER to {pulse_env_var}")
         return True
 
-    async def _getCountOfClientName_async(self, client_name) -> int | None:
+    async def _getNamedCerts_async(self) -> list[dict] | None:
         """
-        Get the count of clients with the given client_name.
-        :param client_name: The client name to count
-        :return: The count of clients with the given name, or None if an error occurred
+        Get the clients paired with Sunshine.
+        :return: The named_certs entries of /api/clients/list, or None if an error occurred
         """
         res = await self._request_async("/api/clients/list")
         if not res.ok or not res.data.get("status"):
             return None
 
-        return len([client for client in res.data.get("named_certs", []) if client.get("name") == client_name])
+        return res.data.get("named_certs", [])
+
+    @staticmethod
+    def _getClientIdentity(client: dict) -> str:
+        """
+        Get what identifies a paired client: its uuid, or its certificate on
+        Sunshine versions without client uuids.
+        :param client: A named_certs entry of /api/clients/list
+        :return: The client's identity
+        """
+        return client.get("uuid") or client.get("cert") or json.dumps(client, sort_keys=True)
 
     def _wasBwrapCopied(self) -> bool:
         """
@@ -1230,7 +2587,7 @@ class SunshineController:
     def removeBwrapCopy(self) -> bool:
         """
         Remove the directory holding the setuid-root bwrap copy. Uninstall
-        counterpart to _copyBwrap: without it a setuid-root binary would
+        counterpart to _copyBwrap_async: without it a setuid-root binary would
         survive the plugin's removal.
         :return: True if the copy is gone afterwards, False otherwise
         """
@@ -1257,10 +2614,11 @@ class SunshineController:
 
     def dispatchUninstallCleanup(self, log_path: str) -> bool:
         """
-        Stop Sunshine and release the composition override from a detached
-        helper process during plugin uninstall. Stopping in-process is not
-        reliable there: the loader SIGKILLs the plugin process at the
-        latest ~5 s after SIGTERM, and on the Deck its event loop was
+        Stop Sunshine, release the composition override and restore what the
+        performance profile changed from a detached helper process during
+        plugin uninstall. Stopping in-process is not reliable there: the
+        loader SIGKILLs the plugin process at the latest ~5 s after SIGTERM,
+        and on the Deck its event loop was
         observed to stop even earlier, mid-uninstall - anything still
         needing the loop never ran. The SIGKILL only hits the plugin
         process itself (no process-group kill), so a helper in its own
@@ -1283,6 +2641,12 @@ class SunshineController:
             )
         else:
             script += 'echo "no session user found - not touching the composition override"\n'
+        restore_writes = self._performance.restoreWrites()
+        if restore_writes:
+            script += 'echo "restoring the values the performance profile changed"\n'
+            for path, value in restore_writes:
+                script += f'printf %s {shlex.quote(value)} > {shlex.quote(path)} || echo could not restore {shlex.quote(path)}\n'
+            script += f'rm -f {shlex.quote(self._performance.snapshot_path)}\n'
         script += 'echo "$(date) - uninstall cleanup done"\n'
         try:
             # environment_variables (not the inherited env) is required here:
@@ -1298,17 +2662,32 @@ class SunshineController:
         self.logger.info("Dispatched the detached uninstall cleanup helper")
         return True
 
-    def _isSunshineInstalled(self) -> bool:
-        result = self._run_and_capture_stdout(
+    async def _isSunshineInstalled_async(self) -> bool:
+        result = await self._run_and_capture_stdout_async(
                 ["flatpak", "list", "--system", "--columns=application"],
-                context="checking whether Sunshine is installed"
+                context="checking whether Sunshine is installed",
+                timeout=30
             )
         return any(line.strip() == self.SunshineFlatpakAppId for line in (result or "").splitlines())
 
-    def _copyBwrap(self) -> bool:
+    async def _copyBwrap_async(self) -> bool:
+        """
+        See _syncBwrapCopy.
+        """
+        return await self._to_thread(self._syncBwrapCopy)
+
+    def _syncBwrapCopy(self) -> bool:
         """
-        Copy the bwrap binary to its dedicated root-owned directory.
-        :return: True if the copy was successful, False otherwise
+        Make the bwrap copy in its dedicated root-owned directory identical
+        to the system binary, owned by root and setuid. The copy is only
+        rewritten if it differs from the source (see _isBwrapCopyCurrent),
+        which also picks up bwrap updates from the OS; ownership and mode
+        are (re)applied either way. Everything happens in-process on file
+        descriptors instead of through cp, chown and chmod subprocesses on
+        every start. A new copy is written to a temporary file and renamed
+        over the old one, so the path never holds a partial binary and a
+        copy still being executed is not written to.
+        :return: True if the copy is in place, False otherwise
         """
         bwrap_path = self.environment_variables["FLATPAK_BWRAP"]
         bwrap_dir = os.path.dirname(bwrap_path)
@@ -1320,10 +2699,70 @@ class SunshineController:
         except Exception as e:
             self.logger.exception("An error occurred when creating the bwrap directory", exc_info=e)
             return False
-        return self._run_and_check(
-                ["cp", "/usr/bin/bwrap", bwrap_path],
-                context="copying bwrap to its dedicated directory"
-        )
+
+        temp_path = bwrap_path + ".new"
+        try:
+            source_stat = os.stat(self.BwrapSourcePath)
+            mode = stat.S_IMODE(source_stat.st_mode) | stat.S_ISUID
+            if self._isBwrapCopyCurrent(bwrap_path, source_stat):
+                fd = os.open(bwrap_path, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC)
+                try:
+                    self._setBwrapOwnerAndMode(fd, mode)
+                finally:
+                    os.close(fd)
+                return True
+
+            with open(self.BwrapSourcePath, "rb") as source:
+                fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW | os.O_CLOEXEC, 0o700)
+                try:
+                    with os.fdopen(fd, "wb", closefd=False) as target:
+                        shutil.copyfileobj(source, target)
+                    self._setBwrapOwnerAndMode(fd, mode)
+                    # The source's mtime marks the copy as current for the
+                    # next start
+                    os.utime(fd, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+                finally:
+                    os.close(fd)
+            os.replace(temp_path, bwrap_path)
+            self.logger.info(f"Copied {self.BwrapSourcePath} to {bwrap_path}")
+            return True
+        except Exception as e:
+            self.logger.exception("An error occurred when copying bwrap to its dedicated directory", exc_info=e)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+    def _isBwrapCopyCurrent(self, path: str, source_stat: os.stat_result) -> bool:
+        """
+        Whether the copy at path is a regular file with the source's size,
+        mtime and content (SHA-256). Size and mtime are checked first, so a
+        changed source is usually detected without reading either file.
+        """
+        try:
+            copy_stat = os.lstat(path)
+        except FileNotFoundError:
+            return False
+        if (not stat.S_ISREG(copy_stat.st_mode)
+                or copy_stat.st_size != source_stat.st_size
+                or copy_stat.st_mtime_ns != source_stat.st_mtime_ns):
+            return False
+        return self._hashFile(path) == self._hashFile(self.BwrapSourcePath)
+
+    @staticmethod
+    def _hashFile(path: str) -> bytes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+        return digest.digest()
+
+    @staticmethod
+    def _setBwrapOwnerAndMode(fd: int, mode: int) -> None:
+        # In this order: changing the owner clears the setuid bit
+        os.chown(fd, 0, 0)
+        os.chmod(fd, mode)
 
     def _verifySetuidBit(self, path: str) -> bool:
         """
@@ -1360,14 +2799,16 @@ class SunshineController:
 
         return True
 
-    def _installOrUpdateSunshine(self) -> bool:
+    async def _installOrUpdateSunshine_async(self) -> bool:
         """
-        Install or update Sunshine using Flatpak.
+        Install or update Sunshine using Flatpak, logging its progress.
         :return: True if the installation or update was successful, False otherwise
         """
-        return self._run_and_check(
+        return await self._run_and_check_async(
             ["flatpak", "install", "--system", "--noninteractive", "--or-update", self.SunshineFlatpakAppId],
-            context="installing or updating Sunshine via Flatpak"
+            context="installing or updating Sunshine via Flatpak",
+            timeout=1800,
+            stream_output=True
         )
 
     async def _initSunshine(self) -> bool:
@@ -0,0 +1,182 @@
+import os
+import tempfile
+import threading
+
+# How Sunshine's config parser spells booleans (config.cpp's to_bool); the
+# first of each is what set() writes
+_TRUE_VALUES = ("enabled", "true", "yes", "enable", "on", "1")
+_FALSE_VALUES = ("disabled", "false", "no", "disable", "off", "0")
+
+class SunshineConfig:
+    """
+    Sunshine's config file (sunshine.conf): "key = value" lines, comments
+    starting with #. Parsed on first use and then only re-read when the file
+    was replaced or modified (its inode, mtime or size changed), so frequent
+    lookups do not re-parse it. Writes go to a temporary file that replaces
+    the config, so readers - Sunshine included - never see a partial file.
+    Lines the plugin does not change, comments included, are kept as they are.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # Serializes read-modify-write cycles; calls come from worker threads
+        self._lock = threading.RLock()
+        self._lines = []
+        self._values = {}
+        # (inode, mtime, size) of the parsed file, or None if it did not exist
+        self._signature = None
+        self._loaded = False
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        """
+        :return: The value of key, or default if the file does not set it
+        """
+        with self._lock:
+            self._refresh()
+            return self._values.get(key, default)
+
+    def getList(self, key: str) -> list[str]:
+        """
+        :return: The comma-separated entries of key, empty ones dropped
+        """
+        value = self.get(key) or ""
+        return [entry.strip() for entry in value.split(",") if entry.strip()]
+
+    def getBool(self, key: str, default: bool | None = None) -> bool | None:
+        """
+        :return: The boolean value of key, or default if the file does not set
+                 it or its value is not a boolean
+        """
+        value = (self.get(key) or "").lower()
+        if value in _TRUE_VALUES:
+            return True
+        if value in _FALSE_VALUES:
+            return False
+        return default
+
+    def getInt(self, key: str, default: int | None = None) -> int | None:
+        """
+        :return: The integer value of key, or default if the file does not set
+                 it or its value is not an integer
+        """
+        try:
+            return int(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def set(self, key: str, value) -> bool:
+        """
+        Set one key, see update().
+        """
+        return self.update({key: value})
+
+    def update(self, changes: dict) -> bool:
+        """
+        Set several keys in one write. Values may be strings, booleans,
+        integers or lists (written comma-separated); None removes the key.
+        An existing key is changed on its line, a new one appended.
+        :return: True if the file was changed, False if it already had the values
+        :raises OSError: If the file could not be read or written
+        """
+        with self._lock:
+            self._refresh()
+            lines = list(self._lines)
+            changed = False
+            for key, value in changes.items():
+                value = self._format(value)
+                if value == self._values.get(key):
+                    continue
+                changed = True
+                if value is None:
+                    lines = [line for line in lines if self._splitLine(line)[0] != key]
+                    continue
+                index = self._findLine(lines, key)
+                if index is None:
+                    lines.append(f"{key} = {value}")
+                else:
+                    lines[index] = f"{key} = {value}"
+            if changed:
+                self._write(lines)
+            return changed
+
+    def _refresh(self) -> None:
+        try:
+            st = os.stat(self.path)
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            signature = None
+        if self._loaded and signature == self._signature:
+            return
+        lines = []
+        if signature is not None:
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        self._parse(lines, signature)
+
+    def _parse(self, lines: list[str], signature) -> None:
+        values = {}
+        for line in lines:
+            key, value = self._splitLine(line)
+            # Like Sunshine, the last occurrence of a key wins
+            if key is not None:
+                values[key] = value
+        self._lines = lines
+        self._values = values
+        self._signature = signature
+        self._loaded = True
+
+    def _write(self, lines: list[str]) -> None:
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        fd, temp_path = tempfile.mkstemp(prefix=".sunshine.conf.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                # Keep the config's owner and mode instead of mkstemp's 0600
+                if st is not None:
+                    os.fchown(f.fileno(), st.st_uid, st.st_gid)
+                    os.fchmod(f.fileno(), st.st_mode & 0o7777)
+                else:
+                    os.fchmod(f.fileno(), 0o644)
+                os.fsync(f.fileno())
+                written = os.fstat(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        self._parse(lines, (written.st_ino, written.st_mtime_ns, written.st_size))
+
+    @staticmethod
+    def _format(value) -> str | None:
+        if value is None:
+            return None
+        if isinstance(value, bool):
+            return _TRUE_VALUES[0] if value else _FALSE_VALUES[0]
+        if isinstance(value, (list, tuple)):
+            return ",".join(str(entry) for entry in value)
+        return str(value)
+
+    @classmethod
+    def _findLine(cls, lines: list[str], key: str) -> int | None:
+        # The last occurrence, the one Sunshine uses
+        for index in range(len(lines) - 1, -1, -1):
+            if cls._splitLine(lines[index])[0] == key:
+                return index
+        return None
+
+    @staticmethod
+    def _splitLine(line: str) -> tuple[str | None, str | None]:
+        if line.lstrip().startswith("#"):
+            return None, None
+        key, separator, value = line.partition("=")
+        if not separator or not key.strip():
+            return None, None
+        return key.strip(), value.strip()
@@ -0,0 +1,201 @@
+import collections
+import os
+import re
+
+# "[2024-06-01 12:34:56.789]: Info: CLIENT CONNECTED"
+_LINE = re.compile(r"^\[(?P<time>[^\]]+)\]: (?P<level>\w+): (?P<message>.*)$")
+_CAPTURE = re.compile(r"^Screencasting with (?P<capture>.+?)\s*$")
+_ENCODER = re.compile(r"^Found (?P<codec>\S+) encoder: (?P<encoder>\S+) \[(?P<backend>[^\]]+)\]")
+_MODE = re.compile(r"(?P<width>\d{3,5})x(?P<height>\d{3,5})(?:(?:x|\s*@\s*)(?P<fps>\d+(?:\.\d+)?))?")
+_FPS = re.compile(r"(?P<fps>\d+(?:\.\d+)?)\s*fps\b", re.IGNORECASE)
+_MODE_HINT = re.compile(r"resolution|mode|fps|framerate", re.IGNORECASE)
+
+def parseLine(line: str) -> dict | None:
+    """
+    Parse a line of sunshine.log into an event: a dict with the kind, the
+    log's timestamp and message, and the kind's fields. Kinds:
+    - client_connected, client_disconnected
+    - capture: the capture method ("KMS", "X11", "Wayland's protocol", ...)
+    - encoder: codec, encoder and backend of an encoder Sunshine found
+    - video_mode: width, height and fps (None if not logged along)
+    - error: an Error or Fatal line
+    Sunshine's wording is not an interface, so the video mode in particular
+    is matched loosely (a WxH on a line mentioning the resolution, mode or
+    fps).
+    :return: The event, or None for lines of no interest
+    """
+    match = _LINE.match(line)
+    if match is None:
+        return None
+    level, message = match["level"], match["message"].strip()
+    event = {"time": match["time"], "message": message}
+    if message == "CLIENT CONNECTED":
+        return {"kind": "client_connected", **event}
+    if message == "CLIENT DISCONNECTED":
+        return {"kind": "client_disconnected", **event}
+    if level in ("Error", "Fatal"):
+        return {"kind": "error", **event}
+    capture = _CAPTURE.match(message)
+    if capture is not None:
+        return {"kind": "capture", "capture": capture["capture"], **event}
+    encoder = _ENCODER.match(message)
+    if encoder is not None:
+        return {"kind": "encoder", "codec": encoder["codec"], "encoder": encoder["encoder"], "backend": encoder["backend"], **event}
+    if _MODE_HINT.search(message):
+        mode = _MODE.search(message)
+        fps = mode["fps"] if mode is not None and mode["fps"] else None
+        if fps is None:
+            fps_match = _FPS.search(message)
+            fps = fps_match["fps"] if fps_match is not None else None
+        if mode is not None:
+            return {"kind": "video_mode", "width": int(mode["width"]), "height": int(mode["height"]),
+                    "fps": float(fps) if fps is not None else None, **event}
+    return None
+
+class LogTailer:
+    """
+    Follows sunshine.log incrementally: every read() continues at the byte
+    offset the previous one stopped at, so the file is never read twice. A
+    rotation - the file replaced, truncated or rewritten from the start, as
+    Sunshine does on every start - is detected by its inode, its size and
+    its first bytes, and reading starts over at the beginning of the new
+    file. Parsed events (see parseLine) are kept in a bounded history, and
+    a summary of the current stream is derived from them.
+    """
+    # How much of an unknown log is read when following it starts, and how
+    # far reading may lag behind before skipping ahead to that backlog, in
+    # bytes
+    InitialBacklog = 64 * 1024
+    MaxCatchUp = 1024 * 1024
+    # How many of the first bytes identify the file's current incarnation
+    HeadSize = 64
+
+    def __init__(self, path: str, history: int = 200) -> None:
+        self.path = path
+        self._history = collections.deque(maxlen=history)
+        self._inode = None
+        self._offset = 0
+        self._head = b""
+        # An incomplete last line, completed by the next read
+        self._partial = b""
+        # Whether the next read starts mid-line and drops that first line
+        self._skip_partial = False
+        self._summary = self._emptySummary()
+
+    def position(self) -> dict | None:
+        """
+        Where reading stopped, to be persisted and passed to restore() later,
+        or None before the first read.
+        """
+        if self._inode is None:
+            return None
+        return {"inode": self._inode, "offset": self._offset - len(self._partial), "head": self._head.hex()}
+
+    def restore(self, position) -> None:
+        """
+        Continue at a position from position(); ignored if it is malformed or
+        the file was rotated meanwhile (checked on the next read).
+        """
+        try:
+            self._inode = int(position["inode"])
+            self._offset = int(position["offset"])
+            self._head = bytes.fromhex(position["head"])
+        except (TypeError, KeyError, ValueError):
+            return
+        self._partial = b""
+
+    def read(self) -> list[dict]:
+        """
+        Read what was appended since the last read.
+        :return: The new events, oldest first
+        :raises OSError: If the log exists but cannot be read
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        events = []
+        with f:
+            st = os.fstat(f.fileno())
+            head = os.pread(f.fileno(), self.HeadSize, 0)
+            common = min(len(head), len(self._head))
+            if self._inode is None:
+                # Nothing known about the file: start near its end
+                self._startAt(st.st_ino, head, max(0, st.st_size - self.InitialBacklog), skip_partial=True)
+            elif st.st_ino != self._inode or st.st_size < self._offset or head[:common] != self._head[:common]:
+                self._startAt(st.st_ino, head, 0)
+                self._summary = self._emptySummary()
+                events.append({"kind": "log_rotated", "time": None, "message": "Sunshine started a new log"})
+            elif st.st_size - self._offset > self.MaxCatchUp:
+                self._startAt(st.st_ino, head, st.st_size - self.InitialBacklog, skip_partial=True)
+            elif len(self._head) < self.HeadSize:
+                self._head = head
+            f.seek(self._offset)
+            data = self._partial + f.read()
+        self._offset += len(data) - len(self._partial)
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        if self._skip_partial:
+            self._skip_partial = False
+            if lines:
+                lines.pop(0)
+        for line in lines:
+            event = parseLine(line.decode(errors="replace").rstrip("\r"))
+            if event is not None:
+                events.append(event)
+        for event in events:
+            self._history.append(event)
+            self._updateSummary(event)
+        return events
+
+    def recent(self, limit: int) -> list[dict]:
+        """
+        :return: The last limit events, newest first
+        """
+        return list(reversed(self._history))[:limit]
+
+    def summary(self) -> dict:
+        """
+        The current stream as far as the log tells: whether a client is
+        connected, the capture method, the encoder, the video mode and the
+        last error.
+        """
+        return dict(self._summary)
+
+    def _startAt(self, inode: int, head: bytes, offset: int, skip_partial: bool = False) -> None:
+        self._inode = inode
+        self._head = head
+        self._offset = offset
+        self._partial = b""
+        # Starting in the middle of the file, the first line is cut off
+        self._skip_partial = skip_partial and offset > 0
+
+    @staticmethod
+    def _emptySummary() -> dict:
+        return {
+            "client_connected": False,
+            "capture": None,
+            "encoder": None,
+            "width": None,
+            "height": None,
+            "fps": None,
+            "last_error": None,
+        }
+
+    def _updateSummary(self, event: dict) -> None:
+        kind = event["kind"]
+        if kind == "client_connected":
+            self._summary["client_connected"] = True
+        elif kind == "client_disconnected":
+            self._summary["client_connected"] = False
+        elif kind == "capture":
+            self._summary["capture"] = event["capture"]
+        elif kind == "encoder":
+            self._summary["encoder"] = f"{event['encoder']} ({event['backend']})"
+        elif kind == "video_mode":
+            self._summary["width"] = event["width"]
+            self._summary["height"] = event["height"]
+            if event["fps"] is not None:
+                self._summary["fps"] = event["fps"]
+        elif kind == "error":
+            self._summary["last_error"] = event["message"]
@@ -0,0 +1,213 @@
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+
+from typing import Callable
+
+# Flags from the kernel's uapi/linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_INOTIFY_EVENT_HEADER = struct.Struct("iIII")
+
+def _loadLibc():
+    # CDLL(None) resolves against the running process, which also works in
+    # the loader's PyInstaller bundle where find_library may find nothing
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+class Inotify:
+    """
+    Minimal asyncio-integrated inotify wrapper (the standard library has
+    none). Events are read on the event loop as soon as the descriptor
+    becomes readable and passed to the callback as (watched path, name,
+    mask); name is "" for events on the watched path itself.
+    """
+
+    def __init__(self, callback: Callable[[str, str, int], None]) -> None:
+        """
+        :raises OSError: If inotify is not available
+        """
+        self._libc = _loadLibc()
+        self._callback = callback
+        self._paths = {}
+        self._loop = None
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def addWatch(self, path: str, mask: int) -> bool:
+        """
+        Watch path for the events in mask. Watching an already watched path
+        again just updates its mask.
+        :return: True if the path is watched now, False if it does not exist
+                 (or cannot be watched)
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            return False
+        self._paths[wd] = path
+        return True
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Start delivering events through the given loop.
+        """
+        self._loop = loop
+        loop.add_reader(self._fd, self._onReadable)
+
+    def close(self) -> None:
+        if self._fd < 0:
+            return
+        if self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop = None
+        os.close(self._fd)
+        self._fd = -1
+
+    def _onReadable(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _INOTIFY_EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = _INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT_HEADER.size
+            name = data[offset:offset + name_length].split(b"\0", 1)[0].decode(errors="replace")
+            offset += name_length
+            path = self._paths.get(wd)
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+            if path is not None:
+                self._callback(path, name, mask)
+
+class PidfdWatch:
+    """
+    Calls back once a process has exited, through a pidfd (Linux 5.3+): the
+    descriptor becomes readable when the process terminates, so the exit is
+    noticed on the event loop right away instead of by polling. Unlike
+    waiting on a child, this works for any process, e.g. one found in /proc
+    after a plugin_loader restart.
+    """
+
+    def __init__(self, pid: int, callback: Callable[[], None]) -> None:
+        """
+        :raises OSError: If pidfds are not available or the process is gone
+        """
+        if not hasattr(os, "pidfd_open"):
+            raise OSError(errno.ENOSYS, "os.pidfd_open is not available")
+        self.pid = pid
+        self._callback = callback
+        self._loop = None
+        self._fd = os.pidfd_open(pid)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Start waiting for the exit on the given loop.
+        """
+        self._loop = loop
+        loop.add_reader(self._fd, self._onReadable)
+
+    def close(self) -> None:
+        if self._fd < 0:
+            return
+        if self._loop is not None:
+            self._loop.remove_reader(self._fd)
+            self._loop = None
+        os.close(self._fd)
+        self._fd = -1
+
+    def _onReadable(self) -> None:
+        self.close()
+        self._callback()
+
+NETLINK_KOBJECT_UEVENT = 15
+
+class UeventListener:
+    """
+    Listens for kernel uevents (the events udev itself consumes) on a
+    NETLINK_KOBJECT_UEVENT socket, read on the event loop. Each event is
+    passed to the callback as a dict of its properties (ACTION, DEVPATH,
+    SUBSYSTEM, ...), optionally only for one subsystem. Joining the kernel
+    multicast group requires root.
+    """
+
+    def __init__(self, callback: Callable[[dict], None], subsystem: str | None = None) -> None:
+        """
+        :raises OSError: If the socket cannot be created or bound
+        """
+        self._callback = callback
+        self._subsystem = subsystem
+        self._loop = None
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC, NETLINK_KOBJECT_UEVENT)
+        try:
+            self._sock.setblocking(False)
+            # Port id 0 lets the kernel assign one; group 1 carries the
+            # kernel's own events (group 2 is udev's re-broadcast)
+            self._sock.bind((0, 1))
+        except OSError:
+            self._sock.close()
+            raise
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Start delivering events through the given loop.
+        """
+        self._loop = loop
+        loop.add_reader(self._sock.fileno(), self._onReadable)
+
+    def close(self) -> None:
+        if self._sock.fileno() < 0:
+            return
+        if self._loop is not None:
+            self._loop.remove_reader(self._sock.fileno())
+            self._loop = None
+        self._sock.close()
+
+    def _onReadable(self) -> None:
+        while True:
+            try:
+                data = self._sock.recv(64 * 1024)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ENOBUFS: events were dropped under load; the next ones
+                # still arrive, and callers re-read the state they care about
+                return
+            event = self.parseEvent(data)
+            if event is not None and (self._subsystem is None or event.get("SUBSYSTEM") == self._subsystem):
+                self._callback(event)
+
+    @staticmethod
+    def parseEvent(data: bytes) -> dict | None:
+        """
+        Parse a kernel uevent message: a header "ACTION@DEVPATH" followed by
+        NUL-separated KEY=VALUE properties.
+        :return: The properties, or None if the message is not a kernel uevent
+        """
+        header, _, body = data.partition(b"\0")
+        if b"@" not in header:
+            return None
+        event = {}
+        for field in body.split(b"\0"):
+            key, separator, value = field.decode(errors="replace").partition("=")
+            if separator:
+                event[key] = value
+        return event
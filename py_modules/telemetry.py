@@ -0,0 +1,117 @@
+import glob
+import math
+import os
+import re
+import time
+
+_CLOCK_LEVEL = re.compile(r"(\d+)\s*Mhz", re.IGNORECASE)
+
+class DeviceTelemetrySampler:
+    """
+    Samples what the device does while streaming, from sysfs and /proc: the
+    GPU's load (gpu_busy_percent), its current shader and memory clock
+    levels (the level marked with * in pp_dpm_sclk / pp_dpm_mclk), its
+    power draw and temperature (the hwmon of the GPU's device), and the
+    system's CPU load (the aggregate line of /proc/stat, as a percentage of
+    all cores since the previous sample). Together they tell a GPU-bound
+    stream (busy near 100 at top clocks) from a thermally throttled one
+    (high temperature, clocks dropping) and from one limited elsewhere, e.g.
+    by the encoder. Values the device does not expose are NaN - the sysfs
+    files are amdgpu's, other drivers only provide some of them.
+    """
+    Fields = ("time", "gpu_busy_percent", "gpu_clock_mhz", "memory_clock_mhz", "gpu_power_watts", "gpu_temp_celsius", "cpu_percent")
+
+    def __init__(self, proc_stat: str = "/proc/stat") -> None:
+        self.proc_stat = proc_stat
+        # (busy, total) jiffies of the previous /proc/stat read
+        self._previous_cpu = None
+        # Device directory -> its hwmon directory (or None), found once
+        self._hwmon = {}
+
+    def reset(self) -> None:
+        """
+        Forget the previous CPU reading, e.g. when sampling starts again.
+        """
+        self._previous_cpu = None
+
+    def sample(self, card_paths: list[str]) -> dict:
+        """
+        :param card_paths: The sysfs directories of the DRM cards (e.g.
+                           /sys/class/drm/card0); the first one with a load
+                           reading is sampled as the GPU
+        :return: The sample (see Fields)
+        """
+        device = self._findGpuDevice(card_paths)
+        sample = dict.fromkeys(self.Fields, math.nan)
+        sample["time"] = time.time()
+        sample["cpu_percent"] = self._readCpuLoad()
+        if device is None:
+            return sample
+        sample["gpu_busy_percent"] = self._readNumber(f"{device}/gpu_busy_percent")
+        sample["gpu_clock_mhz"] = self._readClockLevel(f"{device}/pp_dpm_sclk")
+        sample["memory_clock_mhz"] = self._readClockLevel(f"{device}/pp_dpm_mclk")
+        hwmon = self._findHwmon(device)
+        if hwmon is not None:
+            # Microwatts; APUs report an average, dGPUs often only the input
+            power = self._readNumber(f"{hwmon}/power1_average")
+            if math.isnan(power):
+                power = self._readNumber(f"{hwmon}/power1_input")
+            sample["gpu_power_watts"] = power / 1e6
+            # Millidegrees; the hottest sensor (edge, junction, memory)
+            temperatures = [self._readNumber(path) for path in sorted(glob.glob(f"{hwmon}/temp*_input"))]
+            temperatures = [value for value in temperatures if not math.isnan(value)]
+            if temperatures:
+                sample["gpu_temp_celsius"] = max(temperatures) / 1000
+        return sample
+
+    def _findGpuDevice(self, card_paths: list[str]) -> str | None:
+        devices = [f"{card}/device" for card in card_paths if os.path.isdir(f"{card}/device")]
+        for device in devices:
+            if os.path.exists(f"{device}/gpu_busy_percent"):
+                return device
+        return devices[0] if devices else None
+
+    def _findHwmon(self, device: str) -> str | None:
+        if device not in self._hwmon:
+            hwmons = sorted(glob.glob(f"{device}/hwmon/hwmon*"))
+            self._hwmon[device] = hwmons[0] if hwmons else None
+        return self._hwmon[device]
+
+    def _readCpuLoad(self) -> float:
+        try:
+            with open(self.proc_stat) as f:
+                fields = [int(value) for value in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return math.nan
+        # user nice system idle iowait irq softirq steal (guest time is
+        # already included in user and nice)
+        total = sum(fields[:8])
+        busy = total - fields[3] - fields[4]
+        previous, self._previous_cpu = self._previous_cpu, (busy, total)
+        if previous is None or total <= previous[1]:
+            return math.nan
+        return (busy - previous[0]) / (total - previous[1]) * 100
+
+    @staticmethod
+    def _readNumber(path: str) -> float:
+        try:
+            with open(path) as f:
+                return float(f.read().strip())
+        except (OSError, ValueError):
+            return math.nan
+
+    @staticmethod
+    def _readClockLevel(path: str) -> float:
+        """
+        :return: The clock of the current DPM level ("1: 1600Mhz *"), in MHz
+        """
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.rstrip().endswith("*"):
+                        match = _CLOCK_LEVEL.search(line)
+                        if match is not None:
+                            return float(match[1])
+        except OSError:
+            pass
+        return math.nan
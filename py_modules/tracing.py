@@ -0,0 +1,128 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import time
+
+# The trace of the operation the current task runs in, if any. Tasks
+# created within an operation inherit it, so spans from concurrent helpers
+# land in the same trace.
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+class Trace:
+    """
+    The timings of one operation (e.g. a Sunshine start): the operation's
+    total duration and a span per phase, relative to the operation's start.
+    """
+
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+        self.started_at = time.time()
+        self.seconds = None
+        self.result = None
+        self.error = None
+        self.spans = []
+        self._started = time.monotonic()
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.spans.append({
+                "name": name,
+                "offset": round(started - self._started, 4),
+                "seconds": round(time.monotonic() - started, 4),
+            })
+
+    def finish(self) -> None:
+        self.seconds = round(time.monotonic() - self._started, 4)
+
+    def toRecord(self) -> dict:
+        return {
+            "operation": self.operation,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "result": self.result,
+            "error": self.error,
+            "spans": self.spans,
+        }
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{span['name']} {span['seconds']:.2f}" for span in self.spans)
+        return f"{self.operation}: {self.seconds:.2f} s ({phases or 'no phases'})"
+
+class Tracer:
+    """
+    Collects operation traces: keeps the last ones in memory and appends
+    each as one JSON line to a file (rotated at MaxFileSize, one backup).
+    """
+    MaxFileSize = 512 * 1024
+
+    def __init__(self, logger, path: str | None = None, history: int = 50) -> None:
+        self.logger = logger
+        self.path = path
+        self._traces = collections.deque(maxlen=history)
+
+    @contextlib.asynccontextmanager
+    async def operation(self, name: str):
+        """
+        Trace an operation; spans (see span()) opened within it, also from
+        tasks it creates, are recorded in its trace. Operations may nest
+        (e.g. an update's stop and start); each is recorded on its own.
+        """
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = repr(e)
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+            self._record(trace)
+
+    def recent(self, limit: int) -> list[dict]:
+        """
+        :return: The records of the last limit operations, newest first
+        """
+        return [trace.toRecord() for trace in reversed(self._traces)][:limit]
+
+    def _record(self, trace: Trace) -> None:
+        self._traces.append(trace)
+        self.logger.info(f"Trace {trace.summary()}")
+        if not self.path:
+            return
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.MaxFileSize:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a") as f:
+                f.write(json.dumps(trace.toRecord()) + "\n")
+        except OSError as e:
+            self.logger.warning(f"Could not write the trace of {trace.operation} to {self.path}: {e}")
+
+def span(name: str):
+    """
+    Time a phase of the traced operation the caller runs in; does nothing
+    outside an operation.
+    """
+    trace = _current_trace.get()
+    return trace.span(name) if trace is not None else contextlib.nullcontext()
+
+def traced(operation: str):
+    """
+    Decorator tracing an async method as an operation, using the instance's
+    tracer attribute; the method's return value becomes the trace's result.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            async with self.tracer.operation(operation) as trace:
+                trace.result = await func(self, *args, **kwargs)
+                return trace.result
+        return wrapper
+    return decorate
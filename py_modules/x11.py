@@ -0,0 +1,297 @@
+import asyncio
+import socket
+import struct
+
+# Predefined atom (X11 protocol, appendix "Predefined Atoms")
+XA_CARDINAL = 6
+
+# Request opcodes
+_CHANGE_WINDOW_ATTRIBUTES = 2
+_INTERN_ATOM = 16
+_CHANGE_PROPERTY = 18
+_GET_PROPERTY = 20
+_GET_INPUT_FOCUS = 43
+
+_PROP_MODE_REPLACE = 0
+_CW_EVENT_MASK = 1 << 11
+_PROPERTY_CHANGE_MASK = 1 << 22
+_PROPERTY_NOTIFY = 28
+
+class X11Error(Exception):
+    """
+    An X11 protocol error reply, or a failed connection setup.
+    """
+
+def _pad(length: int) -> int:
+    return (4 - length % 4) % 4
+
+def readXauthority(path: str, display_number: str) -> tuple[bytes, bytes] | None:
+    """
+    Find the MIT-MAGIC-COOKIE-1 entry for a local display in an Xauthority
+    file (big-endian records of family, address, display number, auth name
+    and auth data).
+    :return: (auth name, auth data), or None if the file has no usable entry
+    """
+    family_local, family_wild = 256, 65535
+    hostname = socket.gethostname().encode()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    offset = 0
+
+    def field() -> bytes:
+        nonlocal offset
+        (length,) = struct.unpack_from(">H", data, offset)
+        value = data[offset + 2:offset + 2 + length]
+        offset += 2 + length
+        return value
+
+    try:
+        while offset < len(data):
+            (family,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+            address, number, name, cookie = field(), field(), field(), field()
+            if name != b"MIT-MAGIC-COOKIE-1" or number not in (b"", display_number.encode()):
+                continue
+            if family == family_wild or (family == family_local and address == hostname):
+                return name, cookie
+    except struct.error:
+        pass
+    return None
+
+class X11Client:
+    """
+    A minimal X11 protocol client over the display's unix socket, covering
+    what the plugin needs: interning atoms and reading/writing CARDINAL
+    properties on the root window. Requests are pipelined on one
+    persistent connection; a reader task matches replies and errors to
+    requests by sequence number. Requests without a reply complete once a
+    reply or error for a later request arrives (the server handles
+    requests in order), and callers needing confirmation follow them with
+    a cheap round trip. Root window property changes can be subscribed to,
+    see watchRootProperties.
+    """
+
+    def __init__(self, display_number: int = 0, xauthority_paths: list[str] | None = None, timeout: float = 2) -> None:
+        self.display_number = display_number
+        self.xauthority_paths = xauthority_paths or []
+        self.timeout = timeout
+        self.root = None
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._sequence = 0
+        # Futures of requests in flight in request order:
+        # (16 bit sequence number, whether a reply is expected, future)
+        self._pending = []
+        self._atoms = {}
+        # Called with (atom, deleted) for each PropertyNotify on the root
+        # window once watchRootProperties was called
+        self._property_callback = None
+        # Resolved when the connection is gone, see waitClosed()
+        self._closed = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self) -> None:
+        """
+        Connect and set up the connection, authenticating with the first
+        matching cookie from xauthority_paths (or none, for servers without
+        access control).
+        :raises OSError, X11Error: If the connection could not be set up
+        """
+        self.close()
+        auth_name, auth_data = b"", b""
+        for path in self.xauthority_paths:
+            entry = readXauthority(path, str(self.display_number))
+            if entry:
+                auth_name, auth_data = entry
+                break
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(f"/tmp/.X11-unix/X{self.display_number}"), self.timeout
+        )
+        try:
+            writer.write(
+                struct.pack("<BxHHHHxx", ord("l"), 11, 0, len(auth_name), len(auth_data))
+                + auth_name + b"\0" * _pad(len(auth_name))
+                + auth_data + b"\0" * _pad(len(auth_data))
+            )
+            header = await asyncio.wait_for(reader.readexactly(8), self.timeout)
+            status, reason_length, _, _, length = struct.unpack("<BBHHH", header)
+            body = await asyncio.wait_for(reader.readexactly(length * 4), self.timeout)
+            if status != 1:
+                reason = body[:reason_length] if status == 0 else body
+                raise X11Error(f"Connection refused by the X server: {reason.decode(errors='replace').strip()}")
+            vendor_length, = struct.unpack_from("<H", body, 16)
+            format_count = body[21]
+            screens_offset = 32 + vendor_length + _pad(vendor_length) + 8 * format_count
+            self.root, = struct.unpack_from("<I", body, screens_offset)
+        except BaseException:
+            writer.close()
+            raise
+        self._reader, self._writer = reader, writer
+        self._sequence = 0
+        self._atoms = {}
+        self._property_callback = None
+        self._closed = asyncio.get_event_loop().create_future()
+        self._reader_task = asyncio.get_event_loop().create_task(self._readLoop(reader))
+
+    def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._failPending(ConnectionResetError("X11 connection closed"))
+        self._setClosed()
+
+    async def waitClosed(self) -> None:
+        """
+        Wait until the connection is gone (closed, or lost e.g. because the
+        X server exited).
+        """
+        if self._closed is not None:
+            await asyncio.shield(self._closed)
+
+    async def internAtom(self, name: str) -> int:
+        """
+        :return: The atom for name, created if it does not exist yet
+                 (cached per connection)
+        """
+        if name not in self._atoms:
+            encoded = name.encode()
+            reply = await self._request(
+                struct.pack("<BBHHxx", _INTERN_ATOM, 0, 2 + (len(encoded) + _pad(len(encoded))) // 4, len(encoded))
+                + encoded + b"\0" * _pad(len(encoded)),
+                has_reply=True
+            )
+            self._atoms[name], = struct.unpack_from("<I", reply, 8)
+        return self._atoms[name]
+
+    async def setCardinal(self, property_name: str, value: int) -> None:
+        """
+        Set a 32 bit CARDINAL property on the root window and wait until
+        the server has processed it.
+        """
+        atom = await self.internAtom(property_name)
+        change = self._request(
+            struct.pack("<BBHIIIBxxxI", _CHANGE_PROPERTY, _PROP_MODE_REPLACE, 7, self.root, atom, XA_CARDINAL, 32, 1)
+            + struct.pack("<I", value),
+            has_reply=False
+        )
+        await asyncio.gather(change, self._sync())
+
+    async def getCardinal(self, property_name: str) -> int | None:
+        """
+        :return: The first value of a 32 bit property on the root window, or
+                 None if the property does not exist
+        """
+        atom = await self.internAtom(property_name)
+        reply = await self._request(
+            struct.pack("<BBHIIIII", _GET_PROPERTY, 0, 6, self.root, atom, 0, 0, 1),
+            has_reply=True
+        )
+        value_format = reply[1]
+        value_count, = struct.unpack_from("<I", reply, 16)
+        if value_format != 32 or value_count == 0:
+            return None
+        value, = struct.unpack_from("<I", reply, 32)
+        return value
+
+    async def watchRootProperties(self, callback) -> None:
+        """
+        Subscribe to PropertyNotify events of the root window: callback is
+        called with (atom, deleted) whenever any root window property is
+        changed or deleted - including by this client - until
+        unwatchRootProperties() or the connection is closed.
+        """
+        self._property_callback = callback
+        await asyncio.gather(
+            self._request(
+                struct.pack("<BxHIII", _CHANGE_WINDOW_ATTRIBUTES, 4, self.root, _CW_EVENT_MASK, _PROPERTY_CHANGE_MASK),
+                has_reply=False
+            ),
+            self._sync()
+        )
+
+    def unwatchRootProperties(self) -> None:
+        """
+        Stop calling the callback of watchRootProperties(). The connection is
+        shared, so it stays open; the events still arrive but are dropped.
+        """
+        self._property_callback = None
+
+    async def _sync(self) -> None:
+        # GetInputFocus is the conventional cheapest round trip
+        await self._request(struct.pack("<BxH", _GET_INPUT_FOCUS, 1), has_reply=True)
+
+    def _request(self, data: bytes, has_reply: bool) -> asyncio.Future:
+        if not self.connected:
+            raise ConnectionResetError("Not connected to the X server")
+        self._sequence = (self._sequence + 1) & 0xFFFF
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((self._sequence, has_reply, future))
+        self._writer.write(data)
+        return asyncio.wait_for(asyncio.shield(future), self.timeout)
+
+    async def _readLoop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                packet = await reader.readexactly(32)
+                kind = packet[0]
+                if kind in (0, 1):
+                    sequence, = struct.unpack_from("<H", packet, 2)
+                    if kind == 1:
+                        extra_length, = struct.unpack_from("<I", packet, 4)
+                        if extra_length:
+                            packet += await reader.readexactly(extra_length * 4)
+                        self._complete(sequence, packet, None)
+                    else:
+                        self._complete(sequence, None, X11Error(f"X11 error {packet[1]} for request {packet[10]}"))
+                # The top bit of an event code marks events sent by clients
+                elif kind & 0x7F == _PROPERTY_NOTIFY and self._property_callback is not None:
+                    window, atom = struct.unpack_from("<II", packet, 4)
+                    if window == self.root:
+                        self._property_callback(atom, packet[16] == 1)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failPending(e)
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._setClosed()
+
+    def _setClosed(self) -> None:
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def _complete(self, sequence: int, reply: bytes | None, error: Exception | None) -> None:
+        # Requests before this one have been processed; those without a
+        # reply succeeded (their errors would have arrived first)
+        while self._pending:
+            pending_sequence, has_reply, future = self._pending.pop(0)
+            if pending_sequence == sequence:
+                if not future.done():
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(reply)
+                return
+            if not future.done():
+                if has_reply:
+                    future.set_exception(X11Error("Reply missing"))
+                else:
+                    future.set_result(None)
+
+    def _failPending(self, error: Exception) -> None:
+        pending, self._pending = self._pending, []
+        for _, _, future in pending:
+            if not future.done():
+                future.set_exception(error)
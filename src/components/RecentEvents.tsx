@@ -0,0 +1,74 @@
+import { FC, useEffect, useState } from 'react'
+import { Field } from "@decky/ui";
+import backend from "../util/backend";
+import type { SunshineLogEvent } from "../util/types";
+
+// How many events the list shows at most
+const EVENT_LIMIT = 20;
+
+const EVENT_LABELS: Record<SunshineLogEvent["kind"], string> = {
+    client_connected: "Client connected",
+    client_disconnected: "Client disconnected",
+    capture: "Capture",
+    encoder: "Encoder",
+    video_mode: "Video mode",
+    error: "Error",
+    log_rotated: "Sunshine restarted",
+};
+
+const describe = (event: SunshineLogEvent): string | null => {
+    switch (event.kind) {
+        case "capture":
+            return event.capture ?? null;
+        case "encoder":
+            return `${event.encoder} (${event.codec})`;
+        case "video_mode":
+            return `${event.width}x${event.height}${event.fps ? `@${event.fps}` : ""}`;
+        case "error":
+            return event.message;
+        default:
+            return null;
+    }
+};
+
+/**
+ * The last events parsed from sunshine.log (connects, video mode, errors,
+ * ...), newest first. Loaded from the backend's history when mounted and
+ * kept current with the events it pushes, so it only costs anything while
+ * it is shown.
+ */
+export const RecentEvents: FC = () => {
+    const [events, setEvents] = useState<SunshineLogEvent[] | null>(null);
+
+    useEffect(() => {
+        backend.getLogEvents(EVENT_LIMIT).then(setEvents);
+        return backend.onLogEvents((newEvents: SunshineLogEvent[]) => {
+            setEvents(current => [...newEvents.slice().reverse(), ...(current ?? [])].slice(0, EVENT_LIMIT));
+        });
+    }, []);
+
+    if (events === null) {
+        return null;
+    }
+    if (events.length === 0) {
+        return <Field label="No events yet" focusable={false} bottomSeparator="none" />;
+    }
+    return (
+        <>
+            {events.map((event, index) => (
+                <Field
+                    key={`${event.time}-${index}`}
+                    label={EVENT_LABELS[event.kind]}
+                    description={event.time ?? undefined}
+                    focusable={false}
+                    bottomSeparator="none"
+                >
+                    { event.kind === "error"
+                        ? <span style={{ color: "#c64040" }}>{describe(event)}</span>
+                        : describe(event)
+                    }
+                </Field>
+            ))}
+        </>
+    );
+};
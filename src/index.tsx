@@ -12,16 +12,16 @@ import {
 import { definePlugin } from "@decky/api";
 import { FaSun } from "react-icons/fa";
 import backend from "./util/backend";
+import type { StreamSummary, SunshineState } from "./util/types";
 
 import { PairingModal } from "./components/PairingModal";
 import { CredentialsModal } from "./components/CredentialsModal";
 import { WebUiModal } from "./components/WebUiModal";
 import { LabelWithInfo } from "./components/LabelWithInfo";
+import { RecentEvents } from "./components/RecentEvents";
 import { LOG_TAG } from "./util/constants";
 
 const Content: FC = () => {
-  const HEALTH_CHECK_INTERVAL = 5000;
-
   // State
   const [isSunshineRunning, setIsSunshineRunning] = useState<boolean>(false);
   const [areCredentialsValid, setAreCredentialsValid] = useState<boolean | null>(null);
@@ -33,17 +33,40 @@ const Content: FC = () => {
   const [isUpdating, setIsUpdating] = useState<boolean>(false);
   const [isRefreshingVersionInfo, setIsRefreshingVersionInfo] = useState<boolean>(false);
   const [isInitializing, setIsInitializing] = useState<boolean>(true);
+  // What the plugin's boot is doing right now, e.g. waiting for the display
+  const [bootPhase, setBootPhase] = useState<string | null>(null);
+  // What sunshine.log tells about the current stream
+  const [stream, setStream] = useState<StreamSummary | null>(null);
+  const [showRecentEvents, setShowRecentEvents] = useState<boolean>(false);
   const [credentials, setCredentials] = useState<{username: string, password: string} | null>(null);
   const [isGettingCredentials, setIsGettingCredentials] = useState<boolean>(false);
   const [getCredentialsReturnedValue, setGetCredentialsReturnedValue] = useState<boolean | null>(null);
   const [forceComposition, setForceComposition] = useState<boolean>(false);
   const [showCompositionHelp, setShowCompositionHelp] = useState<boolean>(false);
+  const [autoRestart, setAutoRestart] = useState<boolean>(true);
+  const [showAutoRestartHelp, setShowAutoRestartHelp] = useState<boolean>(false);
+  const [performanceMode, setPerformanceMode] = useState<boolean>(false);
+  const [showPerformanceModeHelp, setShowPerformanceModeHelp] = useState<boolean>(false);
+  const [prioritize, setPrioritize] = useState<boolean>(false);
+  const [showPrioritizeHelp, setShowPrioritizeHelp] = useState<boolean>(false);
+
+  const applySunshineState = (state: SunshineState) => {
+    setIsSunshineRunning(state.is_running);
+    setAreCredentialsValid(state.are_credentials_valid);
+    setBootPhase(state.boot_phase);
+    setStream(state.stream);
+    // The backend only knows version info once it was fetched
+    if (state.current_version !== null || state.update_version !== null) {
+      setSunshineCurrentVersion(state.current_version);
+      setSunshineUpdateVersion(state.update_version);
+    }
+  };
 
   const updateSunshineState = async () => {
-    const isSunshineRunning = await backend.isSunshineRunning();
-    const areCredentialsValid = await backend.areCredentialsValid();
-    setIsSunshineRunning(isSunshineRunning);
-    setAreCredentialsValid(areCredentialsValid);
+    const state = await backend.getState();
+    if (state) {
+      applySunshineState(state);
+    }
   };
 
   useEffect(() => {
@@ -61,18 +84,19 @@ const Content: FC = () => {
 
   useEffect(() => {
     backend.getForceComposition().then(setForceComposition);
+    backend.getAutoRestart().then(setAutoRestart);
+    backend.getPerformanceProfile().then(profile => setPerformanceMode(profile?.enabled === true));
+    backend.getScheduling().then(scheduling => setPrioritize(scheduling?.enabled === true));
   }, []);
 
   useEffect(() => {
-    // Pause the health check while a transition is in progress;
+    // Ignore pushed state while a transition is in progress;
     // toggleSunshine updates the state itself when it finishes.
     if (pendingRunState !== null) {
       return;
     }
 
-    const healthCheck = setInterval(updateSunshineState, HEALTH_CHECK_INTERVAL);
-
-    return () => clearInterval(healthCheck);
+    return backend.onStateChanged(applySunshineState);
   }, [pendingRunState]);
 
   const toggleSunshine = async () => {
@@ -120,12 +144,26 @@ const Content: FC = () => {
         color: "orange",
       };
     }
+    if (!isSunshineRunning && bootPhase) {
+      return { label: `${bootPhase}...`, color: "orange" };
+    }
     if (isSunshineRunning) {
       return { label: "Running", color: "#2eaa4f" };
     }
     return { label: "Stopped", color: "#c64040" };
   })();
 
+  const videoInfo = (() => {
+    if (!stream) {
+      return null;
+    }
+    const mode = stream.width && stream.height
+      ? `${stream.width}x${stream.height}${stream.fps ? `@${stream.fps}` : ""}`
+      : null;
+    const parts = [stream.capture, stream.encoder, mode].filter(part => part);
+    return parts.length > 0 ? parts.join(" · ") : null;
+  })();
+
   return (
     <>
     <PanelSection>
@@ -161,6 +199,41 @@ const Content: FC = () => {
         </div>
       </PanelSectionRow>
 
+      {/* Stream Section: what Sunshine logged about the current stream */}
+      { isSunshineRunning && stream &&
+        <PanelSectionRow>
+          <div style={{ display: "contents" }}>
+            <Field label="Client" focusable={false} bottomSeparator="none">
+              {stream.client_connected ? "Connected" : "Not connected"}
+            </Field>
+            { videoInfo &&
+              <Field label="Video" focusable={false} bottomSeparator="none">
+                {videoInfo}
+              </Field>
+            }
+            { stream.last_error &&
+              <Field label="Last error" focusable={false} bottomSeparator="none">
+                <span style={{ color: "#c64040" }}>{stream.last_error}</span>
+              </Field>
+            }
+          </div>
+        </PanelSectionRow>
+      }
+
+      {/* Recent Events Section: the history of what Sunshine logged, on demand */}
+      <PanelSectionRow>
+        <div style={{ display: "contents" }}>
+          <ButtonItem
+            layout="below"
+            bottomSeparator="none"
+            onClick={() => setShowRecentEvents(value => !value)}
+          >
+            {showRecentEvents ? "Hide recent events" : "Show recent events"}
+          </ButtonItem>
+          { showRecentEvents && <RecentEvents /> }
+        </div>
+      </PanelSectionRow>
+
       {/* Login Section */}
       { areCredentialsValid === false &&
         <PanelSectionRow>
@@ -243,6 +316,48 @@ const Content: FC = () => {
           }}
         />
       </PanelSectionRow>
+
+      <PanelSectionRow>
+        <ToggleField
+          label={<LabelWithInfo title="Restart if it crashes" onToggleHelp={() => setShowAutoRestartHelp(value => !value)} />}
+          description={showAutoRestartHelp
+            ? "Restarts Sunshine when it exits without being stopped here, waiting longer after each crash. Gives up if it keeps crashing."
+            : undefined}
+          checked={autoRestart}
+          onChange={(value: boolean) => {
+            setAutoRestart(value);
+            backend.setAutoRestart(value);
+          }}
+        />
+      </PanelSectionRow>
+
+      <PanelSectionRow>
+        <ToggleField
+          label={<LabelWithInfo title="Performance mode while streaming" onToggleHelp={() => setShowPerformanceModeHelp(value => !value)} />}
+          description={showPerformanceModeHelp
+            ? "Keeps the GPU and CPU at high clocks while Sunshine runs, against stutter from clocking down between frames. Uses more power; the previous settings are restored when Sunshine stops."
+            : undefined}
+          checked={performanceMode}
+          onChange={(value: boolean) => {
+            setPerformanceMode(value);
+            backend.setPerformanceProfile({ enabled: value });
+          }}
+        />
+      </PanelSectionRow>
+
+      <PanelSectionRow>
+        <ToggleField
+          label={<LabelWithInfo title="Prioritize Sunshine" onToggleHelp={() => setShowPrioritizeHelp(value => !value)} />}
+          description={showPrioritizeHelp
+            ? "Gives Sunshine a higher CPU and disk priority than the game, for steadier stream latency under heavy game load. May cost the game a few frames."
+            : undefined}
+          checked={prioritize}
+          onChange={(value: boolean) => {
+            setPrioritize(value);
+            backend.setScheduling({ enabled: value });
+          }}
+        />
+      </PanelSectionRow>
     </PanelSection>
 
     <PanelSection title="Sunshine">
@@ -1,5 +1,12 @@
-import { call } from "@decky/api";
-import type { SunshineVersionInfo, WebUiInfo } from './types';
+import { addEventListener, call, removeEventListener } from "@decky/api";
+import type {
+    PerformanceProfile,
+    SchedulingSettings,
+    SunshineLogEvent,
+    SunshineState,
+    SunshineVersionInfo,
+    WebUiInfo,
+} from './types';
 import { LOG_TAG } from "./constants";
 
 class Backend {
@@ -8,16 +15,35 @@ class Backend {
         return result === true;
     };
 
-    public isSunshineRunning = async (): Promise<boolean> => {
-        const result = await this.call<[], boolean>("is_sunshine_running");
-        return result === true;
+    public getState = async (): Promise<SunshineState | null> => {
+        const result = await this.call<[], SunshineState>("get_state");
+        return result;
     }
 
-    public areCredentialsValid = async (): Promise<boolean | null> => {
-        const result = await this.call<[], boolean | null>("are_credentials_valid");
+    // Subscribes to the state changes the backend pushes; returns the
+    // function that unsubscribes again. While subscribed, the backend also
+    // looks for changes made outside the plugin.
+    public onStateChanged = (handler: (state: SunshineState) => void): (() => void) => {
+        const listener = addEventListener<[state: SunshineState]>("sunshine_state", handler);
+        this.call<[], void>("subscribe_state");
+        return () => {
+            removeEventListener("sunshine_state", listener);
+            this.call<[], void>("unsubscribe_state");
+        };
+    }
+
+    public getLogEvents = async (limit: number): Promise<SunshineLogEvent[] | null> => {
+        const result = await this.call<[limit: number], SunshineLogEvent[]>("get_log_events", limit);
         return result;
     }
 
+    // Subscribes to the events parsed from new lines of sunshine.log (oldest
+    // first); returns the function that unsubscribes again
+    public onLogEvents = (handler: (events: SunshineLogEvent[]) => void): (() => void) => {
+        const listener = addEventListener<[events: SunshineLogEvent[]]>("sunshine_log_events", handler);
+        return () => removeEventListener("sunshine_log_events", listener);
+    }
+
     public setCredentials = async (username: string, password: string): Promise<boolean | null> => {
         const result = await this.call<[username: string, password: string], boolean | null>(
             "set_credentials",
@@ -72,6 +98,32 @@ class Backend {
         return result === true;
     }
 
+    public getAutoRestart = async (): Promise<boolean> => {
+        const result = await this.call<[], boolean>("get_auto_restart");
+        return result === true;
+    }
+
+    public setAutoRestart = async (enabled: boolean): Promise<boolean> => {
+        const result = await this.call<[enabled: boolean], boolean>("set_auto_restart", enabled);
+        return result === true;
+    }
+
+    public getPerformanceProfile = async (): Promise<PerformanceProfile | null> => {
+        return await this.call<[], PerformanceProfile>("get_performance_profile");
+    }
+
+    public setPerformanceProfile = async (profile: Partial<PerformanceProfile>): Promise<PerformanceProfile | null> => {
+        return await this.call<[profile: Partial<PerformanceProfile>], PerformanceProfile>("set_performance_profile", profile);
+    }
+
+    public getScheduling = async (): Promise<SchedulingSettings | null> => {
+        return await this.call<[], SchedulingSettings>("get_scheduling");
+    }
+
+    public setScheduling = async (scheduling: Partial<SchedulingSettings>): Promise<SchedulingSettings | null> => {
+        return await this.call<[scheduling: Partial<SchedulingSettings>], SchedulingSettings>("set_scheduling", scheduling);
+    }
+
     // Preserves the pre-@decky/api error contract: a failed backend call is
     // logged and mapped to null instead of throwing, so callers can keep
     // treating null/false as "failed".
@@ -6,4 +6,62 @@ export interface SunshineVersionInfo {
 export interface WebUiInfo {
     ip: string | null;
     editing_ready: boolean;
-}
\ No newline at end of file
+}
+
+export interface SunshineState {
+    is_running: boolean;
+    are_credentials_valid: boolean | null;
+    composition_forced: boolean;
+    current_version: string | null;
+    update_version: string | null;
+    // What the plugin's boot is currently doing (e.g. "Waiting for display
+    // and audio"), or null when it is not busy
+    boot_phase: string | null;
+    stream: StreamSummary;
+}
+
+// The current stream as far as sunshine.log tells
+export interface StreamSummary {
+    client_connected: boolean;
+    capture: string | null;
+    encoder: string | null;
+    width: number | null;
+    height: number | null;
+    fps: number | null;
+    last_error: string | null;
+}
+
+export interface PerformanceProfile {
+    enabled: boolean;
+    // null leaves the option alone
+    gpu_performance_level: string | null;
+    gpu_min_clock_mhz: number | null;
+    cpu_governor: string | null;
+    cpu_epp: string | null;
+}
+
+export interface SchedulingSettings {
+    enabled: boolean;
+    // null leaves the option alone
+    nice: number | null;
+    io_class: "realtime" | "best-effort" | "idle" | null;
+    io_level: number;
+    // Regular expression matched against thread names
+    realtime_threads: string | null;
+    realtime_priority: number;
+    cpus: number[] | null;
+}
+
+export interface SunshineLogEvent {
+    kind: "client_connected" | "client_disconnected" | "capture" | "encoder" | "video_mode" | "error" | "log_rotated";
+    // The log line's timestamp, as Sunshine wrote it
+    time: string | null;
+    message: string;
+    capture?: string;
+    codec?: string;
+    encoder?: string;
+    backend?: string;
+    width?: number;
+    height?: number;
+    fps?: number | null;
+}